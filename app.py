@@ -9,18 +9,61 @@ import json
 import uuid
 from datetime import datetime
 from pathlib import Path
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, \
+    make_response, abort, send_file
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
-import sqlite3
 
 # Importar configuración y modelos
 import config
 from models.cliente import Cliente
-from models.formulario import Formulario
+from models.formulario import CAMPOS_PASO, Formulario, suscribir_progreso
+from models.historial import EscritorRevisiones, Historial
+from models.busqueda import Busqueda
+from models.sincronizacion import Sincronizacion
+from models import codec
+from web.plantillas import configurar_plantillas
+from web.assets import configurar_assets
+from web.compresion import configurar_compresion
+from web.condicional import respuesta_condicional
+from web.eventos import configurar_eventos
+from web.admision import configurar_admision, controlar_admision
+from web.resumenes import FORMATOS, configurar_resumenes, pdf_disponible
+from web.prueba_smtp import configurar_prueba_smtp
+from web.calidad import configurar_calidad
+from database import calidad, consultas, particiones
+from database.init_db import get_connection
+
+
+class CodecJSONProvider(DefaultJSONProvider):
+    """Proveedor JSON de Flask que delega en el códec de models.codec"""
+
+    def dumps(self, obj, **kwargs):
+        return codec.dumps(
+            obj,
+            default=kwargs.get('default', self.default),
+            sort_keys=kwargs.get('sort_keys', self.sort_keys),
+            indent=kwargs.get('indent')
+        )
+
+    def loads(self, s, **kwargs):
+        # La sesión (mensajes flash) pasa object_hook, que el códec no admite
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return codec.loads(s)
+
 
 # Configuración de la aplicación
 app = Flask(__name__)
-app.config.from_object(config.DevelopmentConfig)
+app.config.from_object(config.config_entorno())
+
+# jsonify, request.get_json y el filtro tojson usan el códec configurado
+codec.configurar_codec(app.config['JSON_CODEC'])
+app.json = CodecJSONProvider(app)
+
+# Los modelos se conectan a la partición de cada cliente (ver database/particiones.py)
+particiones.configurar_particiones(app.config['PARTICIONES'], app.config['DATABASE_PATH'])
 
 # Configuración de uploads
 UPLOAD_FOLDER = 'uploads'
@@ -39,6 +82,16 @@ step_names = [
     "Documentación"
 ]
 
+# Plantilla de cada paso, en el mismo orden que step_names
+step_templates = [
+    'steps/paso1_empresa.html',
+    'steps/paso2_trasteros.html',
+    'steps/paso3_usuarios.html',
+    'steps/paso4_correo.html',
+    'steps/paso5_niveles.html',
+    'steps/paso6_documentacion.html'
+]
+
 
 def allowed_file(filename):
     return '.' in filename and \
@@ -46,38 +99,30 @@ def allowed_file(filename):
 
 
 def get_db_connection():
-    """Obtener conexión a la base de datos"""
-    conn = sqlite3.connect(app.config['DATABASE_PATH'])
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Obtener conexión a la base de datos principal (partición 0)"""
+    return get_connection()
 
 
 def init_db():
-    """Inicializar la base de datos"""
-    with app.app_context():
-        conn = get_db_connection()
-        with open('database/schema.sql', 'r', encoding='utf-8') as f:
-            conn.executescript(f.read())
-        conn.close()
+    """
+    Aplicar las migraciones pendientes en cada partición y en su directorio
+    (no escribe nada si el esquema está al día)
+    """
+    for ruta, nombres in particiones.inicializar_particiones().items():
+        for nombre in nombres:
+            app.logger.info("Migración aplicada en %s: %s", ruta, nombre)
 
 
 @app.route('/')
 def index():
     """Página principal - Lista de clientes"""
-    conn = get_db_connection()
-
-    # Obtener todos los clientes con su progreso
-    clientes = conn.execute('''
-                            SELECT c.*,
-                                   COALESCE(f.paso_actual, 1)                        as paso_actual,
-                                   COALESCE(f.porcentaje_completado, 0)              as porcentaje_completado,
-                                   COALESCE(f.fecha_actualizacion, c.fecha_creacion) as ultima_actualizacion
-                            FROM clientes c
-                                     LEFT JOIN formularios_clientes f ON c.id = f.cliente_id
-                            ORDER BY c.fecha_creacion DESC
-                            ''').fetchall()
+    return respuesta_condicional(Cliente.version_lista(), render_index)
 
-    conn.close()
+
+def render_index():
+    """Renderiza la lista de clientes (sin validación condicional)"""
+    # Todos los clientes con el progreso de su formulario más reciente, de todas las particiones
+    clientes = Cliente.listar_con_progreso()
 
     return render_template('index.html', clientes=clientes)
 
@@ -85,35 +130,25 @@ def index():
 @app.route('/cliente/nuevo', methods=['POST'])
 def nuevo_cliente():
     """Crear un nuevo cliente y redirigir a su formulario"""
-    conn = get_db_connection()
-
     # Generar un nombre y slug únicos
     base_name = "Nueva Empresa"
     slug_base = "nueva-empresa"
 
-    # Buscar si ya existen empresas con ese nombre
-    existing_clients = conn.execute(
-        "SELECT nombre_cliente FROM clientes WHERE nombre_cliente LIKE ?",
-        (f"{base_name}%",)
-    ).fetchall()
+    # Buscar si ya existen empresas con ese nombre (en todas las particiones)
+    existing_clients = Cliente.contar_por_prefijo(base_name)
 
     # Generar un nombre único
-    new_name = f"{base_name} {len(existing_clients) + 1}"
-    new_slug = f"{slug_base}-{len(existing_clients) + 1}"
+    new_name = f"{base_name} {existing_clients + 1}"
+    new_slug = f"{slug_base}-{existing_clients + 1}"
 
     # Crear nuevo cliente
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO clientes (nombre_cliente, slug) VALUES (?, ?)",
-        (new_name, new_slug)
-    )
-    conn.commit()
-    cliente_id = cursor.lastrowid
+    cliente = Cliente.crear(new_name, new_slug)
+    if cliente is None:
+        flash(f"Ya existe un cliente llamado '{new_name}'.", "error")
+        return redirect(url_for('index'))
 
     # Crear formulario asociado
-    Formulario.crear(cliente_id)
-
-    conn.close()
+    cliente.crear_formulario()
 
     flash(f"Se ha creado el nuevo cliente '{new_name}'.", "success")
     return redirect(url_for('formulario_cliente', nombre_cliente=new_slug))
@@ -121,28 +156,30 @@ def nuevo_cliente():
 
 @app.route('/cliente/<nombre_cliente>')
 def formulario_cliente(nombre_cliente):
-    conn = get_db_connection()
+    # Si el navegador ya tiene la versión actual del cliente y su formulario
+    # se responde 304 sin cargar ni decodificar el formulario
+    return respuesta_condicional(
+        Cliente.version_por_slug(nombre_cliente),
+        lambda: render_formulario_cliente(nombre_cliente)
+    )
 
-    cliente = conn.execute(
-        'SELECT * FROM clientes WHERE slug = ?',
-        (nombre_cliente,)
-    ).fetchone()
 
-    if not cliente:
-        nombre_display = nombre_cliente.replace('-', ' ').title()
-        conn.execute(
-            'INSERT INTO clientes (nombre_cliente, slug) VALUES (?, ?)',
-            (nombre_display, nombre_cliente)
-        )
-        conn.commit()
+def render_formulario_cliente(nombre_cliente):
+    """Renderiza el formulario de un cliente, creándolo si no existe"""
+    conn = get_connection(slug=nombre_cliente)
 
-        cliente = conn.execute(
-            'SELECT * FROM clientes WHERE slug = ?',
-            (nombre_cliente,)
-        ).fetchone()
+    cliente = conn.execute(consultas.CLIENTE_POR_SLUG, (nombre_cliente,)).fetchone()
 
     conn.close()
 
+    if not cliente:
+        nombre_display = nombre_cliente.replace('-', ' ').title()
+        Cliente.crear(nombre_display, nombre_cliente)
+
+        conn = get_connection(slug=nombre_cliente)
+        cliente = conn.execute(consultas.CLIENTE_POR_SLUG, (nombre_cliente,)).fetchone()
+        conn.close()
+
     formulario_obj = Formulario.obtener_por_cliente(cliente['id'])
 
     formulario_data = {
@@ -164,16 +201,45 @@ def formulario_cliente(nombre_cliente):
         }
     }
 
+    # Con el renderizado bajo demanda solo se incluye el paso actual; el resto
+    # se descarga desde fragmento_paso al navegar
+    bajo_demanda = app.config['RENDER_PASOS_BAJO_DEMANDA']
+    formulario_data['fragmentosUrl'] = [
+        url_for('fragmento_paso', paso=i, v=app.extensions['fragmentos'].version(plantilla))
+        for i, plantilla in enumerate(step_templates, start=1)
+    ] if bajo_demanda else []
+
     return render_template(
         'formulario.html',
         cliente=cliente,
         formulario=formulario_obj,
         formulario_data=formulario_data,
-        step_names=step_names
+        step_names=step_names,
+        step_templates=step_templates,
+        render_bajo_demanda=bajo_demanda
     )
 
 
+@app.route('/fragmentos/paso/<int:paso>')
+def fragmento_paso(paso):
+    """HTML de un paso del formulario para cargarlo bajo demanda"""
+    if not 1 <= paso <= len(step_templates):
+        abort(404)
+
+    plantilla = step_templates[paso - 1]
+    fragmentos = app.extensions['fragmentos']
+    respuesta = make_response(fragmentos.render(plantilla))
+
+    # El HTML de los pasos no depende del cliente: se cachea por versión de
+    # la plantilla (la URL incluye ?v=<versión>)
+    respuesta.set_etag(f"paso{paso}-{fragmentos.version(plantilla)}")
+    respuesta.cache_control.public = True
+    respuesta.cache_control.max_age = app.config['FRAGMENTOS_MAX_AGE']
+    return respuesta.make_conditional(request)
+
+
 @app.route('/api/save', methods=['POST'])
+@controlar_admision()
 def save_form_data():
     """Guardar datos del formulario vía API"""
     try:
@@ -218,7 +284,102 @@ def save_form_data():
         return jsonify({'error': 'Error interno del servidor. Detalles: ' + str(e)}), 500
 
 
+@app.route('/api/save/delta', methods=['POST'])
+@controlar_admision()
+def save_form_delta():
+    """
+    Guardar solo los campos modificados de un paso (autoguardado)
+
+    Recibe {cliente_id, paso, cambios, total}; en los pasos con lista
+    `cambios` va indexado por posición y `total` es la longitud de la lista.
+    También se usa con navigator.sendBeacon al salir de la página.
+    """
+    try:
+        data = request.get_json(force=True, silent=True) or {}
+        cliente_id = data.get('cliente_id')
+        paso = data.get('paso')
+        cambios = data.get('cambios')
+
+        if not all([cliente_id, paso]) or not isinstance(cambios, dict):
+            return jsonify({'error': 'Datos incompletos (cliente_id, paso o cambios faltantes)'}), 400
+
+        formulario_id = Formulario.id_por_cliente(cliente_id) or Formulario.crear(cliente_id).id
+        resultado = Formulario.aplicar_cambios(formulario_id, int(paso), cambios, data.get('total'))
+        if resultado is None:
+            return jsonify({'error': 'Formulario no encontrado'}), 404
+
+        return jsonify({
+            'success': True,
+            'porcentaje': resultado['porcentaje_completado'],
+            'version': resultado['version']
+        })
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app.logger.exception("Error en save_form_delta: %s", e)
+        return jsonify({'error': 'Error interno del servidor. Detalles: ' + str(e)}), 500
+
+
+@app.route('/api/save/lote', methods=['POST'])
+@controlar_admision()
+def save_form_batch():
+    """
+    Guardar varios pasos completos, de uno o varios clientes, en una transacción
+
+    Recibe {cliente_id?, pasos: [{cliente_id?, paso, datos}]}; el cliente_id
+    general se aplica a los pasos que no indican el suyo.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        pasos = data.get('pasos')
+
+        if not isinstance(pasos, list) or not pasos:
+            return jsonify({'error': 'No hay pasos que guardar'}), 400
+        if len(pasos) > app.config['GUARDADO_LOTE_MAX']:
+            return jsonify({'error': f"Máximo {app.config['GUARDADO_LOTE_MAX']} pasos por petición"}), 413
+
+        cliente_id = data.get('cliente_id')
+        elementos = [
+            {'cliente_id': cliente_id, **paso} if isinstance(paso, dict) and 'cliente_id' not in paso else paso
+            for paso in pasos
+        ]
+        return jsonify(Formulario.guardar_pasos_lote(elementos))
+
+    except Exception as e:
+        app.logger.exception("Error en save_form_batch: %s", e)
+        return jsonify({'error': 'Error interno del servidor. Detalles: ' + str(e)}), 500
+
+
+@app.route('/api/sync', methods=['POST'])
+@controlar_admision()
+def sincronizar_pendientes():
+    """
+    Aplicar en una sola transacción los guardados encolados sin conexión
+
+    Recibe {operaciones: [{clave, cliente_id, paso, cambios, total}]}; la
+    clave de idempotencia hace que reenviar una operación no la duplique.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        operaciones = data.get('operaciones')
+
+        if not isinstance(operaciones, list) or not operaciones:
+            return jsonify({'error': 'No hay operaciones que sincronizar'}), 400
+        if len(operaciones) > app.config['SYNC_MAX_OPERACIONES']:
+            return jsonify({
+                'error': f"Máximo {app.config['SYNC_MAX_OPERACIONES']} operaciones por petición"
+            }), 413
+
+        return jsonify(Sincronizacion.aplicar_lote(operaciones, app.config['SYNC_RETENCION_DIAS']))
+
+    except Exception as e:
+        app.logger.exception("Error en sincronizar_pendientes: %s", e)
+        return jsonify({'error': 'Error interno del servidor. Detalles: ' + str(e)}), 500
+
+
 @app.route('/api/upload', methods=['POST'])
+@controlar_admision(subida=True)
 def upload_file():
     try:
         if 'file' not in request.files:
@@ -247,16 +408,11 @@ def upload_file():
         file_path = os.path.join(UPLOAD_FOLDER, unique_filename)
         file.save(file_path)
 
-        conn = get_db_connection()
+        conn = get_connection(cliente_id=cliente_id)
         cursor = conn.cursor()
 
         # 🔎 Obtener formulario activo del cliente
-        cursor.execute("""
-                       SELECT id
-                       FROM formularios_clientes
-                       WHERE cliente_id = ?
-                       ORDER BY fecha_creacion DESC LIMIT 1
-                       """, (cliente_id,))
+        cursor.execute(consultas.ID_FORMULARIO_RECIENTE, (cliente_id,))
 
         row = cursor.fetchone()
         if not row:
@@ -303,13 +459,8 @@ def upload_file():
 
 @app.route('/api/formulario/<int:formulario_id>/archivos')
 def get_form_files(formulario_id):
-    conn = get_db_connection()
-    archivos = conn.execute("""
-                            SELECT *
-                            FROM archivos_clientes
-                            WHERE formulario_id = ?
-                            ORDER BY fecha_subida DESC
-                            """, (formulario_id,)).fetchall()
+    conn = get_connection(formulario_id=formulario_id)
+    archivos = conn.execute(consultas.ARCHIVOS_FORMULARIO, (formulario_id,)).fetchall()
     conn.close()
 
     return jsonify({
@@ -354,67 +505,79 @@ def get_form_files(formulario_id):
 #         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/buscar')
+def buscar_clientes():
+    """
+    Buscar clientes por texto completo (?q=) o por coincidencia exacta de un
+    campo indexado (?campo=nif&valor=...), con resultados paginados
+    """
+    try:
+        pagina = request.args.get('pagina', 1, type=int)
+        por_pagina = request.args.get('por_pagina', 20, type=int)
+        campo = request.args.get('campo')
+
+        if campo:
+            resultado = Busqueda.buscar_exacto(campo, request.args.get('valor', ''), pagina, por_pagina)
+        else:
+            resultado = Busqueda.buscar(request.args.get('q', ''), pagina, por_pagina)
+
+        return jsonify(resultado)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/test-email', methods=['POST'])
+@controlar_admision()
 def test_email_config():
-    """Probar configuración de email"""
-    try:
-        data = request.get_json()
+    """
+    Probar la configuración de correo del paso 4 conectando al servidor SMTP
 
-        # Aquí iría la lógica para probar la conexión SMTP
-        # Por ahora simulamos el test
+    La prueba se hace en segundo plano: si no termina en CORREO_ESPERA_MAX
+    segundos se responde 202 con Retry-After y, al repetir la petición con la
+    misma configuración, se recoge el resultado de la prueba en curso.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
 
-        servidor = data.get('servidor_saliente')
+        servidor = str(data.get('servidor_saliente') or '').strip()
         puerto = data.get('puerto')
-        usuario = data.get('usuario_email')
+        usuario = str(data.get('usuario_email') or '').strip()
 
         if not all([servidor, puerto, usuario]):
             return jsonify({'error': 'Configuración incompleta'}), 400
-
-        # Simulación de test exitoso (70% de probabilidad)
-        import random
-        success = random.random() > 0.3
-
-        if success:
-            return jsonify({
-                'success': True,
-                'mensaje': 'Conexión exitosa al servidor de correo'
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'error': 'No se pudo conectar al servidor. Verifique la configuración.'
-            })
+        try:
+            puerto = int(puerto)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Puerto no válido'}), 400
+        if puerto not in app.config['CORREO_PUERTOS']:
+            return jsonify({'error': 'Puerto no permitido'}), 400
+
+        usa_ssl = {'SI': True, 'NO': False}.get(str(data.get('usa_ssl', '')).upper())
+        probador = app.extensions['prueba_smtp']
+        futuro = probador.probar(servidor, puerto, usuario, data.get('password_email') or None, usa_ssl)
+        resultado = probador.esperar(futuro, app.config['CORREO_ESPERA_MAX'])
+        if resultado is None:
+            respuesta = jsonify({'estado': 'probando'})
+            respuesta.status_code = 202
+            respuesta.headers['Retry-After'] = '2'
+            return respuesta
+
+        return jsonify(resultado)
 
     except Exception as e:
+        app.logger.exception("Error en test_email_config: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/cliente/<cliente_id>/completar', methods=['POST'])
+@app.route('/api/cliente/<int:cliente_id>/completar', methods=['POST'])
 def completar_formulario(cliente_id):
     """Marcar formulario como completado"""
     try:
-        conn = get_db_connection()
-
-        # Actualizar estado del formulario
-        conn.execute('''
-                     UPDATE formularios
-                     SET completado            = 1,
-                         porcentaje_completado = 100,
-                         fecha_completado      = ?,
-                         fecha_actualizacion   = ?
-                     WHERE cliente_id = ?
-                     ''', (datetime.now(), datetime.now(), cliente_id))
-
-        # Actualizar cliente
-        conn.execute('''
-                     UPDATE clientes
-                     SET estado              = 'completado',
-                         fecha_actualizacion = ?
-                     WHERE id = ?
-                     ''', (datetime.now(), cliente_id))
-
-        conn.commit()
-        conn.close()
+        if Formulario.completar(cliente_id) is None:
+            return jsonify({'error': 'Formulario no encontrado'}), 404
 
         return jsonify({
             'success': True,
@@ -425,40 +588,193 @@ def completar_formulario(cliente_id):
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/cliente/<int:cliente_id>/resumen')
+def descargar_resumen(cliente_id):
+    """
+    Descargar el resumen imprimible de un formulario completado (?formato=html|pdf)
+
+    Los resúmenes se generan en segundo plano: si aún no está listo para los
+    datos actuales se encola y se responde 202 con Retry-After.
+    """
+    formato = request.args.get('formato', 'html')
+    if formato not in FORMATOS:
+        return jsonify({'error': 'Formato no válido'}), 400
+    if formato == 'pdf' and not pdf_disponible():
+        return jsonify({'error': 'La generación de PDF no está disponible (falta weasyprint)'}), 501
+
+    try:
+        generador = app.extensions['resumenes']
+        ruta, clave = generador.disponible(cliente_id, formato)
+        if clave is None:
+            return jsonify({'error': 'Formulario no encontrado o sin completar'}), 404
+        if ruta is None:
+            generador.encolar(cliente_id)
+            respuesta = jsonify({'estado': 'generando'})
+            respuesta.status_code = 202
+            respuesta.headers['Retry-After'] = '2'
+            return respuesta
+
+        return send_file(
+            ruta,
+            mimetype='application/pdf' if formato == 'pdf' else 'text/html',
+            as_attachment=True,
+            download_name=f'resumen_cliente_{cliente_id}.{formato}'
+        )
+
+    except Exception as e:
+        app.logger.exception("Error en descargar_resumen: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/cliente/<int:cliente_id>/historial/<int:paso>')
+def historial_paso(cliente_id, paso):
+    """Revisiones guardadas de un paso, de la más reciente a la más antigua"""
+    if paso not in CAMPOS_PASO:
+        return jsonify({'error': 'Paso no válido'}), 400
+    try:
+        revisiones = Historial.listar(cliente_id, paso)
+        if revisiones is None:
+            return jsonify({'error': 'Formulario no encontrado'}), 404
+        return jsonify({'revisiones': revisiones})
+
+    except Exception as e:
+        app.logger.exception("Error en historial_paso: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/cliente/<int:cliente_id>/historial/<int:paso>/<int:numero>')
+def revision_paso(cliente_id, paso, numero):
+    """Datos de un paso tal como estaban en una revisión"""
+    if paso not in CAMPOS_PASO:
+        return jsonify({'error': 'Paso no válido'}), 400
+    try:
+        datos = Historial.reconstruir(cliente_id, paso, numero)
+        if datos is None:
+            return jsonify({'error': 'Revisión no encontrada'}), 404
+        return jsonify({'numero': numero, 'datos': datos})
+
+    except Exception as e:
+        app.logger.exception("Error en revision_paso: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/cliente/<int:cliente_id>/historial/<int:paso>/diff')
+def diferencias_paso(cliente_id, paso):
+    """
+    Cambios de un paso entre dos revisiones (?desde=N&hasta=M); sin `hasta`
+    hasta la última y sin `desde` respecto a la anterior a `hasta`
+    """
+    if paso not in CAMPOS_PASO:
+        return jsonify({'error': 'Paso no válido'}), 400
+    try:
+        hasta = request.args.get('hasta', type=int)
+        if hasta is None:
+            revisiones = Historial.listar(cliente_id, paso)
+            if not revisiones:
+                return jsonify({'error': 'Revisión no encontrada'}), 404
+            hasta = revisiones[0]['numero']
+        desde = request.args.get('desde', default=hasta - 1, type=int)
+
+        cambios = Historial.diferencias(cliente_id, paso, desde, hasta)
+        if cambios is None:
+            return jsonify({'error': 'Revisión no encontrada'}), 404
+        return jsonify({'desde': desde, 'hasta': hasta, 'cambios': cambios})
+
+    except Exception as e:
+        app.logger.exception("Error en diferencias_paso: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/cliente/<int:cliente_id>/historial/<int:paso>/<int:numero>/restaurar', methods=['POST'])
+@controlar_admision()
+def restaurar_revision(cliente_id, paso, numero):
+    """Vuelve a guardar un paso con los datos de una revisión anterior"""
+    if paso not in CAMPOS_PASO:
+        return jsonify({'error': 'Paso no válido'}), 400
+    try:
+        datos = Historial.reconstruir(cliente_id, paso, numero)
+        formulario_obj = Formulario.obtener_por_cliente(cliente_id)
+        if datos is None or formulario_obj is None:
+            return jsonify({'error': 'Revisión no encontrada'}), 404
+
+        if not formulario_obj.guardar_paso(paso, datos):
+            raise Exception("Error al guardar el paso en la base de datos.")
+
+        return jsonify({
+            'success': True,
+            'porcentaje': formulario_obj.porcentaje_completado,
+            'mensaje': f'Paso restaurado a la revisión {numero}'
+        })
+
+    except Exception as e:
+        app.logger.exception("Error en restaurar_revision: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/eventos/progreso')
+def eventos_progreso():
+    """
+    Flujo Server-Sent Events con los cambios de progreso de los clientes
+
+    Al reconectar, el navegador envía Last-Event-ID y recibe los eventos que
+    se perdió; si ya no están en el historial recibe 'reinicio' para recargar.
+    """
+    bus = app.extensions['eventos']
+    ultimo_id = request.headers.get('Last-Event-ID') or request.args.get('ultimo_id')
+
+    flujo = bus.flujo_sse(
+        ultimo_id,
+        latido=app.config['SSE_LATIDO'],
+        duracion_max=app.config['SSE_DURACION_MAX']
+    )
+    respuesta = app.response_class(flujo, mimetype='text/event-stream')
+    respuesta.cache_control.no_cache = True
+    # Evita que nginx acumule el flujo en su búfer
+    respuesta.headers['X-Accel-Buffering'] = 'no'
+    return respuesta
+
+
+@app.route('/api/calidad')
+def resumen_calidad():
+    """Resumen de la última revisión de calidad de los datos (python -m database.calidad)"""
+    try:
+        resumen = calidad.ultimo_resumen(app.config['CALIDAD_DIR'])
+        if resumen is None:
+            return jsonify({'error': 'No hay ninguna revisión de calidad'}), 404
+        return jsonify(resumen)
+    except Exception as e:
+        app.logger.exception("Error en resumen_calidad: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/clientes')
 def get_clientes():
     """API para obtener lista de clientes"""
     try:
-        conn = get_db_connection()
-        clientes = conn.execute('''
-                                SELECT c.*,
-                                       COALESCE(f.paso_actual, 1)           as paso_actual,
-                                       COALESCE(f.porcentaje_completado, 0) as porcentaje_completado,
-                                       COALESCE(f.completado, 0)            as completado
-                                FROM clientes c
-                                         LEFT JOIN formularios f ON c.id = f.cliente_id
-                                ORDER BY c.fecha_creacion DESC
-                                ''').fetchall()
-        conn.close()
-
-        clientes_list = []
-        for cliente in clientes:
-            clientes_list.append({
-                'id': cliente['id'],
-                'nombre_url': cliente['nombre_url'],
-                'estado': cliente['estado'],
-                'paso_actual': cliente['paso_actual'],
-                'porcentaje_completado': cliente['porcentaje_completado'],
-                'completado': bool(cliente['completado']),
-                'fecha_creacion': cliente['fecha_creacion']
-            })
-
-        return jsonify({'clientes': clientes_list})
+        return respuesta_condicional(Cliente.version_lista(), listar_clientes_json)
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def listar_clientes_json():
+    """Listado de clientes con su progreso (sin validación condicional)"""
+    clientes_list = []
+    for cliente in Cliente.listar_con_progreso():
+        clientes_list.append({
+            'id': cliente['id'],
+            'nombre_cliente': cliente['nombre_cliente'],
+            'slug': cliente['slug'],
+            'activo': bool(cliente['activo']),
+            'paso_actual': cliente['paso_actual'],
+            'porcentaje_completado': cliente['porcentaje_completado'],
+            'completado': bool(cliente['completado']),
+            'fecha_creacion': cliente['fecha_creacion']
+        })
+
+    return jsonify({'clientes': clientes_list})
+
+
 def calcular_porcentaje_completado(datos_formulario):
     """Calcular porcentaje de completado basado en los datos del formulario"""
     total_pasos = 6
@@ -528,9 +844,44 @@ def date_filter(value):
     return value
 
 
+# Compresión gzip/brotli de las respuestas de texto
+configurar_compresion(app)
+
+# IP y esquema del cliente a partir de las cabeceras de los proxies de confianza
+if app.config['PROXY_SALTOS']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_SALTOS'],
+                            x_proto=app.config['PROXY_SALTOS'])
+
+# Límites de guardados y subidas por IP, por cliente y por espera en cola
+configurar_admision(app)
+
+# Historial de revisiones de los pasos, escrito en segundo plano tras cada guardado
+if app.config['REVISIONES_ACTIVAS']:
+    app.extensions['revisiones'] = EscritorRevisiones(app.config['REVISIONES_BASE_CADA'])
+    suscribir_progreso(app.extensions['revisiones'].encolar)
+
+# Resúmenes de los formularios completados, generados en segundo plano
+configurar_resumenes(app)
+
+# Pruebas de la configuración de correo del paso 4
+configurar_prueba_smtp(app)
+
+# Revisión periódica de la calidad de los datos (python -m database.calidad)
+configurar_calidad(app)
+
+# Bus de eventos para el progreso en vivo (/api/eventos/progreso)
+configurar_eventos(app)
+
+# Paquetes JS/CSS versionados y la función asset_urls de las plantillas
+configurar_assets(app)
+
+# Caché de bytecode, fragmentos estáticos y precompilación (tras registrar
+# los filtros, que las plantillas necesitan para compilar)
+configurar_plantillas(app)
+
+
 if __name__ == '__main__':
-    # Inicializar base de datos si no existe
-    if not os.path.exists(app.config['DATABASE_PATH']):
-        init_db()
+    # Crear la base de datos o aplicar las migraciones pendientes
+    init_db()
 
-    app.run(debug=True, host='0.0.0.0', port=8080)
+    app.run(debug=app.config['DEBUG'], host='0.0.0.0', port=8080)
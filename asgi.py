@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Punto de entrada ASGI de la aplicación
+
+    python asgi.py                          # uvicorn con la configuración ASGI_*
+    uvicorn asgi:aplicacion --workers 4     # o directamente con uvicorn
+    SERVIDOR_MODO=asgi python servidor.py   # varios procesos con recarga (servidor.py)
+
+Requiere un servidor ASGI (pip install uvicorn). El servidor de desarrollo
+(python app.py) sigue funcionando sin él.
+"""
+
+import sys
+
+from app import app, init_db
+from web.asgi import AplicacionASGI
+
+aplicacion = AplicacionASGI(app, hilos=app.config['ASGI_HILOS'])
+
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("El modo ASGI necesita uvicorn: pip install uvicorn")
+
+    init_db()
+
+    host, _, puerto = app.config['SERVIDOR_DIRECCION'].rpartition(':')
+    uvicorn.run(
+        'asgi:aplicacion',
+        host=host,
+        port=int(puerto),
+        workers=app.config['SERVIDOR_WORKERS'],
+        limit_concurrency=app.config['ASGI_LIMITE_CONEXIONES'],
+        lifespan='on',
+    )
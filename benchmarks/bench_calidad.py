@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la revisión de calidad de los datos: formularios por segundo
+según el número de procesos
+
+Crea una base de datos temporal con --formularios formularios rellenados
+(un --erroneos de ellos con algún campo mal) y la revisa con cada número
+de procesos indicado. En una máquina con N núcleos el ritmo debería crecer
+casi linealmente hasta N procesos.
+
+Uso:
+    python benchmarks/bench_calidad.py [--formularios 100000] [--procesos 1 2 4 8]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import config  # noqa: E402
+from database import calidad, particiones  # noqa: E402
+
+
+def poblar(ruta: str, formularios: int, erroneos: float):
+    aleatorio = random.Random(1)
+    conn = sqlite3.connect(ruta)
+    with conn:
+        conn.execute("DELETE FROM clientes")
+        for inicio in range(1, formularios + 1, 5000):
+            ids = range(inicio, min(inicio + 5000, formularios + 1))
+            conn.executemany(
+                "INSERT INTO clientes (id, nombre_cliente, slug) VALUES (?, ?, ?)",
+                [(i, f'Cliente {i}', f'cliente-{i}') for i in ids]
+            )
+            filas_formularios, filas_trasteros, filas_usuarios = [], [], []
+            for i in ids:
+                malo = aleatorio.random() < erroneos
+                empresa = {
+                    'nombre': f'Empresa {i}', 'nif': '1234' if malo else f'{i % 10**8:08d}Z',
+                    'direccion': 'Calle Mayor 1', 'codigo_postal': '28001', 'provincia': 'Madrid',
+                    'telefono': '600 000 000', 'email': f'info{i}@example.com',
+                    'cuenta_bancaria': 'ES91 2100 0418 4502 0005 1332',
+                }
+                correo = {'servidor_saliente': 'smtp.example.com', 'direccion_servidor': 'smtp.example.com',
+                          'usuario_email': f'info{i}@example.com', 'puerto': '587',
+                          'email_notificaciones': f'avisos{i}@example.com'}
+                filas_formularios.append((i, i, 4, 66, json.dumps(empresa), json.dumps(correo)))
+                for posicion in range(5):
+                    filas_trasteros.append((i, posicion, json.dumps({'numero_trastero': f'T{posicion}', 'metros': 4})))
+                for posicion in range(2):
+                    email = 'sin-arroba' if malo and posicion else f'u{posicion}.{i}@example.com'
+                    filas_usuarios.append((i, posicion, email, json.dumps({'email_usuario': email})))
+            conn.executemany(
+                """INSERT INTO formularios_clientes (id, cliente_id, paso_actual, porcentaje_completado,
+                                                     datos_empresa, config_correo)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                filas_formularios
+            )
+            conn.executemany(
+                "INSERT INTO trasteros_formulario (formulario_id, posicion, datos) VALUES (?, ?, ?)",
+                filas_trasteros
+            )
+            conn.executemany(
+                "INSERT INTO usuarios_formulario (formulario_id, posicion, email_usuario, datos) VALUES (?, ?, ?, ?)",
+                filas_usuarios
+            )
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--formularios', type=int, default=100000)
+    parser.add_argument('--erroneos', type=float, default=0.05, help='fracción de formularios con errores')
+    parser.add_argument('--procesos', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument('--bloque', type=int, default=config.Config.CALIDAD_BLOQUE)
+    args = parser.parse_args()
+
+    temporal = Path(tempfile.mkdtemp(prefix='bench_calidad_'))
+    ruta = temporal / 'formulario_clientes.db'
+    particiones.configurar_particiones(1, ruta)
+    with contextlib.redirect_stdout(io.StringIO()):
+        particiones.inicializar_particiones()
+    poblar(str(ruta), args.formularios, args.erroneos)
+
+    print(f"{args.formularios} formularios, {os.cpu_count()} núcleos\n")
+    print(f"{'procesos':>8} {'segundos':>9} {'formularios/s':>14} {'aceleración':>12} {'con incidencias':>16}")
+    base = None
+    for procesos in sorted(set(args.procesos)):
+        resumen = calidad.revisar(config.Config.VALIDATION_RULES, temporal / 'informes', procesos, args.bloque)
+        ritmo = resumen['formularios'] / resumen['segundos']
+        base = base or ritmo
+        print(f"{procesos:>8} {resumen['segundos']:>9.2f} {ritmo:>14.0f} {ritmo / base:>11.2f}x "
+              f"{resumen['clientes_con_incidencias']:>16}")
+
+
+if __name__ == '__main__':
+    main()
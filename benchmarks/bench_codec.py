@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark de los códecs JSON sobre formularios de tamaño realista
+
+Uso:
+    python benchmarks/bench_codec.py [--trasteros 300] [--repeticiones 200]
+"""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models.codec import CODECS, obtener_codec
+
+
+def formulario_realista(num_trasteros: int) -> dict:
+    """Genera los seis pasos de un formulario grande con textos en español"""
+    return {
+        'datos_empresa': {
+            'nombre': 'Trasteros Logroño Almacenaje S.L.',
+            'nif': '12345678Z',
+            'direccion': 'Avenida de la Paz, 123, nave 4',
+            'codigo_postal': '26004',
+            'provincia': 'La Rioja',
+            'telefono': '+34941123456',
+            'email': 'administración@trasteros-logroño.es',
+            'web': 'https://trasteros-logroño.es',
+            'cuenta_bancaria': 'ES9121000418450200051332',
+            'nombre_banco': 'Caja Rural',
+            'identificador_sepa': 'ES12000B12345678',
+            'numeracion_facturas': 'F-2025-',
+            'numeracion_facturas_rectificativas': 'R-2025-',
+        },
+        'info_trasteros': [
+            {
+                'numero_trastero': f'T-{i:04d}',
+                'metros': str(2 + i % 10),
+                'metros_cubicos': str((2 + i % 10) * 2.5),
+                'precio_sin_iva': f'{40 + i % 60}.00',
+                'precio_con_iva': f'{(40 + i % 60) * 1.21:.2f}',
+                'fianza': '50.00',
+                'descripcion': f'Trastero planta {i % 3}, pasillo {i % 12}, acceso con código',
+            }
+            for i in range(num_trasteros)
+        ],
+        'usuarios_app': [
+            {
+                'nombre_usuario': f'Usuario Número {i}',
+                'email_usuario': f'usuario{i}@trasteros-logroño.es',
+                'rol_usuario': 'administrador' if i == 0 else 'usuario',
+                'departamento_usuario': 'Atención al cliente',
+                'permisos': {'facturacion': i == 0, 'reportes': True, 'configuracion': i == 0},
+            }
+            for i in range(3)
+        ],
+        'config_correo': {
+            'servidor_saliente': 'smtp.trasteros-logroño.es',
+            'direccion_servidor': 'smtp.trasteros-logroño.es',
+            'puerto': '587',
+            'usuario_email': 'notificaciones@trasteros-logroño.es',
+            'usa_ssl': True,
+            'nombre_remitente': 'Trasteros Logroño',
+        },
+        'niveles_acceso': [
+            {
+                'nombre': f'Nivel {i}',
+                'prioridad': str(i),
+                'descripcion': 'Acceso a puertas principales y montacargas',
+                'acceso_24h': i % 2 == 0,
+                'hora_inicio': '07:00',
+                'hora_fin': '22:00',
+                'puertas': [f'puerta_{j}' for j in range(8)],
+            }
+            for i in range(10)
+        ],
+        'documentacion': {'notas_adicionales': 'Contrato firmado. Pendiente plano de la planta 2.'},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--trasteros', type=int, default=300)
+    parser.add_argument('--repeticiones', type=int, default=200)
+    args = parser.parse_args()
+
+    datos = formulario_realista(args.trasteros)
+    print(f"Formulario con {args.trasteros} trasteros, {args.repeticiones} repeticiones\n")
+    print(f"{'códec':<8} {'bytes':>9} {'dumps (ms)':>11} {'loads (ms)':>11}")
+
+    for nombre, clase in CODECS.items():
+        if clase is None:
+            print(f"{nombre:<8} {'no instalado':>9}")
+            continue
+        c = obtener_codec(nombre)
+        texto = c.dumps(datos)
+        t_dumps = min(timeit.repeat(lambda: c.dumps(datos), number=args.repeticiones, repeat=3))
+        t_loads = min(timeit.repeat(lambda: c.loads(texto), number=args.repeticiones, repeat=3))
+        print(f"{nombre:<8} {len(texto.encode('utf-8')):>9} "
+              f"{t_dumps / args.repeticiones * 1000:>11.3f} {t_loads / args.repeticiones * 1000:>11.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Benchmark de concurrencia: modo síncrono (WSGI con N hilos) frente a modo ASGI
+
+Mantiene abiertas varias conexiones lentas (flujos de progreso SSE y subidas
+que llegan poco a poco) y mide, mientras tanto, la latencia de guardados
+normales. En modo síncrono cada conexión lenta ocupa uno de los N hilos; en
+modo ASGI los flujos no ocupan hilo y las subidas solo lo ocupan al procesarse.
+
+Se ejecuta en proceso, sin servidor ni red, sobre una base de datos temporal.
+
+Uso:
+    python benchmarks/bench_concurrencia.py [--hilos 8] [--sse 16] [--subidas 4] [--guardados 200]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+# Base de datos y carpeta de subidas temporales: no se toca la de desarrollo
+os.chdir(tempfile.mkdtemp(prefix='bench_concurrencia_'))
+
+from database.init_db import init_database  # noqa: E402
+
+with contextlib.redirect_stdout(io.StringIO()):
+    init_database('database/formulario_clientes.db')
+
+from app import app  # noqa: E402
+from database import particiones  # noqa: E402
+from models.cliente import Cliente  # noqa: E402
+from werkzeug.test import EnvironBuilder  # noqa: E402
+from web.asgi import AplicacionASGI  # noqa: E402
+
+app.config['DATABASE_PATH'] = str(Path('database/formulario_clientes.db').resolve())
+particiones.configurar_particiones(1, app.config['DATABASE_PATH'])
+
+TROZO_SUBIDA = 16 * 1024
+
+
+def cuerpo_subida(cliente_id: int, kb: int):
+    """Petición multipart de /api/upload con un PDF de `kb` KB"""
+    entorno = EnvironBuilder(
+        path='/api/upload', method='POST',
+        data={'cliente_id': str(cliente_id), 'tipo': 'bench',
+              'file': (io.BytesIO(b'%PDF-1.4\n' + b'0' * kb * 1024), 'bench.pdf')}
+    ).get_environ()
+    return entorno['CONTENT_TYPE'], entorno['wsgi.input'].read()
+
+
+def cuerpo_guardado(cliente_id: int, n: int) -> bytes:
+    return (b'{"cliente_id": %d, "paso": 1, "cambios": {"nombre": "Empresa %d"}}' % (cliente_id, n))
+
+
+# --- Modo síncrono ----------------------------------------------------------
+
+class _EntradaLenta(io.RawIOBase):
+    """wsgi.input que entrega el cuerpo a trozos con una pausa entre ellos"""
+
+    def __init__(self, datos: bytes, pausa: float):
+        self._datos = io.BytesIO(datos)
+        self._pausa = pausa
+
+    def readable(self):
+        return True
+
+    def readinto(self, destino):
+        time.sleep(self._pausa)
+        trozo = self._datos.read(min(len(destino), TROZO_SUBIDA))
+        destino[:len(trozo)] = trozo
+        return len(trozo)
+
+
+def peticion_wsgi(ruta, metodo='GET', cuerpo=b'', tipo='application/json', pausa=0.0, duracion=None):
+    """Atiende una petición completa (como un hilo de un servidor WSGI)"""
+    entorno = EnvironBuilder(path=ruta, method=metodo, content_type=tipo).get_environ()
+    entorno['CONTENT_LENGTH'] = str(len(cuerpo))
+    entorno['wsgi.input'] = io.BufferedReader(_EntradaLenta(cuerpo, pausa)) if pausa else io.BytesIO(cuerpo)
+
+    estado = {}
+    app_iter = app(entorno, lambda status, headers, exc_info=None: estado.setdefault('status', status))
+    limite = time.monotonic() + duracion if duracion else None
+    try:
+        for _ in app_iter:
+            if limite and time.monotonic() > limite:
+                break
+    finally:
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+    return estado.get('status')
+
+
+def ejecutar_sincrono(args, cliente_id, subida):
+    latencias = []
+    with ThreadPoolExecutor(max_workers=args.hilos) as grupo:
+        lentas = [
+            grupo.submit(peticion_wsgi, '/api/eventos/progreso', duracion=args.duracion)
+            for _ in range(args.sse)
+        ] + [
+            grupo.submit(peticion_wsgi, '/api/upload', 'POST', subida[1], subida[0], pausa=args.pausa)
+            for _ in range(args.subidas)
+        ]
+        time.sleep(0.1)
+
+        def guardar(n, enviado):
+            # La latencia incluye la espera hasta que queda un hilo libre
+            peticion_wsgi('/api/save/delta', 'POST', cuerpo_guardado(cliente_id, n))
+            return time.perf_counter() - enviado
+
+        inicio = time.perf_counter()
+        futuros = [grupo.submit(guardar, n, time.perf_counter()) for n in range(args.guardados)]
+        latencias = [f.result() for f in futuros]
+        total = time.perf_counter() - inicio
+        for f in lentas:
+            f.result()
+    return latencias, total
+
+
+# --- Modo ASGI --------------------------------------------------------------
+
+async def peticion_asgi(aplicacion, ruta, metodo='GET', cuerpo=b'', tipo='application/json',
+                        pausa=0.0, duracion=None):
+    """Envía una petición a la aplicación ASGI simulando un cliente lento"""
+    trozos = [cuerpo[i:i + TROZO_SUBIDA] for i in range(0, len(cuerpo), TROZO_SUBIDA)] or [b'']
+    desconectar = asyncio.Event()
+    estado = {}
+
+    async def receive():
+        if trozos:
+            if pausa:
+                await asyncio.sleep(pausa)
+            trozo = trozos.pop(0)
+            return {'type': 'http.request', 'body': trozo, 'more_body': bool(trozos)}
+        await desconectar.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(mensaje):
+        if mensaje['type'] == 'http.response.start':
+            estado['status'] = mensaje['status']
+
+    scope = {
+        'type': 'http', 'method': metodo, 'path': ruta, 'query_string': b'', 'root_path': '',
+        'headers': [(b'content-type', tipo.encode()), (b'content-length', str(len(cuerpo)).encode())],
+        'server': ('localhost', 80), 'client': ('127.0.0.1', 0), 'scheme': 'http', 'http_version': '1.1',
+    }
+    tarea = asyncio.ensure_future(aplicacion(scope, receive, send))
+    if duracion:
+        await asyncio.sleep(duracion)
+        desconectar.set()
+    await tarea
+    desconectar.set()
+    return estado.get('status')
+
+
+async def ejecutar_asgi(args, cliente_id, subida):
+    aplicacion = AplicacionASGI(app, hilos=args.hilos)
+    lentas = [
+        asyncio.ensure_future(peticion_asgi(aplicacion, '/api/eventos/progreso', duracion=args.duracion))
+        for _ in range(args.sse)
+    ] + [
+        asyncio.ensure_future(peticion_asgi(aplicacion, '/api/upload', 'POST', subida[1], subida[0],
+                                            pausa=args.pausa))
+        for _ in range(args.subidas)
+    ]
+    await asyncio.sleep(0.1)
+
+    async def guardar(n):
+        inicio = time.perf_counter()
+        await peticion_asgi(aplicacion, '/api/save/delta', 'POST', cuerpo_guardado(cliente_id, n))
+        return time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    latencias = await asyncio.gather(*(guardar(n) for n in range(args.guardados)))
+    total = time.perf_counter() - inicio
+    await asyncio.gather(*lentas)
+    aplicacion.grupo.shutdown()
+    return latencias, total
+
+
+def resumen(modo, latencias, total):
+    latencias = sorted(latencias)
+    p95 = latencias[int(len(latencias) * 0.95) - 1]
+    print(f"{modo:<10} {len(latencias) / total:>12.1f} {statistics.median(latencias) * 1000:>10.1f} "
+          f"{p95 * 1000:>10.1f} {max(latencias) * 1000:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hilos', type=int, default=8, help='hilos del servidor / del grupo ASGI')
+    parser.add_argument('--sse', type=int, default=16, help='conexiones SSE abiertas')
+    parser.add_argument('--subidas', type=int, default=4, help='subidas lentas simultáneas')
+    parser.add_argument('--guardados', type=int, default=200)
+    parser.add_argument('--duracion', type=float, default=2.0, help='segundos de cada conexión SSE')
+    parser.add_argument('--pausa', type=float, default=0.05, help='segundos entre trozos de subida')
+    parser.add_argument('--kb', type=int, default=256, help='tamaño de cada archivo subido')
+    args = parser.parse_args()
+
+    app.config['SSE_LATIDO'] = 0.5
+    cliente = Cliente.crear('Bench Concurrencia')
+    cliente.crear_formulario()
+    subida = cuerpo_subida(cliente.id, args.kb)
+
+    print(f"{args.hilos} hilos, {args.sse} conexiones SSE de {args.duracion}s, "
+          f"{args.subidas} subidas lentas de {args.kb} KB, {args.guardados} guardados\n")
+    print(f"{'modo':<10} {'guardados/s':>12} {'p50 (ms)':>10} {'p95 (ms)':>10} {'máx (ms)':>10}")
+
+    resumen('síncrono', *ejecutar_sincrono(args, cliente.id, subida))
+    resumen('asgi', *asyncio.run(ejecutar_asgi(args, cliente.id, subida)))
+
+
+if __name__ == '__main__':
+    main()
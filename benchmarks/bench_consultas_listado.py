@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark de los listados de clientes: milisegundos por listado según el
+número de clientes
+
+Crea una base de datos temporal y mide cada listado tras ir añadiendo
+clientes hasta cada cantidad de --clientes. El número de consultas, que no
+debe crecer con los clientes, lo comprueba tests/test_consultas_listado.py.
+
+Uso:
+    python benchmarks/bench_consultas_listado.py [--clientes 10 100 1000] [--particiones 1]
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from database import particiones  # noqa: E402
+from models.cliente import Cliente  # noqa: E402
+
+LISTADOS = {
+    'listar_todos + lista_to_dict': lambda: Cliente.lista_to_dict(Cliente.listar_todos()),
+    'listar_con_progreso (/ y /api/clientes)': Cliente.listar_con_progreso,
+    'version_lista (ETag)': Cliente.version_lista,
+}
+
+
+def crear_clientes(desde: int, hasta: int):
+    for i in range(desde, hasta):
+        formulario = Cliente.crear(f'Cliente listado {i}').crear_formulario()
+        formulario.guardar_paso(1, {'nombre': f'Empresa {i}'})
+
+
+def medir(repeticiones: int) -> dict:
+    """Mejor tiempo en milisegundos de cada listado"""
+    tiempos = {}
+    for nombre, listado in LISTADOS.items():
+        mejor = float('inf')
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            listado()
+            mejor = min(mejor, time.perf_counter() - inicio)
+        tiempos[nombre] = mejor * 1000
+    return tiempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clientes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--particiones', type=int, default=1)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    ruta = Path(tempfile.mkdtemp(prefix='bench_listado_')) / 'formulario_clientes.db'
+    particiones.configurar_particiones(args.particiones, ruta)
+    with contextlib.redirect_stdout(io.StringIO()):
+        particiones.inicializar_particiones()
+
+    cantidades = sorted(set(args.clientes))
+    print(f"{'listado':<42}" + ''.join(f"{n:>9} cl." for n in cantidades))
+    resultados, creados = [], 0
+    for cantidad in cantidades:
+        crear_clientes(creados, cantidad)
+        creados = cantidad
+        resultados.append(medir(args.repeticiones))
+    for nombre in LISTADOS:
+        print(f"{nombre:<42}" + ''.join(f"{r[nombre]:>10.2f}ms" for r in resultados))
+
+
+if __name__ == '__main__':
+    main()
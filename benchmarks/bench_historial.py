@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark del historial de revisiones: crecimiento de la base de datos por
+cada 1.000 guardados y coste de capturar y reconstruir revisiones
+
+Simula el autoguardado de un formulario ya rellenado (un campo de la empresa
+o de un trastero por guardado) y captura una revisión tras cada guardado con
+distintos intervalos entre puntos de control. Con --base-cada 1 todas las
+revisiones son copias completas, la referencia sin deltas.
+
+Uso:
+    python benchmarks/bench_historial.py [--guardados 1000] [--base-cada 1 10 50 100]
+"""
+
+import argparse
+import contextlib
+import io
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from database import particiones  # noqa: E402
+from database.init_db import get_connection  # noqa: E402
+from models.cliente import Cliente  # noqa: E402
+from models.formulario import Formulario  # noqa: E402
+from models.historial import Historial  # noqa: E402
+
+
+def formulario_relleno(cliente_id: int, trasteros: int) -> int:
+    formulario = Cliente.obtener_por_id(cliente_id).crear_formulario()
+    formulario.guardar_paso(1, {
+        'nombre_empresa': 'Trasteros del Norte S.L.', 'nif': '12345678Z', 'email': 'info@example.com',
+        'telefono': '600000000', 'direccion': 'Calle Mayor 1', 'codigo_postal': '28001',
+        'ciudad': 'Madrid', 'provincia': 'Madrid', 'persona_contacto': 'Ana Pérez',
+        'iban': 'ES9121000418450200051332', 'web': 'https://example.com', 'notas': 'Sin notas',
+    })
+    formulario.guardar_paso(2, [
+        {'numero_trastero': f'T{i:03d}', 'metros': 4 + i % 6, 'precio': 40 + i, 'planta': i % 3,
+         'descripcion': f'Trastero {i} con acceso directo'}
+        for i in range(trasteros)
+    ])
+    return formulario.id
+
+
+def tamano_revisiones(conn) -> tuple:
+    filas, bytes_datos = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(length(datos)), 0) FROM revisiones_pasos"
+    ).fetchone()
+    return filas, bytes_datos
+
+
+def medir(base_cada: int, args) -> dict:
+    ruta = Path(tempfile.mkdtemp(prefix='bench_historial_')) / 'formulario_clientes.db'
+    particiones.configurar_particiones(1, ruta)
+    with contextlib.redirect_stdout(io.StringIO()):
+        particiones.inicializar_particiones()
+    cliente = Cliente.crear('Bench Historial')
+    formulario_id = formulario_relleno(cliente.id, args.trasteros)
+
+    cache = OrderedDict()
+    Historial.capturar(cliente.id, base_cada, cache)
+    conn = get_connection()
+    paginas_inicio = conn.execute("PRAGMA page_count").fetchone()[0]
+
+    aleatorio = random.Random(1)
+    capturas = []
+    for i in range(args.guardados):
+        if aleatorio.random() < 0.5:
+            campo = aleatorio.choice(['telefono', 'direccion', 'notas', 'persona_contacto'])
+            Formulario.aplicar_cambios(formulario_id, 1, {campo: f'{campo} {i}'})
+        else:
+            posicion = aleatorio.randrange(args.trasteros)
+            trastero = Formulario.obtener_por_id(formulario_id).info_trasteros[posicion]
+            Formulario.aplicar_cambios(formulario_id, 2, {
+                str(posicion): {**trastero, 'precio': 40 + i % 90}
+            }, args.trasteros)
+        inicio = time.perf_counter()
+        Historial.capturar(cliente.id, base_cada, cache)
+        capturas.append(time.perf_counter() - inicio)
+
+    filas, bytes_datos = tamano_revisiones(conn)
+    tamano_pagina = conn.execute("PRAGMA page_size").fetchone()[0]
+    crecimiento = (conn.execute("PRAGMA page_count").fetchone()[0] - paginas_inicio) * tamano_pagina
+    conn.close()
+
+    revisiones = [r['numero'] for r in Historial.listar(cliente.id, 2)]
+    reconstrucciones = []
+    for numero in aleatorio.sample(revisiones, min(200, len(revisiones))):
+        inicio = time.perf_counter()
+        Historial.reconstruir(cliente.id, 2, numero)
+        reconstrucciones.append(time.perf_counter() - inicio)
+
+    return {
+        'filas': filas,
+        'kb_datos': bytes_datos / 1024 * 1000 / args.guardados,
+        'kb_fichero': crecimiento / 1024 * 1000 / args.guardados,
+        'captura_ms': statistics.mean(capturas) * 1000,
+        'reconstruir_ms': statistics.mean(reconstrucciones) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--guardados', type=int, default=1000)
+    parser.add_argument('--trasteros', type=int, default=20, help='trasteros del formulario')
+    parser.add_argument('--base-cada', type=int, nargs='+', default=[1, 10, 50, 100],
+                        help='revisiones entre puntos de control')
+    args = parser.parse_args()
+
+    print(f"{args.guardados} guardados, formulario con {args.trasteros} trasteros\n")
+    print(f"{'base cada':<10} {'revisiones':>10} {'KB datos/1000':>14} {'KB fichero/1000':>16} "
+          f"{'captura ms':>11} {'reconstruir ms':>15}")
+    for base_cada in args.base_cada:
+        r = medir(base_cada, args)
+        print(f"{base_cada:<10} {r['filas']:>10} {r['kb_datos']:>14.1f} {r['kb_fichero']:>16.1f} "
+              f"{r['captura_ms']:>11.2f} {r['reconstruir_ms']:>15.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark de escritura con los clientes repartidos entre N particiones
+
+Lanza varios procesos que guardan cambios parciales (como /api/save/delta)
+de clientes distintos durante un tiempo fijo y cuenta los guardados por
+segundo con 1, 2, 4... particiones. Todas las bases de datos usan WAL, de
+modo que solo cambia el número de ficheros entre los que se reparten los
+bloqueos de escritura. La mejora depende de los núcleos disponibles.
+
+Uso:
+    python benchmarks/bench_particiones.py [--particiones 1 2 4] [--procesos 4] [--segundos 5]
+"""
+
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from database import particiones  # noqa: E402
+from models.cliente import Cliente  # noqa: E402
+from models.formulario import Formulario  # noqa: E402
+
+
+def preparar(numero: int, num_clientes: int) -> tuple:
+    """Crea las particiones en un directorio temporal con sus clientes y formularios"""
+    ruta_base = Path(tempfile.mkdtemp(prefix=f'bench_particiones_{numero}_')) / 'formulario_clientes.db'
+    particiones.configurar_particiones(numero, ruta_base)
+    # La partición única también en WAL: solo varía el número de ficheros
+    conn = sqlite3.connect(ruta_base)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.close()
+    with contextlib.redirect_stdout(io.StringIO()):
+        particiones.inicializar_particiones()
+
+    formularios = []
+    for i in range(num_clientes):
+        cliente = Cliente.crear(f'Bench Particiones {i}')
+        formularios.append(cliente.crear_formulario().id)
+    return ruta_base, formularios
+
+
+def escritor(numero, ruta_base, formularios, segundos, salida):
+    """Proceso que guarda cambios de sus formularios hasta agotar el tiempo"""
+    particiones.configurar_particiones(numero, ruta_base)
+    guardados = errores = 0
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        for formulario_id in formularios:
+            try:
+                Formulario.aplicar_cambios(formulario_id, 1, {'telefono': f'6{guardados:08d}'})
+                guardados += 1
+            except sqlite3.OperationalError:
+                # database is locked: el bloqueo de la partición no se liberó a tiempo
+                errores += 1
+    salida.put((guardados, errores))
+
+
+def medir(numero: int, args) -> tuple:
+    ruta_base, formularios = preparar(numero, args.clientes)
+    salida = multiprocessing.Queue()
+    procesos = [
+        multiprocessing.Process(
+            target=escritor,
+            args=(numero, ruta_base, formularios[i::args.procesos], args.segundos, salida)
+        )
+        for i in range(args.procesos)
+    ]
+    inicio = time.perf_counter()
+    for proceso in procesos:
+        proceso.start()
+    resultados = [salida.get() for _ in procesos]
+    for proceso in procesos:
+        proceso.join()
+    total = time.perf_counter() - inicio
+    return sum(g for g, _ in resultados) / total, sum(e for _, e in resultados)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--particiones', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--procesos', type=int, default=max(2, os.cpu_count() or 1),
+                        help='procesos escritores simultáneos')
+    parser.add_argument('--clientes', type=int, default=64)
+    parser.add_argument('--segundos', type=float, default=5.0, help='duración de cada medida')
+    args = parser.parse_args()
+
+    print(f"{args.procesos} procesos escritores, {args.clientes} clientes, "
+          f"{args.segundos}s por medida, {os.cpu_count()} núcleos\n")
+    print(f"{'particiones':<12} {'guardados/s':>12} {'bloqueados':>11}")
+    for numero in args.particiones:
+        por_segundo, errores = medir(numero, args)
+        print(f"{numero:<12} {por_segundo:>12.1f} {errores:>11}")
+
+
+if __name__ == '__main__':
+    main()
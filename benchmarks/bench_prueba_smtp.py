@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la prueba de correo del paso 4 contra un servidor SMTP local
+de pruebas
+
+Arranca un servidor SMTP mínimo (saludo, EHLO, AUTH PLAIN, QUIT) que tarda
+--retraso segundos en cada respuesta y lanza a la vez --peticiones pruebas
+repartidas entre --configuraciones configuraciones distintas. Mide cuántas
+conexiones llegan al servidor (las pruebas idénticas se comparten y la caché
+responde a las repetidas) y el tiempo hasta obtener todos los resultados.
+Con --colgado el servidor no responde nunca y se comprueba que cada prueba
+termina en el límite de su fase.
+
+Uso:
+    python benchmarks/bench_prueba_smtp.py [--peticiones 200] [--configuraciones 5] [--retraso 0.2]
+"""
+
+import argparse
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from web.prueba_smtp import ProbadorSMTP  # noqa: E402
+
+
+class ServidorSMTP(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, retraso: float, colgado: bool):
+        self.retraso = retraso
+        self.colgado = colgado
+        self.conexiones = 0
+        self.cerrojo = threading.Lock()
+        super().__init__(('127.0.0.1', 0), ManejadorSMTP)
+
+
+class ManejadorSMTP(socketserver.StreamRequestHandler):
+    def responder(self, linea: str):
+        time.sleep(self.server.retraso)
+        self.wfile.write(linea.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        with self.server.cerrojo:
+            self.server.conexiones += 1
+        if self.server.colgado:
+            self.rfile.readline()
+            return
+        self.responder('220 localhost ESMTP pruebas')
+        for linea in self.rfile:
+            orden = linea.decode('ascii', 'replace').strip().upper()
+            if orden.startswith(('EHLO', 'HELO')):
+                self.responder('250-localhost\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME')
+            elif orden.startswith('AUTH'):
+                self.responder('235 2.7.0 Autenticado')
+            elif orden.startswith('QUIT'):
+                self.responder('221 Hasta luego')
+                return
+            else:
+                self.responder('502 No implementado')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--peticiones', type=int, default=200, help='pruebas lanzadas a la vez')
+    parser.add_argument('--configuraciones', type=int, default=5, help='configuraciones distintas')
+    parser.add_argument('--retraso', type=float, default=0.2, help='segundos por respuesta del servidor')
+    parser.add_argument('--hilos', type=int, default=4, help='pruebas simultáneas del probador')
+    parser.add_argument('--colgado', action='store_true', help='el servidor acepta pero no responde')
+    args = parser.parse_args()
+
+    servidor = ServidorSMTP(args.retraso, args.colgado)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    puerto = servidor.server_address[1]
+    timeouts = {'conexion': 1, 'saludo': 1, 'tls': 1, 'autenticacion': 1}
+    probador = ProbadorSMTP(hilos=args.hilos, timeouts=timeouts)
+
+    def probar(i):
+        usuario = f'usuario{i % args.configuraciones}@example.com'
+        return probador.probar('127.0.0.1', puerto, usuario, 'secreto', usa_ssl=False).result()
+
+    for ronda in ('en frío', 'en caché'):
+        conexiones = servidor.conexiones
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(64) as grupo:
+            resultados = list(grupo.map(probar, range(args.peticiones)))
+        total = time.perf_counter() - inicio
+        correctas = sum(r['success'] for r in resultados)
+        fases = sorted({r['fase'] for r in resultados})
+        print(f"{ronda:<9} {args.peticiones} pruebas: {servidor.conexiones - conexiones} conexiones, "
+              f"{correctas} correctas, fases {fases}, {total:.2f} s")
+
+    servidor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
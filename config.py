@@ -14,12 +14,24 @@ class Config:
     # Base de datos
     BASE_DIR = Path(__file__).parent
     DATABASE_PATH = BASE_DIR / 'database' / 'formulario_clientes.db'
-    
+    # Bases de datos entre las que se reparten los clientes (1 = un solo
+    # fichero); al aumentarlo, `python -m database.rebalanceo` reparte los existentes
+    PARTICIONES = int(os.environ.get('PARTICIONES', 1))
+
+    # Copias de seguridad en caliente (python -m database.copias)
+    COPIAS_DIR = Path(os.environ.get('COPIAS_DIR', BASE_DIR / 'copias'))
+    COPIAS_PAGINAS_POR_PASO = 512  # páginas copiadas con la base de datos bloqueada
+    COPIAS_PAUSA = 0.005  # segundos entre pasos para dejar paso a los guardados
+    COPIAS_MAX_REINICIOS = 3  # reinicios por escrituras antes de copiar de una vez
+
     # Archivos subidos
     UPLOAD_FOLDER = BASE_DIR / 'static' / 'uploads'
     MAX_CONTENT_LENGTH = 5 * 1024 * 1024  # 5MB máximo por archivo
     ALLOWED_EXTENSIONS = {'docx', 'pdf', 'jpg', 'jpeg', 'png', 'gif'}
     
+    # Serialización JSON: 'auto' usa orjson/ujson si están instalados
+    JSON_CODEC = os.environ.get('JSON_CODEC', 'auto')
+    
     # Configuración de formulario
     STEPS_COUNT = 6
     STEP_NAMES = [
@@ -31,6 +43,103 @@ class Config:
         'Documentación'
     ]
     
+    # Renderizar solo el paso actual y cargar el resto bajo demanda
+    RENDER_PASOS_BAJO_DEMANDA = os.environ.get('RENDER_PASOS_BAJO_DEMANDA', 'true').lower() == 'true'
+    FRAGMENTOS_MAX_AGE = 24 * 60 * 60  # segundos de caché de los fragmentos de paso
+    
+    # Plantillas: caché de bytecode en disco y precompilación al arrancar
+    JINJA_CACHE_DIR = BASE_DIR / 'cache' / 'jinja'
+    PRECOMPILAR_PLANTILLAS = True
+    IDIOMAS_DISPONIBLES = ['es']
+    
+    # Recursos estáticos: paquetes minificados, versionados y precomprimidos
+    ASSETS_PIPELINE = os.environ.get('ASSETS_PIPELINE', 'true').lower() == 'true'
+    ASSETS_CONSTRUIR_AL_ARRANCAR = True
+    ASSETS_DIR = BASE_DIR / 'static' / 'dist'
+    ASSETS_BUNDLES = {
+        'base.css': ['css/custom.css'],
+        'base.js': ['js/offline-queue.js', 'js/form-handler.js', 'js/view-switcher.js', 'js/main.js'],
+        'formulario.js': ['js/validation.js'],
+        'index.js': ['js/live-progress.js'],
+    }
+    
+    # Compresión de respuestas y peticiones condicionales
+    COMPRESION_ACTIVA = os.environ.get('COMPRESION_ACTIVA', 'true').lower() == 'true'
+    COMPRESION_MIN_BYTES = 1024  # por debajo no compensa comprimir
+    COMPRESION_NIVEL_GZIP = 6
+    COMPRESION_NIVEL_BROTLI = 5
+    ETAGS_ACTIVOS = True
+    
+    # Guardado de varios pasos en una petición (/api/save/lote)
+    GUARDADO_LOTE_MAX = 60
+    
+    # Control de admisión de guardados y subidas (web/admision.py)
+    ADMISION_ACTIVA = os.environ.get('ADMISION_ACTIVA', 'true').lower() == 'true'
+    # 'memoria' (cada proceso lleva su cuenta) o 'sqlite' (compartida entre workers)
+    ADMISION_ALMACEN = os.environ.get('ADMISION_ALMACEN', 'memoria')
+    ADMISION_ALMACEN_RUTA = BASE_DIR / 'cache' / 'admision.db'
+    ADMISION_RAFAGA_IP = 60         # peticiones seguidas por IP
+    ADMISION_RITMO_IP = 20          # peticiones por segundo sostenidas por IP
+    ADMISION_RAFAGA_CLIENTE = 30    # guardados seguidos por cliente
+    ADMISION_RITMO_CLIENTE = 5      # guardados por segundo sostenidos por cliente
+    # Segundos que una petición puede esperar un hilo libre antes de descartarla (503)
+    ADMISION_ESPERA_MAX = float(os.environ.get('ADMISION_ESPERA_MAX', 2))
+    ADMISION_SUBIDAS_SIMULTANEAS = int(os.environ.get('ADMISION_SUBIDAS_SIMULTANEAS', 4))  # por proceso
+    ADMISION_REINTENTO = 2          # segundos de Retry-After al descartar por carga
+    # Proxies de confianza delante de la aplicación (X-Forwarded-For/-Proto);
+    # 0 = conexión directa, se usa la IP del socket
+    PROXY_SALTOS = int(os.environ.get('PROXY_SALTOS', 0))
+
+    # Historial de revisiones de los pasos (models/historial.py)
+    REVISIONES_ACTIVAS = os.environ.get('REVISIONES_ACTIVAS', 'true').lower() == 'true'
+    REVISIONES_BASE_CADA = 50   # revisiones entre dos copias completas de un paso
+
+    # Resúmenes HTML/PDF de los formularios completados (web/resumenes.py)
+    RESUMENES_DIR = BASE_DIR / 'cache' / 'resumenes'
+    RESUMENES_HILOS = int(os.environ.get('RESUMENES_HILOS', 2))  # generaciones simultáneas
+
+    # Prueba de la configuración de correo del paso 4 (web/prueba_smtp.py)
+    CORREO_PRUEBAS_SIMULTANEAS = int(os.environ.get('CORREO_PRUEBAS_SIMULTANEAS', 4))
+    CORREO_TIMEOUTS = {'conexion': 5, 'saludo': 5, 'tls': 5, 'autenticacion': 5}  # segundos por fase
+    CORREO_ESPERA_MAX = 3         # segundos que espera la petición antes de responder 202
+    CORREO_CACHE_TTL = 300        # segundos que se recuerda una prueba correcta
+    CORREO_CACHE_TTL_ERROR = 30   # segundos que se recuerda una prueba fallida
+    CORREO_PUERTOS = {25, 465, 587, 2525}  # puertos que se pueden probar
+
+    # Revisión de la calidad de los datos (python -m database.calidad, web/calidad.py)
+    CALIDAD_DIR = Path(os.environ.get('CALIDAD_DIR', BASE_DIR / 'cache' / 'calidad'))
+    CALIDAD_PROCESOS = int(os.environ.get('CALIDAD_PROCESOS', 0))  # 0 = uno por núcleo
+    CALIDAD_BLOQUE = 500          # formularios por tarea
+    CALIDAD_INTERVALO = int(os.environ.get('CALIDAD_INTERVALO', 0))  # segundos; 0 = sin revisión periódica
+
+    # Sincronización de guardados hechos sin conexión
+    SYNC_MAX_OPERACIONES = 100  # operaciones por petición a /api/sync
+    SYNC_RETENCION_DIAS = 30    # días que se recuerdan las claves ya aplicadas
+
+    # Progreso en vivo (Server-Sent Events)
+    SSE_LATIDO = 15             # segundos entre comentarios de mantenimiento
+    SSE_DURACION_MAX = 300      # segundos por conexión antes de pedir reconexión
+    SSE_MAX_HISTORIAL = 1000    # eventos recordados para reanudar con Last-Event-ID
+    # Fichero de eventos compartido por todos los workers (en el mismo equipo)
+    SSE_ALMACEN_RUTA = Path(os.environ.get('SSE_ALMACEN_RUTA', BASE_DIR / 'cache' / 'eventos.db'))
+    SSE_SONDEO = 0.5            # segundos entre lecturas de los eventos de otros workers
+
+    # Servidor de producción (python servidor.py): 'wsgi' sirve con hilos,
+    # 'asgi' con uvicorn (ver asgi.py)
+    SERVIDOR_MODO = os.environ.get('SERVIDOR_MODO', 'wsgi')
+    SERVIDOR_DIRECCION = os.environ.get('SERVIDOR_DIRECCION', '0.0.0.0:8000')
+    SERVIDOR_WORKERS = int(os.environ.get('SERVIDOR_WORKERS', (os.cpu_count() or 1) * 2 + 1))
+    SERVIDOR_HILOS = int(os.environ.get('SERVIDOR_HILOS', 4))            # por proceso (modo wsgi)
+    SERVIDOR_MAX_PETICIONES = int(os.environ.get('SERVIDOR_MAX_PETICIONES', 1000))  # 0 = no reciclar
+    SERVIDOR_MAX_PETICIONES_VARIACION = 100  # evita que todos los procesos se reciclen a la vez
+    SERVIDOR_TIEMPO_DRENADO = int(os.environ.get('SERVIDOR_TIEMPO_DRENADO', 30))  # segundos
+    SERVIDOR_TIMEOUT = 60       # segundos sin responder antes de reiniciar un proceso
+
+    # Modo ASGI: hilos por proceso para las vistas síncronas y SQLite (las
+    # conexiones SSE no ocupan hilo) y conexiones simultáneas por proceso
+    ASGI_HILOS = int(os.environ.get('ASGI_HILOS', 8))
+    ASGI_LIMITE_CONEXIONES = int(os.environ.get('ASGI_LIMITE_CONEXIONES', 1000))
+    
     # Validaciones
     VALIDATION_RULES = {
         'nif': r'^[0-9]{8}[A-Z]$',
@@ -67,3 +176,17 @@ config = {
     'testing': TestingConfig,
     'default': DevelopmentConfig
 }
+
+
+def config_entorno():
+    """
+    Configuración elegida con la variable de entorno FLASK_CONFIG
+    (development, production o testing; development si no se indica)
+
+    Raises:
+        ValueError: Si el nombre no corresponde a ninguna configuración
+    """
+    nombre = os.environ.get('FLASK_CONFIG', 'default')
+    if nombre not in config:
+        raise ValueError(f"FLASK_CONFIG desconocida: {nombre} (opciones: {', '.join(config)})")
+    return config[nombre]
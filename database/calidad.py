@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Revisión de la calidad de los datos guardados en todos los formularios
+
+    python -m database.calidad                    # todas las particiones
+    python -m database.calidad --procesos 8 --bloque 1000
+
+Comprueba cada campo con formato conocido (NIF, email, teléfono, código
+postal, IBAN) contra Config.VALIDATION_RULES y las reglas de pasos completos
+del modelo: pasos ya superados (anteriores a paso_actual, o todos si el
+formulario está marcado como completado) sin sus campos obligatorios.
+
+El proceso principal solo calcula los límites de cada bloque de IDs (por el
+índice de la clave primaria); cada proceso del grupo abre la partición en
+solo lectura y lee, decodifica y revisa su bloque, así que la revisión
+escala con los núcleos. Se genera un informe JSON Lines con las incidencias
+de cada cliente y un resumen por paso, campo y regla.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import sqlite3
+import sys
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from database import particiones
+
+# Regla de Config.VALIDATION_RULES que se aplica a cada campo, esté donde esté
+CAMPOS_REGLA = {
+    'nif': 'nif',
+    'email': 'email',
+    'email_usuario': 'email',
+    'email_notificaciones': 'email',
+    'email_respuesta': 'email',
+    'telefono': 'telefono',
+    'codigo_postal': 'codigo_postal',
+    'iban': 'iban',
+    'cuenta_bancaria': 'iban',
+}
+
+# Reglas en las que se ignoran los espacios (como hace el navegador con el teléfono)
+SIN_ESPACIOS = {'telefono', 'iban'}
+
+# Longitud máxima del valor copiado al informe
+MAX_VALOR = 60
+
+# Patrones compilados de cada proceso del grupo
+_patrones: Dict[str, re.Pattern] = {}
+
+
+def _iniciar_proceso(reglas: Dict[str, str]):
+    _patrones.clear()
+    _patrones.update({nombre: re.compile(patron) for nombre, patron in reglas.items()})
+
+
+def revisar_valores(paso: int, datos, posicion: Optional[int] = None) -> List[Dict]:
+    """
+    Incidencias de formato de los datos de un paso (un dict o una lista de dicts)
+
+    Returns:
+        list: {paso, campo, tipo='formato', regla, valor[, posicion]}
+    """
+    if isinstance(datos, list):
+        incidencias = []
+        for i, elemento in enumerate(datos):
+            incidencias.extend(revisar_valores(paso, elemento, i))
+        return incidencias
+    if not isinstance(datos, dict):
+        return []
+
+    incidencias = []
+    for campo, valor in datos.items():
+        regla = CAMPOS_REGLA.get(campo)
+        if regla is None or regla not in _patrones or valor is None or valor == '':
+            continue
+        texto = str(valor).strip()
+        if regla in SIN_ESPACIOS:
+            texto = re.sub(r'\s+', '', texto)
+        if not _patrones[regla].match(texto):
+            incidencia = {'paso': paso, 'campo': campo, 'tipo': 'formato', 'regla': regla,
+                          'valor': str(valor)[:MAX_VALOR]}
+            if posicion is not None:
+                incidencia['posicion'] = posicion
+            incidencias.append(incidencia)
+    return incidencias
+
+
+def revisar_formulario(formulario) -> List[Dict]:
+    """Incidencias de formato y de pasos completos de un Formulario"""
+    from models.formulario import CAMPOS_PASO
+
+    incidencias = []
+    for paso in CAMPOS_PASO:
+        incidencias.extend(revisar_valores(paso, formulario.obtener_datos_paso(paso)))
+
+    # Pasos ya superados, o todos si el formulario se marcó como completado
+    completado = formulario.porcentaje_completado == 100
+    for paso in formulario.pasos_incompletos():
+        if completado or paso < formulario.paso_actual:
+            incidencias.append({'paso': paso, 'tipo': 'incompleto'})
+    return incidencias
+
+
+def revisar_bloque(ruta: str, desde: int, hasta: int) -> Tuple[int, List[Dict]]:
+    """
+    Revisa los formularios con desde < id <= hasta de una partición (se
+    ejecuta en un proceso del grupo)
+
+    Returns:
+        tuple: (formularios revisados, informes de los que tienen incidencias)
+    """
+    from models.formulario import TABLAS_HIJAS, Formulario
+
+    conn = sqlite3.connect(f'file:{ruta}?mode=ro', uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        filas = conn.execute(
+            """SELECT f.*, c.nombre_cliente
+               FROM formularios_clientes f
+                        JOIN clientes c ON c.id = f.cliente_id
+               WHERE f.id > ? AND f.id <= ?
+               ORDER BY f.id""",
+            (desde, hasta)
+        ).fetchall()
+
+        # Filas de las tablas hijas de todo el bloque en una consulta por tabla
+        elementos = {campo: {} for campo in TABLAS_HIJAS}
+        for campo, tabla in TABLAS_HIJAS.items():
+            for fila in conn.execute(
+                f"""SELECT formulario_id, datos FROM {tabla['tabla']}
+                    WHERE formulario_id > ? AND formulario_id <= ?
+                    ORDER BY formulario_id, posicion""",
+                (desde, hasta)
+            ):
+                elementos[campo].setdefault(fila[0], []).append(fila[1])
+    finally:
+        conn.close()
+
+    informes = []
+    for fila in filas:
+        formulario = Formulario(
+            id=fila['id'],
+            cliente_id=fila['cliente_id'],
+            paso_actual=fila['paso_actual'],
+            porcentaje_completado=fila['porcentaje_completado'],
+        )
+        for campo in ('datos_empresa', 'config_correo', 'documentacion'):
+            getattr(Formulario, campo).cargar(formulario, fila[campo])
+        for campo in TABLAS_HIJAS:
+            # Sin filas en la tabla hija se usa la columna JSON (formularios sin migrar)
+            getattr(Formulario, campo).cargar(formulario, elementos[campo].get(fila['id']) or fila[campo])
+
+        try:
+            incidencias = revisar_formulario(formulario)
+        except ValueError as e:
+            incidencias = [{'tipo': 'json', 'error': str(e)[:MAX_VALOR]}]
+        if incidencias:
+            informes.append({
+                'cliente_id': fila['cliente_id'],
+                'nombre_cliente': fila['nombre_cliente'],
+                'formulario_id': fila['id'],
+                'incidencias': incidencias,
+            })
+    return len(filas), informes
+
+
+def bloques(ruta: str, tamano: int) -> Iterator[Tuple[str, int, int]]:
+    """Límites (ruta, desde, hasta] de bloques de `tamano` formularios de una partición"""
+    conn = sqlite3.connect(f'file:{ruta}?mode=ro', uri=True)
+    try:
+        desde = 0
+        while True:
+            fila = conn.execute(
+                "SELECT id FROM formularios_clientes WHERE id > ? ORDER BY id LIMIT 1 OFFSET ?",
+                (desde, tamano - 1)
+            ).fetchone()
+            if fila is None:
+                ultimo = conn.execute(
+                    "SELECT MAX(id) FROM formularios_clientes WHERE id > ?", (desde,)
+                ).fetchone()[0]
+                if ultimo is not None:
+                    yield ruta, desde, ultimo
+                return
+            yield ruta, desde, fila[0]
+            desde = fila[0]
+    finally:
+        conn.close()
+
+
+def revisar(reglas: Dict[str, str], directorio, procesos: Optional[int] = None,
+            tamano_bloque: int = 500) -> Dict:
+    """
+    Revisa todos los formularios de todas las particiones
+
+    Args:
+        reglas (dict): Patrones por regla (Config.VALIDATION_RULES)
+        directorio (Path): Carpeta donde se escriben el informe y el resumen
+        procesos (int): Procesos del grupo (por defecto, uno por núcleo)
+        tamano_bloque (int): Formularios que revisa cada tarea
+
+    Returns:
+        dict: Resumen de la revisión (también guardado como resumen_<fecha>.json)
+    """
+    procesos = procesos or os.cpu_count() or 1
+    directorio = Path(directorio)
+    directorio.mkdir(parents=True, exist_ok=True)
+    marca = datetime.now().strftime('%Y%m%d_%H%M%S')
+    ruta_informe = directorio / f'informe_{marca}.jsonl'
+
+    rutas = [particiones.ruta_particion(p) for p in range(particiones.numero_particiones())]
+    pendientes_bloques = (bloque for ruta in rutas for bloque in bloques(ruta, tamano_bloque))
+
+    revisados = 0
+    clientes = set()
+    por_regla = Counter()
+    por_tipo = Counter()
+    inicio = time.perf_counter()
+    # 'spawn': el grupo se puede crear también desde un proceso con hilos (la aplicación)
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(procesos, mp_context=contexto, initializer=_iniciar_proceso,
+                             initargs=(reglas,)) as grupo, \
+            open(ruta_informe, 'w', encoding='utf-8') as informe:
+        en_curso = set()
+        agotados = False
+        while en_curso or not agotados:
+            # Como mucho dos tareas por proceso: los límites se calculan sobre la marcha
+            while not agotados and len(en_curso) < procesos * 2:
+                bloque = next(pendientes_bloques, None)
+                if bloque is None:
+                    agotados = True
+                else:
+                    en_curso.add(grupo.submit(revisar_bloque, *bloque))
+            if not en_curso:
+                break
+            terminadas, en_curso = wait(en_curso, return_when=FIRST_COMPLETED)
+            for tarea in terminadas:
+                cuantos, informes = tarea.result()
+                revisados += cuantos
+                for registro in informes:
+                    clientes.add(registro['cliente_id'])
+                    for incidencia in registro['incidencias']:
+                        por_tipo[incidencia['tipo']] += 1
+                        if incidencia['tipo'] == 'formato':
+                            por_regla[(incidencia['paso'], incidencia['campo'], incidencia['regla'])] += 1
+                    informe.write(json.dumps(registro, ensure_ascii=False) + '\n')
+
+    duracion = time.perf_counter() - inicio
+    resumen = {
+        'fecha': marca,
+        'informe': str(ruta_informe),
+        'formularios': revisados,
+        'clientes_con_incidencias': len(clientes),
+        'incidencias': dict(por_tipo),
+        'formato': [
+            {'paso': paso, 'campo': campo, 'regla': regla, 'total': total}
+            for (paso, campo, regla), total in sorted(por_regla.items())
+        ],
+        'procesos': procesos,
+        'segundos': round(duracion, 2),
+    }
+    (directorio / f'resumen_{marca}.json').write_text(
+        json.dumps(resumen, ensure_ascii=False, indent=2), encoding='utf-8'
+    )
+    return resumen
+
+
+def ultimo_resumen(directorio) -> Optional[Dict]:
+    """Resumen de la revisión más reciente guardada en el directorio"""
+    resumenes = sorted(Path(directorio).glob('resumen_*.json'))
+    if not resumenes:
+        return None
+    return json.loads(resumenes[-1].read_text(encoding='utf-8'))
+
+
+def imprimir_resumen(resumen: Dict):
+    print(f"{resumen['formularios']} formularios en {resumen['segundos']:.2f} s "
+          f"({resumen['procesos']} procesos); "
+          f"{resumen['clientes_con_incidencias']} clientes con incidencias")
+    for tipo, total in sorted(resumen['incidencias'].items()):
+        print(f"  {tipo:<12} {total:>8}")
+    if resumen['formato']:
+        print(f"\n{'paso':>4}  {'campo':<22} {'regla':<14} {'total':>8}")
+        for fila in resumen['formato']:
+            print(f"{fila['paso']:>4}  {fila['campo']:<22} {fila['regla']:<14} {fila['total']:>8}")
+    print(f"\nInforme por cliente: {resumen['informe']}")
+
+
+def main(argv: Optional[List[str]] = None):
+    import config
+    cfg = config.config_entorno()
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--procesos', type=int, default=cfg.CALIDAD_PROCESOS or None,
+                        help='procesos del grupo (por defecto, uno por núcleo)')
+    parser.add_argument('--bloque', type=int, default=cfg.CALIDAD_BLOQUE, help='formularios por tarea')
+    parser.add_argument('--salida', default=str(cfg.CALIDAD_DIR), help='carpeta del informe y el resumen')
+    args = parser.parse_args(argv)
+
+    particiones.configurar_particiones(cfg.PARTICIONES, cfg.DATABASE_PATH)
+    if not Path(particiones.ruta_particion(0)).exists():
+        sys.exit("No hay base de datos que revisar")
+    imprimir_resumen(revisar(cfg.VALIDATION_RULES, args.salida, args.procesos, args.bloque))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Catálogo de las consultas más frecuentes y comprobación de sus planes
+
+    python -m database.consultas                   # base de datos de prueba con 20.000 clientes
+    python -m database.consultas --clientes 100000
+    python -m database.consultas --bd database/formulario_clientes.db
+
+Las consultas de este módulo son las que usan los modelos y las vistas (no
+copias). La comprobación crea una base de datos de prueba con las
+migraciones y muchos clientes (o usa la indicada con --bd) y revisa el
+EXPLAIN QUERY PLAN de cada consulta, sin estadísticas y tras ANALYZE: falla
+si alguna recorre una tabla entera (SCAN) que no debe recorrer o si ordena
+o agrupa con un B-tree temporal en lugar de usar un índice.
+"""
+
+import argparse
+import contextlib
+import io
+import random
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from database import particiones
+
+# Formulario más reciente de un cliente (idx_formularios_cliente_reciente)
+FORMULARIO_RECIENTE = """SELECT * FROM formularios_clientes
+                         WHERE cliente_id = ?
+                         ORDER BY fecha_creacion DESC, id DESC LIMIT 1"""
+
+# Solo el ID del formulario más reciente (el índice lo cubre, no se lee la tabla)
+ID_FORMULARIO_RECIENTE = """SELECT id FROM formularios_clientes
+                            WHERE cliente_id = ?
+                            ORDER BY fecha_creacion DESC, id DESC LIMIT 1"""
+
+# Archivos de un formulario, los más recientes primero (idx_archivos_formulario_fecha)
+ARCHIVOS_FORMULARIO = """SELECT * FROM archivos_clientes
+                         WHERE formulario_id = ?
+                         ORDER BY fecha_subida DESC"""
+
+# Clientes con el progreso de su formulario más reciente, los más nuevos
+# primero (idx_clientes_fecha); recorre todos los clientes por diseño
+LISTA_CLIENTES = """SELECT c.*,
+                           COALESCE(f.paso_actual, 1)                        AS paso_actual,
+                           COALESCE(f.porcentaje_completado, 0)              AS porcentaje_completado,
+                           COALESCE(f.fecha_actualizacion, c.fecha_creacion) AS ultima_actualizacion
+                    FROM clientes c
+                             LEFT JOIN formularios_clientes f ON f.id = (
+                                 SELECT id FROM formularios_clientes
+                                 WHERE cliente_id = c.id
+                                 ORDER BY fecha_creacion DESC, id DESC LIMIT 1)
+                    ORDER BY c.fecha_creacion DESC"""
+
+CLIENTE_POR_SLUG = "SELECT * FROM clientes WHERE slug = ?"
+
+# Clientes cuyo nombre empieza por un prefijo: GLOB distingue mayúsculas y
+# puede usar el índice UNIQUE de nombre_cliente (LIKE no)
+CONTAR_CLIENTES_PREFIJO = "SELECT COUNT(*) FROM clientes WHERE nombre_cliente GLOB ?"
+
+# Versiones de un cliente y de su formulario más reciente (ETags)
+VERSION_CLIENTE = """SELECT c.id, c.version, f.id, f.version
+                     FROM clientes c
+                              LEFT JOIN formularios_clientes f ON f.id = (
+                                  SELECT id FROM formularios_clientes
+                                  WHERE cliente_id = c.id
+                                  ORDER BY fecha_creacion DESC, id DESC LIMIT 1)
+                     WHERE c.slug = ?"""
+
+# Versión del listado de clientes: contador de cambios mantenido por triggers
+VERSION_LISTA = "SELECT cambios FROM contador_cambios WHERE id = 1"
+
+# Incremento del contador de la versión del listado, en la transacción del
+# cambio y solo si cambia algo visible en el listado
+CONTAR_CAMBIO_LISTA = "UPDATE contador_cambios SET cambios = cambios + 1 WHERE id = 1"
+
+# Lo mismo antes de guardar un formulario (id, paso actual y porcentaje
+# nuevos; porcentaje NULL si no cambia): solo incrementa si el progreso cambia
+CONTAR_CAMBIO_PROGRESO = CONTAR_CAMBIO_LISTA + """
+    AND EXISTS (SELECT 1 FROM formularios_clientes
+                WHERE id = ? AND (paso_actual < ?
+                                  OR porcentaje_completado <> COALESCE(?, porcentaje_completado)))"""
+
+# Progreso del formulario más reciente de varios clientes ({placeholders}:
+# un bloque de IDs, ver consultar_por_bloques)
+PROGRESO_CLIENTES = """SELECT f.cliente_id, f.paso_actual, f.porcentaje_completado
+                       FROM formularios_clientes f
+                       WHERE f.id IN (SELECT (SELECT r.id FROM formularios_clientes r
+                                              WHERE r.cliente_id = c.id
+                                              ORDER BY r.fecha_creacion DESC, r.id DESC LIMIT 1)
+                                      FROM clientes c
+                                      WHERE c.id IN ({placeholders}))"""
+
+# Filas de un paso con lista en su orden ({tabla}: tabla hija del paso)
+ELEMENTOS_PASO = "SELECT datos FROM {tabla} WHERE formulario_id = ? ORDER BY posicion"
+
+# Revisiones de un paso (idx_revisiones_paso_numero)
+LISTA_REVISIONES = """SELECT numero, version, completa, length(datos) AS bytes, fecha
+                      FROM revisiones_pasos
+                      WHERE formulario_id = ? AND paso = ?
+                      ORDER BY numero DESC"""
+
+# Una revisión y las anteriores hasta su punto de control
+REVISIONES_DESDE_CONTROL = """SELECT numero, completa, datos FROM revisiones_pasos
+                              WHERE formulario_id = ? AND paso = ? AND numero <= ?
+                                AND numero >= (SELECT MAX(numero) FROM revisiones_pasos
+                                               WHERE formulario_id = ? AND paso = ? AND numero <= ?
+                                                 AND completa)
+                              ORDER BY numero"""
+
+# Consultas comprobadas: (nombre, SQL, parámetros de ejemplo, tablas que
+# pueden recorrerse enteras)
+CATALOGO = (
+    ('formulario_reciente', FORMULARIO_RECIENTE, (1,), ()),
+    ('id_formulario_reciente', ID_FORMULARIO_RECIENTE, (1,), ()),
+    ('archivos_formulario', ARCHIVOS_FORMULARIO, (1,), ()),
+    ('lista_clientes', LISTA_CLIENTES, (), ('c',)),
+    ('cliente_por_slug', CLIENTE_POR_SLUG, ('cliente-1',), ()),
+    ('contar_clientes_prefijo', CONTAR_CLIENTES_PREFIJO, ('Nueva Empresa*',), ()),
+    ('version_cliente', VERSION_CLIENTE, ('cliente-1',), ()),
+    ('version_lista', VERSION_LISTA, (), ()),
+    ('progreso_clientes', PROGRESO_CLIENTES.format(placeholders='?, ?, ?'), (1, 2, 3), ()),
+    *((f'elementos_{tabla}', ELEMENTOS_PASO.format(tabla=tabla), (1,), ())
+      for tabla in ('trasteros_formulario', 'usuarios_formulario', 'niveles_acceso_formulario')),
+    ('lista_revisiones', LISTA_REVISIONES, (1, 1), ()),
+    ('revisiones_desde_control', REVISIONES_DESDE_CONTROL, (1, 1, 5, 1, 1, 5), ()),
+)
+
+
+def plan(conn, sql: str, parametros=()) -> List[str]:
+    """Pasos del EXPLAIN QUERY PLAN de una consulta"""
+    return [fila[3] for fila in conn.execute(f"EXPLAIN QUERY PLAN {sql}", parametros)]
+
+
+def problemas(pasos: List[str], recorre=()) -> List[str]:
+    """Pasos de un plan que recorren una tabla entera o usan un B-tree temporal"""
+    encontrados = []
+    for paso in pasos:
+        if 'USE TEMP B-TREE' in paso:
+            encontrados.append(paso)
+        elif paso.startswith('SCAN ') and paso.split()[1] not in recorre:
+            encontrados.append(paso)
+    return encontrados
+
+
+def comprobar(conn) -> Dict[str, Dict]:
+    """
+    Planes de todas las consultas del catálogo
+
+    Returns:
+        dict: {nombre: {'plan': [...], 'problemas': [...]}}
+    """
+    return {
+        nombre: {'plan': pasos, 'problemas': problemas(pasos, recorre)}
+        for nombre, sql, parametros, recorre in CATALOGO
+        for pasos in [plan(conn, sql, parametros)]
+    }
+
+
+def poblar(conn, clientes: int, semilla: int = 1):
+    """
+    Rellena una base de datos vacía con `clientes` clientes, dos formularios
+    por cliente (el antiguo y el actual) y sus trasteros, usuarios, niveles,
+    archivos y revisiones
+    """
+    aleatorio = random.Random(semilla)
+    conn.execute("DELETE FROM clientes")
+    for inicio in range(1, clientes + 1, 5000):
+        ids = range(inicio, min(inicio + 5000, clientes + 1))
+        conn.executemany(
+            """INSERT INTO clientes (id, nombre_cliente, slug, fecha_creacion)
+               VALUES (?, ?, ?, datetime('2024-01-01', ? || ' minutes'))""",
+            [(i, f'Cliente {i}', f'cliente-{i}', aleatorio.randrange(10**6)) for i in ids]
+        )
+        formularios = [(2 * i - 1 + antiguo, i, f'2024-01-0{1 + antiguo}') for i in ids for antiguo in (0, 1)]
+        conn.executemany(
+            "INSERT INTO formularios_clientes (id, cliente_id, fecha_creacion, datos_empresa) VALUES (?, ?, ?, '{}')",
+            formularios
+        )
+        actuales = [f for f, _, fecha in formularios if fecha == '2024-01-02']
+        conn.executemany(
+            "INSERT INTO trasteros_formulario (formulario_id, posicion, numero_trastero, datos) VALUES (?, ?, ?, '{}')",
+            [(f, p, f'T{p}') for f in actuales for p in range(5)]
+        )
+        conn.executemany(
+            "INSERT INTO usuarios_formulario (formulario_id, posicion, email_usuario, datos) VALUES (?, ?, ?, '{}')",
+            [(f, p, f'u{p}.{f}@example.com') for f in actuales for p in range(2)]
+        )
+        conn.executemany(
+            "INSERT INTO niveles_acceso_formulario (formulario_id, posicion, nombre, datos) VALUES (?, 0, 'Admin', '{}')",
+            [(f,) for f in actuales]
+        )
+        conn.executemany(
+            """INSERT INTO archivos_clientes (formulario_id, nombre_original, nombre_archivo, tipo_archivo,
+                                              tamaño_bytes, ruta_archivo, paso_formulario, fecha_subida)
+               VALUES (?, 'a.pdf', ?, 'pdf', 1000, '', 6, datetime('2024-02-01', ? || ' minutes'))""",
+            [(f, f'{f}_{n}.pdf', aleatorio.randrange(10**5)) for f in actuales for n in range(3)]
+        )
+        conn.executemany(
+            "INSERT INTO revisiones_pasos (formulario_id, paso, numero, version, completa, datos) VALUES (?, 1, ?, ?, ?, x'00')",
+            [(f, n, n, n % 5 == 1) for f in actuales for n in range(1, 11)]
+        )
+    conn.commit()
+
+
+def imprimir(resultado: Dict[str, Dict]) -> int:
+    """Muestra los planes; devuelve cuántas consultas tienen problemas"""
+    fallos = 0
+    for nombre, datos in resultado.items():
+        estado = 'FALLA' if datos['problemas'] else 'ok'
+        fallos += bool(datos['problemas'])
+        print(f"{estado:<6}{nombre}")
+        for paso in datos['plan']:
+            marca = '  <-- ' if paso in datos['problemas'] else ''
+            print(f"        {paso}{marca}")
+    return fallos
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clientes', type=int, default=20000, help='clientes de la base de datos de prueba')
+    parser.add_argument('--bd', help='comprobar esta base de datos en lugar de una de prueba')
+    args = parser.parse_args(argv)
+
+    if args.bd:
+        conn = sqlite3.connect(f'file:{args.bd}?mode=ro', uri=True)
+        fallos = imprimir(comprobar(conn))
+    else:
+        ruta = Path(tempfile.mkdtemp(prefix='consultas_')) / 'formulario_clientes.db'
+        particiones.configurar_particiones(1, ruta)
+        with contextlib.redirect_stdout(io.StringIO()):
+            particiones.inicializar_particiones()
+        conn = sqlite3.connect(ruta)
+        poblar(conn, args.clientes)
+        print(f"Sin estadísticas ({args.clientes} clientes):")
+        fallos = imprimir(comprobar(conn))
+        conn.execute("ANALYZE")
+        print("\nTras ANALYZE:")
+        fallos += imprimir(comprobar(conn))
+    conn.close()
+
+    if fallos:
+        sys.exit(f"\n{fallos} planes con recorridos completos u ordenaciones temporales")
+    print("\nTodos los planes usan índices")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+Copias de seguridad en caliente: bases de datos y archivos subidos
+
+    python -m database.copias crear                # nueva instantánea
+    python -m database.copias listar
+    python -m database.copias verificar ID
+    python -m database.copias restaurar ID
+
+Cada instantánea es un manifiesto JSON (COPIAS_DIR/instantaneas/ID.json) que
+enlaza, por su SHA-256, las copias de todas las bases de datos (particiones y
+directorio) y de todos los archivos subidos, guardadas una sola vez en
+COPIAS_DIR/objetos/. Lo que no cambia entre instantáneas no se vuelve a
+guardar, y los archivos subidos cuyo tamaño y fecha no cambian tampoco se
+vuelven a leer.
+
+- Las bases de datos se copian con la API de copia en línea de SQLite en
+  pasos de COPIAS_PAGINAS_POR_PASO páginas con una pausa entre ellos: los
+  guardados solo esperan lo que dura un paso. Si la base de datos cambia a
+  mitad de copia, SQLite la reinicia; tras COPIAS_MAX_REINICIOS reinicios se
+  copia de una vez.
+- Primero se copian las bases de datos y después los archivos: como cada
+  archivo se escribe en disco antes de registrarlo en archivos_clientes,
+  todo archivo al que apunta la copia está en la instantánea. Los que falten
+  (borrados a mano) se anotan en el manifiesto.
+- La copia del directorio de particiones se hace antes que la de las
+  particiones; un cliente creado entre ambas se registra de nuevo en el
+  directorio al arrancar tras restaurar. No conviene rebalancear mientras se copia.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from database import particiones
+
+# Carpeta en la que app.py guarda los archivos subidos (ruta_archivo es relativa a ella)
+SUBIDAS = 'uploads'
+
+TAMANO_BLOQUE_LECTURA = 1024 * 1024
+
+
+class ErrorCopia(Exception):
+    """Una instantánea no existe, está incompleta o no se puede restaurar"""
+
+
+class _DemasiadosReinicios(Exception):
+    pass
+
+
+def _sha256(ruta: Path) -> str:
+    resumen = hashlib.sha256()
+    with open(ruta, 'rb') as fichero:
+        for bloque in iter(lambda: fichero.read(TAMANO_BLOQUE_LECTURA), b''):
+            resumen.update(bloque)
+    return resumen.hexdigest()
+
+
+class AlmacenCopias:
+    """
+    Instantáneas y objetos de un directorio de copias
+
+    Args:
+        directorio (Path): Raíz de las copias (COPIAS_DIR)
+    """
+
+    def __init__(self, directorio):
+        self.directorio = Path(directorio)
+        self.objetos = self.directorio / 'objetos'
+        self.instantaneas = self.directorio / 'instantaneas'
+
+    def ruta_objeto(self, sha256: str) -> Path:
+        return self.objetos / sha256[:2] / sha256
+
+    def guardar_objeto(self, origen: Path, sha256: str, mover: bool = False, enlazar: bool = False) -> bool:
+        """
+        Guarda un fichero en el almacén por su contenido
+
+        Args:
+            mover (bool): El origen es temporal y se puede mover
+            enlazar (bool): Crear un enlace duro en lugar de copiar (mismo
+                sistema de ficheros y archivos que no se modifican después)
+
+        Returns:
+            bool: False si ya estaba guardado
+        """
+        destino = self.ruta_objeto(sha256)
+        if destino.exists():
+            if mover:
+                origen.unlink()
+            return False
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        temporal = destino.with_name(destino.name + '.tmp')
+        if mover:
+            shutil.move(str(origen), temporal)
+        elif enlazar:
+            try:
+                os.link(origen, temporal)
+            except OSError:
+                shutil.copy2(origen, temporal)
+        else:
+            shutil.copy2(origen, temporal)
+        # Renombrado atómico: un objeto presente siempre está completo
+        os.replace(temporal, destino)
+        return True
+
+    def manifiesto(self, instantanea: str) -> Dict:
+        ruta = self.instantaneas / f'{instantanea}.json'
+        if not ruta.exists():
+            raise ErrorCopia(f"No existe la instantánea {instantanea}")
+        return json.loads(ruta.read_text(encoding='utf-8'))
+
+    def listar(self) -> List[str]:
+        if not self.instantaneas.exists():
+            return []
+        return sorted(ruta.stem for ruta in self.instantaneas.glob('*.json'))
+
+
+def copiar_base_datos(origen: str, destino: str, paginas: int = 512, pausa: float = 0.005,
+                      max_reinicios: int = 3) -> Dict:
+    """
+    Copia una base de datos en uso con la API de copia en línea de SQLite
+
+    Entre paso y paso no se retiene ningún bloqueo sobre el origen, así que
+    los escritores solo esperan, como mucho, lo que dura un paso.
+
+    Args:
+        origen (str): Base de datos a copiar
+        destino (str): Fichero de la copia (se sobrescribe)
+        paginas (int): Páginas por paso
+        pausa (float): Segundos de pausa entre pasos y entre reintentos
+            mientras el origen está bloqueado
+        max_reinicios (int): Reinicios por escrituras concurrentes antes de
+            copiar todo en un solo paso
+
+    Returns:
+        dict: paginas, pasos, reinicios, segundos y bloqueo_max_ms (paso más
+              largo, incluidas las esperas si el origen estaba bloqueado)
+    """
+    medidas = {'paginas': 0, 'pasos': 0, 'reinicios': 0, 'bloqueo_max_ms': 0.0, 'un_paso': False}
+    estado = {'restantes': None, 'inicio_paso': 0.0}
+
+    def progreso(status, restantes, total):
+        duracion = (time.perf_counter() - estado['inicio_paso']) * 1000
+        medidas['pasos'] += 1
+        medidas['paginas'] = total
+        medidas['bloqueo_max_ms'] = max(medidas['bloqueo_max_ms'], duracion)
+        if estado['restantes'] is not None and restantes >= estado['restantes']:
+            # Otra conexión escribió en el origen: SQLite empezó de nuevo y
+            # el paso no ha adelantado nada
+            medidas['reinicios'] += 1
+            if medidas['reinicios'] > max_reinicios:
+                raise _DemasiadosReinicios()
+        estado['restantes'] = restantes
+        if pausa and restantes:
+            time.sleep(pausa)
+        estado['inicio_paso'] = time.perf_counter()
+
+    inicio = time.perf_counter()
+    conn_origen = sqlite3.connect(origen)
+    try:
+        try:
+            conn_destino = sqlite3.connect(destino)
+            try:
+                estado['inicio_paso'] = time.perf_counter()
+                conn_origen.backup(conn_destino, pages=paginas, progress=progreso, sleep=pausa)
+            finally:
+                conn_destino.close()
+        except _DemasiadosReinicios:
+            # Copia de una vez: en WAL no bloquea a los escritores, en modo
+            # rollback los retiene hasta terminar
+            conn_destino = sqlite3.connect(destino)
+            try:
+                paso = time.perf_counter()
+                conn_origen.backup(conn_destino, sleep=pausa)
+                medidas['bloqueo_max_ms'] = max(medidas['bloqueo_max_ms'], (time.perf_counter() - paso) * 1000)
+                medidas['un_paso'] = True
+            finally:
+                conn_destino.close()
+    finally:
+        conn_origen.close()
+
+    # La copia hereda el modo WAL del origen; como fichero único no deja
+    # -wal ni -shm al abrirla después
+    conn_destino = sqlite3.connect(destino)
+    try:
+        conn_destino.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        conn_destino.close()
+
+    medidas['segundos'] = time.perf_counter() - inicio
+    return medidas
+
+
+def _archivos_referenciados(rutas_copia: List[Path]) -> List[str]:
+    """ruta_archivo de todos los archivos registrados en las copias de las particiones"""
+    rutas = set()
+    for ruta in rutas_copia:
+        conn = sqlite3.connect(ruta)
+        try:
+            if conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'archivos_clientes'"
+            ).fetchone():
+                rutas.update(row[0] for row in conn.execute("SELECT ruta_archivo FROM archivos_clientes"))
+        finally:
+            conn.close()
+    return sorted(rutas)
+
+
+def crear_instantanea(almacen: AlmacenCopias, subidas: str = SUBIDAS, paginas: int = 512,
+                      pausa: float = 0.005, max_reinicios: int = 3, enlazar: bool = False) -> Dict:
+    """
+    Copia las bases de datos y los archivos subidos y escribe el manifiesto
+
+    Returns:
+        dict: El manifiesto de la instantánea, con las medidas de la copia
+    """
+    anterior = almacen.manifiesto(almacen.listar()[-1]) if almacen.listar() else {}
+    instantanea = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+    manifiesto = {
+        'id': instantanea,
+        'fecha': datetime.now(timezone.utc).isoformat(),
+        'particiones': particiones.numero_particiones(),
+        'bases_datos': [],
+        'subidas': {},
+    }
+
+    # El directorio primero (ver docstring del módulo)
+    rutas = [particiones.ruta_particion(p) for p in range(particiones.numero_particiones())]
+    if particiones.particionado():
+        rutas.insert(0, particiones.ruta_directorio())
+
+    almacen.objetos.mkdir(parents=True, exist_ok=True)
+    copias = []
+    for ruta in rutas:
+        descriptor, temporal = tempfile.mkstemp(suffix='.db', dir=almacen.objetos)
+        os.close(descriptor)
+        medidas = copiar_base_datos(ruta, temporal, paginas, pausa, max_reinicios)
+        sha256 = _sha256(Path(temporal))
+        tamano = os.path.getsize(temporal)
+        if ruta != particiones.ruta_directorio():
+            copias.append(almacen.ruta_objeto(sha256))
+        nuevo = almacen.guardar_objeto(Path(temporal), sha256, mover=True)
+        manifiesto['bases_datos'].append({
+            'nombre': Path(ruta).name, 'sha256': sha256, 'bytes': tamano, 'nuevo': nuevo, **medidas,
+        })
+
+    # Archivos subidos: solo se leen los nuevos o modificados
+    previos = anterior.get('subidas', {})
+    inicio = time.perf_counter()
+    copiados = bytes_copiados = 0
+    for ruta in sorted(Path(subidas).rglob('*')) if Path(subidas).is_dir() else []:
+        if not ruta.is_file():
+            continue
+        clave = ruta.as_posix()
+        info = ruta.stat()
+        previo = previos.get(clave)
+        if previo and previo['bytes'] == info.st_size and previo['mtime_ns'] == info.st_mtime_ns \
+                and almacen.ruta_objeto(previo['sha256']).exists():
+            sha256 = previo['sha256']
+        else:
+            sha256 = _sha256(ruta)
+            if almacen.guardar_objeto(ruta, sha256, enlazar=enlazar):
+                copiados += 1
+                bytes_copiados += info.st_size
+        manifiesto['subidas'][clave] = {'sha256': sha256, 'bytes': info.st_size, 'mtime_ns': info.st_mtime_ns}
+
+    manifiesto['faltantes'] = [
+        ruta for ruta in _archivos_referenciados(copias)
+        if Path(ruta).as_posix() not in manifiesto['subidas']
+    ]
+    manifiesto['medidas_subidas'] = {
+        'archivos': len(manifiesto['subidas']),
+        'copiados': copiados,
+        'bytes_copiados': bytes_copiados,
+        'segundos': time.perf_counter() - inicio,
+    }
+
+    # El manifiesto se escribe el último: una instantánea listada está completa
+    almacen.instantaneas.mkdir(parents=True, exist_ok=True)
+    temporal = almacen.instantaneas / f'{instantanea}.json.tmp'
+    temporal.write_text(json.dumps(manifiesto, indent=2, ensure_ascii=False), encoding='utf-8')
+    os.replace(temporal, almacen.instantaneas / f'{instantanea}.json')
+    return manifiesto
+
+
+def verificar_instantanea(almacen: AlmacenCopias, instantanea: str) -> List[str]:
+    """
+    Comprueba que todos los objetos de una instantánea existen y conservan su
+    SHA-256, y que las bases de datos copiadas pasan integrity_check
+
+    Returns:
+        list: Problemas encontrados (vacía si la instantánea está bien)
+    """
+    manifiesto = almacen.manifiesto(instantanea)
+    problemas = []
+    objetos = [(b['nombre'], b['sha256']) for b in manifiesto['bases_datos']]
+    objetos += [(ruta, info['sha256']) for ruta, info in manifiesto['subidas'].items()]
+    for nombre, sha256 in objetos:
+        ruta = almacen.ruta_objeto(sha256)
+        if not ruta.exists():
+            problemas.append(f"{nombre}: falta el objeto {sha256}")
+        elif _sha256(ruta) != sha256:
+            problemas.append(f"{nombre}: el objeto {sha256} está dañado")
+
+    for base in manifiesto['bases_datos']:
+        ruta = almacen.ruta_objeto(base['sha256'])
+        if ruta.exists():
+            conn = sqlite3.connect(f'file:{ruta}?mode=ro', uri=True)
+            try:
+                resultado = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            finally:
+                conn.close()
+            if resultado != 'ok':
+                problemas.append(f"{base['nombre']}: {resultado}")
+    return problemas
+
+
+def restaurar_instantanea(almacen: AlmacenCopias, instantanea: str, subidas: str = SUBIDAS) -> Dict:
+    """
+    Restaura las bases de datos y los archivos subidos de una instantánea
+
+    Cada base de datos se sobrescribe con la API de copia de SQLite, que
+    respeta los bloqueos de las conexiones abiertas, aunque lo recomendable
+    es detener la aplicación. Los archivos subidos que faltan o han cambiado
+    se recuperan; los que no figuran en la instantánea se dejan donde están.
+
+    Returns:
+        dict: bases_datos restauradas, archivos recuperados y sobrantes
+
+    Raises:
+        ErrorCopia: Si la instantánea no existe, está dañada o es de otro
+            número de particiones
+    """
+    manifiesto = almacen.manifiesto(instantanea)
+    if manifiesto['particiones'] != particiones.numero_particiones():
+        raise ErrorCopia(
+            f"La instantánea tiene {manifiesto['particiones']} particiones y la "
+            f"configuración {particiones.numero_particiones()}"
+        )
+    problemas = verificar_instantanea(almacen, instantanea)
+    if problemas:
+        raise ErrorCopia("Instantánea dañada: " + '; '.join(problemas))
+
+    directorio_base = Path(particiones.ruta_particion(0)).parent
+    directorio_base.mkdir(parents=True, exist_ok=True)
+    for base in manifiesto['bases_datos']:
+        conn_origen = sqlite3.connect(f"file:{almacen.ruta_objeto(base['sha256'])}?mode=ro", uri=True)
+        conn_destino = sqlite3.connect(directorio_base / base['nombre'])
+        try:
+            conn_origen.backup(conn_destino)
+        finally:
+            conn_origen.close()
+            conn_destino.close()
+
+    recuperados = 0
+    for clave, info in manifiesto['subidas'].items():
+        ruta = Path(clave)
+        if ruta.exists() and ruta.stat().st_size == info['bytes'] and _sha256(ruta) == info['sha256']:
+            continue
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(almacen.ruta_objeto(info['sha256']), ruta)
+        recuperados += 1
+
+    sobrantes = [
+        ruta.as_posix() for ruta in (Path(subidas).rglob('*') if Path(subidas).is_dir() else [])
+        if ruta.is_file() and ruta.as_posix() not in manifiesto['subidas']
+    ]
+    return {
+        'bases_datos': [base['nombre'] for base in manifiesto['bases_datos']],
+        'recuperados': recuperados,
+        'sobrantes': sobrantes,
+    }
+
+
+def _resumen(manifiesto: Dict):
+    print(f"Instantánea {manifiesto['id']}")
+    print(f"{'base de datos':<42} {'MB':>7} {'MB/s':>7} {'pasos':>6} {'reinicios':>9} {'bloqueo máx':>12}")
+    for base in manifiesto['bases_datos']:
+        mb = base['bytes'] / 1024 / 1024
+        velocidad = mb / base['segundos'] if base['segundos'] else 0
+        nota = ' (de una vez)' if base['un_paso'] else ''
+        print(f"{base['nombre']:<42} {mb:>7.2f} {velocidad:>7.1f} {base['pasos']:>6} "
+              f"{base['reinicios']:>9} {base['bloqueo_max_ms']:>9.1f} ms{nota}")
+    subidas = manifiesto['medidas_subidas']
+    print(f"\nArchivos subidos: {subidas['archivos']} ({subidas['copiados']} nuevos, "
+          f"{subidas['bytes_copiados'] / 1024 / 1024:.2f} MB copiados en {subidas['segundos']:.2f} s)")
+    if manifiesto['faltantes']:
+        print(f"⚠️  {len(manifiesto['faltantes'])} archivos registrados no están en {SUBIDAS}/:")
+        for ruta in manifiesto['faltantes']:
+            print(f"   - {ruta}")
+
+
+def main(argv: Optional[List[str]] = None):
+    import config
+    cfg = config.config_entorno()
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--copias', default=str(cfg.COPIAS_DIR), help='directorio de las copias')
+    parser.add_argument('--subidas', default=SUBIDAS, help='carpeta de archivos subidos')
+    ordenes = parser.add_subparsers(dest='orden', required=True)
+    crear = ordenes.add_parser('crear', help='crear una instantánea')
+    crear.add_argument('--paginas', type=int, default=cfg.COPIAS_PAGINAS_POR_PASO, help='páginas por paso')
+    crear.add_argument('--pausa', type=float, default=cfg.COPIAS_PAUSA, help='segundos entre pasos')
+    crear.add_argument('--max-reinicios', type=int, default=cfg.COPIAS_MAX_REINICIOS)
+    crear.add_argument('--enlazar', action='store_true',
+                       help='enlaces duros en lugar de copias para los archivos subidos')
+    ordenes.add_parser('listar', help='listar las instantáneas')
+    for nombre, ayuda in (('verificar', 'comprobar una instantánea'), ('restaurar', 'restaurar una instantánea')):
+        orden = ordenes.add_parser(nombre, help=ayuda)
+        orden.add_argument('instantanea')
+    args = parser.parse_args(argv)
+
+    particiones.configurar_particiones(cfg.PARTICIONES, cfg.DATABASE_PATH)
+    almacen = AlmacenCopias(args.copias)
+
+    try:
+        if args.orden == 'crear':
+            _resumen(crear_instantanea(almacen, args.subidas, args.paginas, args.pausa,
+                                       args.max_reinicios, args.enlazar))
+        elif args.orden == 'listar':
+            for instantanea in almacen.listar():
+                manifiesto = almacen.manifiesto(instantanea)
+                print(f"{instantanea}  {len(manifiesto['bases_datos'])} bases de datos, "
+                      f"{len(manifiesto['subidas'])} archivos")
+        elif args.orden == 'verificar':
+            problemas = verificar_instantanea(almacen, args.instantanea)
+            for problema in problemas:
+                print(f"❌ {problema}")
+            if problemas:
+                sys.exit(1)
+            print("✅ Instantánea correcta")
+        else:
+            resultado = restaurar_instantanea(almacen, args.instantanea, args.subidas)
+            print(f"✅ Restauradas: {', '.join(resultado['bases_datos'])}; "
+                  f"{resultado['recuperados']} archivos recuperados")
+            if resultado['sobrantes']:
+                print(f"ℹ️  {len(resultado['sobrantes'])} archivos de {args.subidas}/ no figuran en la instantánea")
+    except ErrorCopia as e:
+        sys.exit(f"❌ {e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,75 +5,102 @@ Inicialización de la base de datos SQLite para el formulario de clientes
 
 import sqlite3
 import os
-from pathlib import Path
 
 def init_database(db_path='database/formulario_clientes.db'):
     """
-    Inicializa la base de datos SQLite con el esquema definido
+    Crea o actualiza la base de datos SQLite aplicando las migraciones pendientes
     
     Args:
         db_path (str): Ruta al archivo de base de datos
     """
+    from database.migraciones import ErrorMigracion, aplicar_migraciones
+
     # Crear directorio si no existe
     db_dir = os.path.dirname(db_path)
     if db_dir and not os.path.exists(db_dir):
         os.makedirs(db_dir)
     
-    # Leer el esquema SQL
-    schema_path = Path(__file__).parent / 'schema.sql'
-    
     try:
-        with open(schema_path, 'r', encoding='utf-8') as f:
-            schema_sql = f.read()
+        conn = get_connection(db_path)
         
-        # Conectar a la base de datos
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
+        aplicadas = aplicar_migraciones(conn)
+        if aplicadas:
+            print("🔀 Migraciones aplicadas:")
+            for nombre in aplicadas:
+                print(f"   - {nombre}")
         
-        # Ejecutar el esquema
-        cursor.executescript(schema_sql)
-        
-        # Confirmar cambios
-        conn.commit()
-        
-        print(f"✅ Base de datos inicializada correctamente en: {db_path}")
+        print(f"✅ Base de datos al día en: {db_path}")
         
         # Verificar tablas creadas
+        cursor = conn.cursor()
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
         tables = cursor.fetchall()
         
-        print("📋 Tablas creadas:")
+        print("📋 Tablas:")
         for table in tables:
             print(f"   - {table[0]}")
         
         # Verificar datos de ejemplo
         cursor.execute("SELECT COUNT(*) FROM clientes;")
         count = cursor.fetchone()[0]
-        print(f"👥 Clientes de ejemplo: {count}")
+        print(f"👥 Clientes: {count}")
         
         conn.close()
         
-    except FileNotFoundError:
-        print(f"❌ Error: No se encontró el archivo schema.sql en {schema_path}")
+    except ErrorMigracion as e:
+        print(f"❌ Error de migración: {e}")
     except sqlite3.Error as e:
         print(f"❌ Error de SQLite: {e}")
     except Exception as e:
         print(f"❌ Error inesperado: {e}")
 
-def get_connection(db_path='database/formulario_clientes.db'):
+def get_connection(db_path=None, cliente_id=None, slug=None, formulario_id=None):
     """
     Obtiene una conexión a la base de datos
     
+    Sin ruta explícita se conecta a la partición del cliente indicado por su
+    ID, su slug o el ID de su formulario (ver database/particiones.py); sin
+    particionar, o sin cliente, a la base de datos principal.
+    
     Args:
-        db_path (str): Ruta al archivo de base de datos
+        db_path (str): Ruta al archivo de base de datos (opcional)
+        cliente_id (int): ID del cliente cuyos datos se van a consultar
+        slug (str): Slug del cliente
+        formulario_id (int): ID de un formulario del cliente
         
     Returns:
         sqlite3.Connection: Conexión a la base de datos
     """
+    if db_path is None:
+        from database import particiones
+        db_path = particiones.ruta_particion(particiones.localizar(cliente_id, slug, formulario_id))
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row  # Para acceder a columnas por nombre
     return conn
 
+def reconstruir_indice_busqueda(db_path='database/formulario_clientes.db', forzar=False):
+    """
+    Rellena el índice de búsqueda (FTS5) a partir de los formularios guardados
+    
+    Args:
+        db_path (str): Ruta al archivo de base de datos
+        forzar (bool): Regenerar aunque el índice ya tenga contenido
+        
+    Returns:
+        int: Número de formularios indexados (0 si no hizo falta)
+    """
+    from models.busqueda import Busqueda
+
+    conn = get_connection(db_path)
+    try:
+        if not forzar and conn.execute("SELECT 1 FROM busqueda_clientes LIMIT 1").fetchone():
+            return 0
+        indexados = Busqueda.reconstruir_indice(conn)
+        conn.commit()
+        return indexados
+    finally:
+        conn.close()
+
 def create_client(nombre_cliente, slug=None):
     """
     Crea un nuevo cliente en la base de datos
@@ -91,16 +118,25 @@ def create_client(nombre_cliente, slug=None):
         slug = re.sub(r'[^a-zA-Z0-9\s-]', '', nombre_cliente.lower())
         slug = re.sub(r'\s+', '-', slug.strip())
     
-    conn = get_connection()
-    cursor = conn.cursor()
-    
+    from database import consultas, particiones
+
+    conn = None
     try:
-        cursor.execute(
-            "INSERT INTO clientes (nombre_cliente, slug) VALUES (?, ?)",
-            (nombre_cliente, slug)
-        )
-        cliente_id = cursor.lastrowid
-        conn.commit()
+        # Con particiones, el directorio asigna el ID y la partición
+        cliente_id, particion = particiones.registrar_cliente(nombre_cliente, slug)
+        try:
+            conn = get_connection(particiones.ruta_particion(particion))
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO clientes (id, nombre_cliente, slug) VALUES (?, ?, ?)",
+                (cliente_id, nombre_cliente, slug)
+            )
+            cliente_id = cursor.lastrowid
+            cursor.execute(consultas.CONTAR_CAMBIO_LISTA)
+            conn.commit()
+        except Exception:
+            particiones.anular_cliente(cliente_id)
+            raise
         
         print(f"✅ Cliente creado: {nombre_cliente} (ID: {cliente_id}, Slug: {slug})")
         return cliente_id
@@ -109,14 +145,20 @@ def create_client(nombre_cliente, slug=None):
         print(f"❌ Error: Ya existe un cliente con el nombre '{nombre_cliente}' o slug '{slug}'")
         return None
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
 
 if __name__ == "__main__":
+    # init_database importa el paquete database: la raíz del proyecto va en la ruta
+    import sys
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
     # Inicializar base de datos
     init_database()
     
     # Ejemplo de uso
     print("\n🔧 Funciones disponibles:")
-    print("- init_database(): Inicializar/recrear la base de datos")
+    print("- init_database(): Crear la base de datos o aplicar las migraciones pendientes")
     print("- get_connection(): Obtener conexión a la BD")
     print("- create_client(nombre, slug): Crear nuevo cliente")
@@ -0,0 +1,182 @@
+-- Esquema de Base de Datos para Formulario Dinámico de Clientes
+-- SQLite Database Schema
+
+-- Tabla principal de clientes
+CREATE TABLE IF NOT EXISTS clientes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre_cliente VARCHAR(100) UNIQUE NOT NULL,
+    slug VARCHAR(100) UNIQUE NOT NULL, -- URL-friendly name
+    fecha_creacion DATETIME DEFAULT CURRENT_TIMESTAMP,
+    activo BOOLEAN DEFAULT TRUE,
+    completado BOOLEAN DEFAULT FALSE,
+    version INTEGER NOT NULL DEFAULT 1 -- se incrementa en cada modificación (ETags)
+);
+
+-- Tabla de formularios completados por cliente
+CREATE TABLE IF NOT EXISTS formularios_clientes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cliente_id INTEGER NOT NULL,
+    
+    -- Paso 1: Datos de la empresa (JSON)
+    datos_empresa TEXT,
+    
+    -- Paso 2: Información de trasteros (JSON)
+    info_trasteros TEXT,
+    
+    -- Paso 3: Usuarios de la aplicación (JSON)
+    usuarios_app TEXT,
+    
+    -- Paso 4: Configuración de correo (JSON)
+    config_correo TEXT,
+    
+    -- Paso 5: Niveles de acceso (JSON)
+    niveles_acceso TEXT,
+    
+    -- Paso 6: Documentación (JSON con rutas de archivos)
+    documentacion TEXT,
+    
+    -- Control de progreso
+    paso_actual INTEGER DEFAULT 1,
+    porcentaje_completado INTEGER DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 1, -- se incrementa en cada guardado (ETags)
+    
+    -- Timestamps
+    fecha_creacion DATETIME DEFAULT CURRENT_TIMESTAMP,
+    fecha_actualizacion DATETIME DEFAULT CURRENT_TIMESTAMP,
+    
+    FOREIGN KEY (cliente_id) REFERENCES clientes (id) ON DELETE CASCADE
+);
+
+-- Paso 2 normalizado: un registro por trastero
+CREATE TABLE IF NOT EXISTS trasteros_formulario (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    formulario_id INTEGER NOT NULL,
+    posicion INTEGER NOT NULL, -- orden dentro del formulario
+    numero_trastero VARCHAR(50),
+    metros REAL,
+    precio_sin_iva REAL,
+    datos TEXT NOT NULL, -- JSON con el trastero completo
+    fecha_actualizacion DATETIME DEFAULT CURRENT_TIMESTAMP,
+
+    UNIQUE (formulario_id, posicion),
+    FOREIGN KEY (formulario_id) REFERENCES formularios_clientes (id) ON DELETE CASCADE
+);
+
+-- Paso 3 normalizado: un registro por usuario de la aplicación
+CREATE TABLE IF NOT EXISTS usuarios_formulario (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    formulario_id INTEGER NOT NULL,
+    posicion INTEGER NOT NULL,
+    email_usuario VARCHAR(255),
+    nombre_usuario VARCHAR(255),
+    rol_usuario VARCHAR(50),
+    datos TEXT NOT NULL, -- JSON con el usuario completo
+    fecha_actualizacion DATETIME DEFAULT CURRENT_TIMESTAMP,
+
+    UNIQUE (formulario_id, posicion),
+    FOREIGN KEY (formulario_id) REFERENCES formularios_clientes (id) ON DELETE CASCADE
+);
+
+-- Paso 5 normalizado: un registro por nivel de acceso
+CREATE TABLE IF NOT EXISTS niveles_acceso_formulario (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    formulario_id INTEGER NOT NULL,
+    posicion INTEGER NOT NULL,
+    nombre VARCHAR(100),
+    prioridad VARCHAR(20),
+    datos TEXT NOT NULL, -- JSON con el nivel completo
+    fecha_actualizacion DATETIME DEFAULT CURRENT_TIMESTAMP,
+
+    UNIQUE (formulario_id, posicion),
+    FOREIGN KEY (formulario_id) REFERENCES formularios_clientes (id) ON DELETE CASCADE
+);
+
+-- Índice de búsqueda de texto completo (rowid = id del formulario)
+CREATE VIRTUAL TABLE IF NOT EXISTS busqueda_clientes USING fts5(
+    nombre_cliente,
+    slug,
+    nif,
+    email,
+    telefono,
+    trasteros, -- números de trastero
+    usuarios, -- nombres y emails de usuarios de la aplicación
+    contenido, -- resto de textos del formulario (sin contraseñas)
+    cliente_id UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+
+-- Tabla para archivos subidos
+CREATE TABLE IF NOT EXISTS archivos_clientes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    formulario_id INTEGER NOT NULL,
+    nombre_original VARCHAR(255) NOT NULL,
+    nombre_archivo VARCHAR(255) NOT NULL, -- nombre único en el servidor
+    tipo_archivo VARCHAR(50) NOT NULL, -- docx, pdf, jpg, png
+    tamaño_bytes INTEGER NOT NULL,
+    ruta_archivo VARCHAR(500) NOT NULL,
+    paso_formulario INTEGER NOT NULL, -- en qué paso se subió
+    fecha_subida DATETIME DEFAULT CURRENT_TIMESTAMP,
+    
+    FOREIGN KEY (formulario_id) REFERENCES formularios_clientes (id) ON DELETE CASCADE
+);
+
+-- Operaciones de guardado ya aplicadas por la sincronización offline; la
+-- clave de idempotencia la genera el navegador, de modo que reenviar una
+-- operación devuelve el resultado guardado en lugar de aplicarla otra vez
+CREATE TABLE IF NOT EXISTS operaciones_sincronizadas (
+    clave VARCHAR(64) PRIMARY KEY,
+    cliente_id INTEGER NOT NULL,
+    paso INTEGER,
+    resultado TEXT NOT NULL, -- JSON con el resultado devuelto al aplicarla
+    fecha DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Tabla de logs para auditoría
+CREATE TABLE IF NOT EXISTS logs_formulario (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cliente_id INTEGER NOT NULL,
+    formulario_id INTEGER,
+    accion VARCHAR(100) NOT NULL, -- 'creado', 'actualizado', 'completado', 'archivo_subido'
+    paso INTEGER,
+    detalles TEXT, -- JSON con detalles adicionales
+    ip_address VARCHAR(45),
+    user_agent TEXT,
+    fecha DATETIME DEFAULT CURRENT_TIMESTAMP,
+    
+    FOREIGN KEY (cliente_id) REFERENCES clientes (id) ON DELETE CASCADE,
+    FOREIGN KEY (formulario_id) REFERENCES formularios_clientes (id) ON DELETE CASCADE
+);
+
+-- Índices para mejorar rendimiento
+CREATE INDEX IF NOT EXISTS idx_clientes_slug ON clientes(slug);
+CREATE INDEX IF NOT EXISTS idx_formularios_cliente ON formularios_clientes(cliente_id);
+CREATE INDEX IF NOT EXISTS idx_archivos_formulario ON archivos_clientes(formulario_id);
+CREATE INDEX IF NOT EXISTS idx_logs_cliente ON logs_formulario(cliente_id);
+CREATE INDEX IF NOT EXISTS idx_logs_fecha ON logs_formulario(fecha);
+CREATE INDEX IF NOT EXISTS idx_operaciones_fecha ON operaciones_sincronizadas(fecha);
+CREATE INDEX IF NOT EXISTS idx_trasteros_numero ON trasteros_formulario(formulario_id, numero_trastero);
+CREATE INDEX IF NOT EXISTS idx_trasteros_codigo ON trasteros_formulario(numero_trastero);
+CREATE INDEX IF NOT EXISTS idx_usuarios_email ON usuarios_formulario(formulario_id, email_usuario);
+CREATE INDEX IF NOT EXISTS idx_usuarios_email_global ON usuarios_formulario(email_usuario);
+CREATE INDEX IF NOT EXISTS idx_niveles_nombre ON niveles_acceso_formulario(formulario_id, nombre);
+
+-- Índices de expresión para búsquedas exactas sobre datos_empresa (JSON)
+CREATE INDEX IF NOT EXISTS idx_empresa_nif ON formularios_clientes(upper(json_extract(datos_empresa, '$.nif')));
+CREATE INDEX IF NOT EXISTS idx_empresa_email ON formularios_clientes(lower(json_extract(datos_empresa, '$.email')));
+CREATE INDEX IF NOT EXISTS idx_empresa_telefono ON formularios_clientes(json_extract(datos_empresa, '$.telefono'));
+
+-- Trigger para actualizar fecha_actualizacion automáticamente
+CREATE TRIGGER IF NOT EXISTS update_formulario_timestamp 
+    AFTER UPDATE ON formularios_clientes
+    FOR EACH ROW
+BEGIN
+    UPDATE formularios_clientes 
+    SET fecha_actualizacion = CURRENT_TIMESTAMP 
+    WHERE id = NEW.id;
+END;
+
+-- Datos de ejemplo para testing
+INSERT OR IGNORE INTO clientes (nombre_cliente, slug) VALUES 
+    ('Empresa Ejemplo S.L.', 'empresa-ejemplo'),
+    ('Trasteros Madrid', 'trasteros-madrid'),
+    ('Almacenes Barcelona', 'almacenes-barcelona');
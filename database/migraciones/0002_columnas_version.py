@@ -0,0 +1,16 @@
+"""
+Columna version de clientes y formularios_clientes (ETags) en las bases de
+datos creadas antes de que formara parte del esquema inicial
+"""
+
+COLUMNAS = [
+    ('clientes', 'version', 'INTEGER NOT NULL DEFAULT 1'),
+    ('formularios_clientes', 'version', 'INTEGER NOT NULL DEFAULT 1'),
+]
+
+
+def migrar(conn):
+    for tabla, columna, definicion in COLUMNAS:
+        existentes = {row[1] for row in conn.execute(f"PRAGMA table_info({tabla})")}
+        if columna not in existentes:
+            conn.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
@@ -0,0 +1,116 @@
+"""
+Mueve a sus tablas hijas los trasteros, usuarios y niveles de acceso guardados
+como JSON y rellena el índice de búsqueda de las bases de datos anteriores a
+ambos cambios
+
+No usa los modelos: la migración debe hacer siempre lo mismo aunque estos
+cambien después.
+"""
+
+import json
+
+# Columna JSON del paso: (tabla hija, columnas indexadas de cada elemento)
+TABLAS_HIJAS = {
+    'info_trasteros': ('trasteros_formulario', ('numero_trastero', 'metros', 'precio_sin_iva')),
+    'usuarios_app': ('usuarios_formulario', ('email_usuario', 'nombre_usuario', 'rol_usuario')),
+    'niveles_acceso': ('niveles_acceso_formulario', ('nombre', 'prioridad')),
+}
+
+
+def _json(valor, defecto):
+    try:
+        return json.loads(valor) if valor else defecto
+    except ValueError:
+        return defecto
+
+
+def _volcar(valor) -> str:
+    return json.dumps(valor, ensure_ascii=False, separators=(',', ':'))
+
+
+def _textos(datos) -> list:
+    """Valores de texto de un paso, sin contraseñas"""
+    if isinstance(datos, dict):
+        return [t for clave, valor in datos.items() if 'password' not in clave for t in _textos(valor)]
+    if isinstance(datos, list):
+        return [t for elemento in datos for t in _textos(elemento)]
+    if isinstance(datos, (str, int, float)) and not isinstance(datos, bool):
+        return [str(datos)]
+    return []
+
+
+def mover_listas(conn):
+    """Copia las listas JSON a las tablas hijas y deja las columnas en '[]'"""
+    filas = conn.execute(
+        """SELECT id, info_trasteros, usuarios_app, niveles_acceso
+           FROM formularios_clientes
+           WHERE COALESCE(info_trasteros, '[]') NOT IN ('[]', '')
+              OR COALESCE(usuarios_app, '[]') NOT IN ('[]', '{}', '')
+              OR COALESCE(niveles_acceso, '[]') NOT IN ('[]', '{}', '')"""
+    ).fetchall()
+
+    for formulario_id, *valores in filas:
+        for (tabla, columnas), valor in zip(TABLAS_HIJAS.values(), valores):
+            elementos = _json(valor, [])
+            if not isinstance(elementos, list):
+                continue
+            conn.execute(f"DELETE FROM {tabla} WHERE formulario_id = ?", (formulario_id,))
+            conn.executemany(
+                f"""INSERT INTO {tabla} (formulario_id, posicion, {', '.join(columnas)}, datos)
+                    VALUES (?, ?, {', '.join('?' for _ in columnas)}, ?)""",
+                [
+                    (formulario_id, posicion,
+                     *(elemento.get(c) if isinstance(elemento, dict) else None for c in columnas),
+                     _volcar(elemento))
+                    for posicion, elemento in enumerate(elementos)
+                ]
+            )
+        conn.execute(
+            """UPDATE formularios_clientes
+               SET info_trasteros = '[]', usuarios_app = '[]', niveles_acceso = '[]',
+                   fecha_actualizacion = CURRENT_TIMESTAMP
+               WHERE id = ?""",
+            (formulario_id,)
+        )
+
+
+def rellenar_busqueda(conn):
+    """Indexa todos los formularios en busqueda_clientes"""
+    def elementos(tabla, formulario_id):
+        return [_json(datos, {}) for (datos,) in conn.execute(
+            f"SELECT datos FROM {tabla} WHERE formulario_id = ? ORDER BY posicion", (formulario_id,)
+        )]
+
+    filas = conn.execute(
+        """SELECT f.id, f.cliente_id, c.nombre_cliente, c.slug, f.datos_empresa, f.config_correo
+           FROM formularios_clientes f JOIN clientes c ON c.id = f.cliente_id"""
+    ).fetchall()
+    for formulario_id, cliente_id, nombre, slug, datos_empresa, config_correo in filas:
+        empresa = _json(datos_empresa, {})
+        empresa = empresa if isinstance(empresa, dict) else {}
+        trasteros = elementos('trasteros_formulario', formulario_id)
+        usuarios = elementos('usuarios_formulario', formulario_id)
+        niveles = elementos('niveles_acceso_formulario', formulario_id)
+
+        conn.execute(
+            """INSERT INTO busqueda_clientes (rowid, nombre_cliente, slug, nif, email, telefono,
+                                              trasteros, usuarios, contenido, cliente_id)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                formulario_id, nombre, slug,
+                str(empresa.get('nif') or ''),
+                str(empresa.get('email') or ''),
+                str(empresa.get('telefono') or ''),
+                ' '.join(str(t.get('numero_trastero') or '') for t in trasteros if isinstance(t, dict)),
+                ' '.join(_textos([{'nombre': u.get('nombre_usuario'), 'email': u.get('email_usuario')}
+                                  for u in usuarios if isinstance(u, dict)])),
+                ' '.join(_textos([empresa, trasteros, _json(config_correo, {}), niveles])),
+                cliente_id,
+            )
+        )
+
+
+def migrar(conn):
+    mover_listas(conn)
+    if not conn.execute("SELECT 1 FROM busqueda_clientes LIMIT 1").fetchone():
+        rellenar_busqueda(conn)
@@ -0,0 +1,3 @@
+-- El trigger hacía un segundo UPDATE de la fila en cada guardado solo para
+-- poner la fecha; ahora la fija cada UPDATE de formularios_clientes
+DROP TRIGGER IF EXISTS update_formulario_timestamp;
@@ -0,0 +1,17 @@
+-- Formulario más reciente de un cliente (WHERE cliente_id = ? ORDER BY
+-- fecha_creacion DESC, id DESC LIMIT 1) sin ordenar en memoria; sustituye al
+-- índice solo por cliente_id
+CREATE INDEX IF NOT EXISTS idx_formularios_cliente_reciente
+    ON formularios_clientes(cliente_id, fecha_creacion DESC, id DESC);
+DROP INDEX IF EXISTS idx_formularios_cliente;
+
+-- Archivos de un formulario ordenados por fecha de subida
+CREATE INDEX IF NOT EXISTS idx_archivos_formulario_fecha
+    ON archivos_clientes(formulario_id, fecha_subida DESC);
+DROP INDEX IF EXISTS idx_archivos_formulario;
+
+-- Lista de clientes de la página principal (más recientes primero)
+CREATE INDEX IF NOT EXISTS idx_clientes_fecha ON clientes(fecha_creacion DESC);
+
+-- slug ya tiene el índice de su restricción UNIQUE: este solo encarecía las escrituras
+DROP INDEX IF EXISTS idx_clientes_slug;
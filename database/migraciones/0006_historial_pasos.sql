@@ -0,0 +1,19 @@
+-- Historial de revisiones de cada paso (models/historial.py): cada fila es
+-- una copia completa del paso (punto de control) o los cambios respecto a la
+-- revisión anterior, en JSON comprimido con zlib
+CREATE TABLE IF NOT EXISTS revisiones_pasos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    formulario_id INTEGER NOT NULL,
+    paso INTEGER NOT NULL,
+    numero INTEGER NOT NULL, -- 1, 2, 3... por formulario y paso
+    version INTEGER NOT NULL, -- versión del formulario al capturarla
+    completa BOOLEAN NOT NULL, -- 1 = punto de control, 0 = cambios sobre la anterior
+    datos BLOB NOT NULL,
+    fecha DATETIME DEFAULT CURRENT_TIMESTAMP,
+
+    FOREIGN KEY (formulario_id) REFERENCES formularios_clientes (id) ON DELETE CASCADE
+);
+
+-- Última revisión de cada paso y reconstrucción desde el punto de control
+CREATE UNIQUE INDEX IF NOT EXISTS idx_revisiones_paso_numero
+    ON revisiones_pasos(formulario_id, paso, numero);
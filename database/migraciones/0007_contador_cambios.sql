@@ -0,0 +1,11 @@
+-- Contador de cambios del listado de clientes: su versión (ETag de / y
+-- /api/clientes) se lee de una sola fila en lugar de recorrer clientes y
+-- formularios en cada petición. Lo incrementan los modelos, en la misma
+-- transacción, solo cuando cambia algo que el listado muestra (nombre, slug,
+-- activo, completado, paso actual o porcentaje); sin triggers, para no
+-- añadir una escritura a cada guardado
+CREATE TABLE IF NOT EXISTS contador_cambios (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    cambios INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO contador_cambios (id, cambios) VALUES (1, 0);
@@ -0,0 +1,173 @@
+"""
+Migraciones versionadas del esquema de la base de datos
+
+Cada migración es un fichero NNNN_descripcion.sql (sentencias SQL) o
+NNNN_descripcion.py (con una función migrar(conn) que no confirma la
+transacción) en este directorio. Las aplicadas se registran en la tabla
+esquema_migraciones con la suma SHA-256 de su contenido: al arrancar con el
+esquema al día solo se lee esa tabla.
+
+Una migración ya aplicada no debe modificarse; los cambios van en una nueva.
+Las del directorio de particiones (ver database/particiones.py) siguen las
+mismas reglas en el subdirectorio directorio/.
+"""
+
+import hashlib
+import importlib.util
+import re
+import sqlite3
+from pathlib import Path
+from typing import List, NamedTuple
+
+DIRECTORIO = Path(__file__).parent
+
+PATRON_FICHERO = re.compile(r'^(\d{4})_(\w+)\.(sql|py)$')
+
+
+class ErrorMigracion(Exception):
+    """Una migración aplicada no coincide con su fichero o no se puede aplicar"""
+
+
+class Migracion(NamedTuple):
+    version: int
+    nombre: str
+    ruta: Path
+    checksum: str
+
+
+def listar_migraciones(directorio: Path = DIRECTORIO) -> List[Migracion]:
+    """
+    Migraciones disponibles ordenadas por versión
+
+    Raises:
+        ErrorMigracion: Si dos ficheros tienen el mismo número de versión
+    """
+    migraciones = []
+    for ruta in sorted(directorio.iterdir()):
+        coincidencia = PATRON_FICHERO.match(ruta.name)
+        if not coincidencia:
+            continue
+        # Sin distinguir finales de línea (checkouts en Windows)
+        contenido = ruta.read_bytes().replace(b'\r\n', b'\n')
+        migraciones.append(Migracion(
+            version=int(coincidencia.group(1)),
+            nombre=ruta.stem,
+            ruta=ruta,
+            checksum=hashlib.sha256(contenido).hexdigest(),
+        ))
+
+    versiones = [m.version for m in migraciones]
+    if len(versiones) != len(set(versiones)):
+        raise ErrorMigracion("Hay migraciones con el mismo número de versión")
+    return migraciones
+
+
+def _aplicadas(conn) -> dict:
+    """{versión: checksum} de las migraciones registradas en la BD"""
+    existe = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'esquema_migraciones'"
+    ).fetchone()
+    if not existe:
+        return {}
+    return {row[0]: row[1] for row in conn.execute("SELECT version, checksum FROM esquema_migraciones")}
+
+
+def _sentencias(sql: str) -> List[str]:
+    """Divide un script SQL en sentencias completas (respeta BEGIN...END de triggers)"""
+    sentencias, actual = [], ''
+    for linea in sql.splitlines(keepends=True):
+        actual += linea
+        if sqlite3.complete_statement(actual):
+            sentencias.append(actual)
+            actual = ''
+    resto = [l for l in actual.splitlines() if l.strip() and not l.strip().startswith('--')]
+    if resto:
+        raise ErrorMigracion("El script termina con una sentencia incompleta")
+    return sentencias
+
+
+def _ejecutar(conn, migracion: Migracion):
+    if migracion.ruta.suffix == '.sql':
+        for sentencia in _sentencias(migracion.ruta.read_text(encoding='utf-8')):
+            conn.execute(sentencia)
+    else:
+        spec = importlib.util.spec_from_file_location(f'migracion_{migracion.nombre}', migracion.ruta)
+        modulo = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(modulo)
+        modulo.migrar(conn)
+
+
+def pendientes(conn, migraciones: List[Migracion] = None) -> List[Migracion]:
+    """
+    Migraciones aún no aplicadas en la BD
+
+    Raises:
+        ErrorMigracion: Si una migración aplicada ha cambiado desde entonces
+    """
+    if migraciones is None:
+        migraciones = listar_migraciones()
+    aplicadas = _aplicadas(conn)
+
+    modificadas = [m.nombre for m in migraciones if m.version in aplicadas and aplicadas[m.version] != m.checksum]
+    if modificadas:
+        raise ErrorMigracion(f"Migraciones modificadas después de aplicarse: {', '.join(modificadas)}")
+    return [m for m in migraciones if m.version not in aplicadas]
+
+
+def aplicar_migraciones(conn, migraciones: List[Migracion] = None) -> List[str]:
+    """
+    Aplica en orden las migraciones pendientes, cada una en su transacción
+
+    Si el esquema está al día no escribe nada. Varias instancias que arrancan
+    a la vez no aplican dos veces la misma migración: cada una se comprueba de
+    nuevo tras obtener el bloqueo de escritura.
+
+    Args:
+        conn (sqlite3.Connection): Conexión sin transacción abierta
+        migraciones (list): Por defecto, las de este directorio
+
+    Returns:
+        list: Nombres de las migraciones aplicadas
+
+    Raises:
+        ErrorMigracion: Si una migración aplicada ha cambiado o falla al aplicarse
+    """
+    por_aplicar = pendientes(conn, migraciones)
+    if not por_aplicar:
+        return []
+
+    aplicadas = []
+    nivel_aislamiento = conn.isolation_level
+    # Transacciones explícitas: el módulo sqlite3 no debe abrir ni cerrar otras
+    conn.isolation_level = None
+    try:
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS esquema_migraciones (
+                   version INTEGER PRIMARY KEY,
+                   nombre VARCHAR(100) NOT NULL,
+                   checksum CHAR(64) NOT NULL,
+                   fecha_aplicacion DATETIME DEFAULT CURRENT_TIMESTAMP
+               )"""
+        )
+        for migracion in por_aplicar:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if conn.execute(
+                    "SELECT 1 FROM esquema_migraciones WHERE version = ?", (migracion.version,)
+                ).fetchone():
+                    conn.execute("ROLLBACK")
+                    continue
+                _ejecutar(conn, migracion)
+                conn.execute(
+                    "INSERT INTO esquema_migraciones (version, nombre, checksum) VALUES (?, ?, ?)",
+                    (migracion.version, migracion.nombre, migracion.checksum)
+                )
+                conn.execute("COMMIT")
+            except Exception as e:
+                conn.execute("ROLLBACK")
+                raise ErrorMigracion(f"Error aplicando {migracion.nombre}: {e}") from e
+            aplicadas.append(migracion.nombre)
+    finally:
+        conn.isolation_level = nivel_aislamiento
+
+    return aplicadas
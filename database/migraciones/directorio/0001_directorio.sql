@@ -0,0 +1,20 @@
+-- Directorio de particiones: en qué base de datos vive cada cliente
+--
+-- Asigna los IDs de clientes y formularios para que sean únicos entre todas
+-- las particiones, y mantiene la unicidad del nombre y el slug de los
+-- clientes, que cada partición solo puede comprobar entre los suyos.
+
+CREATE TABLE IF NOT EXISTS directorio_clientes (
+    cliente_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre_cliente VARCHAR(100) UNIQUE NOT NULL,
+    slug VARCHAR(100) UNIQUE NOT NULL,
+    particion INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS directorio_formularios (
+    formulario_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cliente_id INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_directorio_particion ON directorio_clientes(particion);
+CREATE INDEX IF NOT EXISTS idx_directorio_formularios_cliente ON directorio_formularios(cliente_id);
@@ -0,0 +1,365 @@
+"""
+Reparto de los clientes entre varias bases de datos SQLite (particiones)
+
+Con PARTICIONES = 1 (por defecto) todo vive en un único fichero, como hasta
+ahora. Con N > 1 cada cliente, con sus formularios, archivos y registros,
+vive en una de N bases de datos y un directorio pequeño (<base>_directorio.db)
+guarda en qué partición está cada cliente. Cada partición tiene su propio
+bloqueo de escritura y su propio WAL: los guardados de clientes de
+particiones distintas no se esperan entre sí.
+
+- Los IDs de clientes y formularios los asigna el directorio y son únicos
+  entre todas las particiones; las demás tablas usan IDs locales.
+- La partición 0 es el fichero base, así que al pasar de 1 a N particiones
+  los datos existentes se quedan donde están: se registran en el directorio
+  al arrancar y se reparten con `python -m database.rebalanceo`.
+- Los listados y búsquedas se consultan en todas las particiones a la vez
+  (en_todas) y se combinan en memoria.
+"""
+
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, TypeVar
+
+RUTA_BASE = 'database/formulario_clientes.db'
+
+# Ajustes del proceso (configurar_particiones)
+_ajustes = {'numero': 1, 'ruta_base': RUTA_BASE}
+
+# Conexión al directorio de cada hilo y grupo de hilos de las consultas en
+# todas las particiones; se crean de nuevo en cada proceso tras un fork
+_local = threading.local()
+_grupo = {'pid': None, 'grupo': None}
+
+T = TypeVar('T')
+
+
+def configurar_particiones(numero: int = 1, ruta_base=RUTA_BASE):
+    """
+    Fija el número de particiones y la ruta del fichero base
+
+    Args:
+        numero (int): Número de particiones (1 = sin particionar)
+        ruta_base (str): Fichero de la partición 0; las demás y el directorio
+            se crean a su lado
+
+    Raises:
+        ValueError: Si el número de particiones no es válido
+    """
+    numero = int(numero)
+    if numero < 1:
+        raise ValueError(f"Número de particiones no válido: {numero}")
+    _ajustes.update(numero=numero, ruta_base=str(ruta_base))
+
+
+def numero_particiones() -> int:
+    return _ajustes['numero']
+
+
+def particionado() -> bool:
+    """True si los clientes se reparten entre varias bases de datos"""
+    return _ajustes['numero'] > 1
+
+
+def _ruta_derivada(sufijo: str) -> str:
+    base = Path(_ajustes['ruta_base'])
+    return str(base.with_name(f"{base.stem}_{sufijo}{base.suffix}"))
+
+
+def ruta_particion(particion: int) -> str:
+    """Fichero de una partición (la 0 es el fichero base)"""
+    if particion == 0:
+        return _ajustes['ruta_base']
+    return _ruta_derivada(f'p{particion}')
+
+
+def ruta_directorio() -> str:
+    return _ruta_derivada('directorio')
+
+
+def conectar(ruta: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(ruta)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _directorio() -> sqlite3.Connection:
+    """
+    Conexión del hilo actual al directorio, en modo autocommit para que las
+    consultas de enrutado no dejen transacciones abiertas
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.pid != os.getpid() or _local.ruta != ruta_directorio():
+        conn = sqlite3.connect(ruta_directorio(), isolation_level=None)
+        _local.conn, _local.pid, _local.ruta = conn, os.getpid(), ruta_directorio()
+    return conn
+
+
+# --- Enrutado -----------------------------------------------------------------
+
+def localizar(cliente_id=None, slug=None, formulario_id=None) -> int:
+    """
+    Partición de un cliente, identificado por su ID, su slug o el ID de uno
+    de sus formularios. Los que no están en el directorio van a la partición
+    0, donde las consultas no los encontrarán.
+    """
+    if not particionado():
+        return 0
+
+    if cliente_id is not None:
+        row = _directorio().execute(
+            "SELECT particion FROM directorio_clientes WHERE cliente_id = ?", (cliente_id,)
+        ).fetchone()
+    elif slug is not None:
+        row = _directorio().execute(
+            "SELECT particion FROM directorio_clientes WHERE slug = ?", (slug,)
+        ).fetchone()
+    elif formulario_id is not None:
+        row = _directorio().execute(
+            """SELECT c.particion
+               FROM directorio_formularios f
+                        JOIN directorio_clientes c ON c.cliente_id = f.cliente_id
+               WHERE f.formulario_id = ?""",
+            (formulario_id,)
+        ).fetchone()
+    else:
+        row = None
+    return row[0] if row else 0
+
+
+def agrupar(cliente_ids: Iterable[int]) -> Dict[int, List[int]]:
+    """
+    Reparte una lista de clientes por partición con una consulta al directorio
+
+    Returns:
+        dict: {partición: [cliente_id]}; los desconocidos van a la partición 0
+    """
+    ids = list(dict.fromkeys(cliente_ids))
+    if not particionado():
+        return {0: ids} if ids else {}
+
+    ubicacion = {}
+    # Bloques por debajo del límite de parámetros de SQLite
+    for inicio in range(0, len(ids), 500):
+        bloque = ids[inicio:inicio + 500]
+        ubicacion.update(_directorio().execute(
+            f"""SELECT cliente_id, particion FROM directorio_clientes
+                WHERE cliente_id IN ({', '.join('?' for _ in bloque)})""",
+            bloque
+        ).fetchall())
+
+    grupos = {}
+    for cliente_id in ids:
+        grupos.setdefault(ubicacion.get(cliente_id, 0), []).append(cliente_id)
+    return grupos
+
+
+def en_todas(funcion: Callable[[sqlite3.Connection], T]) -> List[T]:
+    """
+    Ejecuta funcion(conn) en cada partición y devuelve sus resultados en
+    orden de partición. Con varias particiones las consultas se lanzan en
+    paralelo (sqlite3 libera el GIL mientras SQLite trabaja).
+    """
+    def ejecutar(particion):
+        conn = conectar(ruta_particion(particion))
+        try:
+            return funcion(conn)
+        finally:
+            conn.close()
+
+    if not particionado():
+        return [ejecutar(0)]
+
+    if _grupo['pid'] != os.getpid():
+        _grupo.update(pid=os.getpid(), grupo=ThreadPoolExecutor(thread_name_prefix='particion'))
+    return list(_grupo['grupo'].map(ejecutar, range(numero_particiones())))
+
+
+# --- Alta de clientes y formularios -------------------------------------------
+
+def registrar_cliente(nombre_cliente: str, slug: str) -> tuple:
+    """
+    Reserva en el directorio el ID y la partición de un cliente nuevo. Los
+    clientes se reparten por turnos según su ID.
+
+    Returns:
+        tuple: (cliente_id, partición); (None, 0) sin particionar, en cuyo
+               caso el ID lo asigna la propia base de datos
+
+    Raises:
+        sqlite3.IntegrityError: Si ya existe un cliente con ese nombre o slug
+    """
+    if not particionado():
+        return None, 0
+
+    conn = _directorio()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cliente_id = conn.execute(
+            "INSERT INTO directorio_clientes (nombre_cliente, slug) VALUES (?, ?)",
+            (nombre_cliente, slug)
+        ).lastrowid
+        particion = cliente_id % numero_particiones()
+        conn.execute(
+            "UPDATE directorio_clientes SET particion = ? WHERE cliente_id = ?",
+            (particion, cliente_id)
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return cliente_id, particion
+
+
+def anular_cliente(cliente_id: Optional[int]):
+    """
+    Borra del directorio un cliente registrado con registrar_cliente() cuya
+    inserción en la partición ha fallado, para que su nombre y su slug
+    vuelvan a estar libres
+    """
+    if particionado() and cliente_id is not None:
+        _directorio().execute("DELETE FROM directorio_clientes WHERE cliente_id = ?", (cliente_id,))
+
+
+def renombrar_cliente(cliente_id: int, nombre_cliente: str, slug: str) -> Optional[tuple]:
+    """
+    Actualiza el nombre y el slug de un cliente en el directorio
+
+    Returns:
+        tuple: (nombre, slug) anteriores, para deshacer el cambio si falla la
+               partición; None sin particionar
+
+    Raises:
+        sqlite3.IntegrityError: Si otro cliente ya usa ese nombre o slug
+    """
+    if not particionado():
+        return None
+    conn = _directorio()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        anterior = conn.execute(
+            "SELECT nombre_cliente, slug FROM directorio_clientes WHERE cliente_id = ?", (cliente_id,)
+        ).fetchone()
+        conn.execute(
+            "UPDATE directorio_clientes SET nombre_cliente = ?, slug = ? WHERE cliente_id = ?",
+            (nombre_cliente, slug, cliente_id)
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return tuple(anterior) if anterior else None
+
+
+def registrar_formulario(cliente_id: int) -> Optional[int]:
+    """
+    Reserva en el directorio el ID de un formulario nuevo
+
+    Returns:
+        int: ID del formulario, o None sin particionar (lo asigna la BD)
+    """
+    if not particionado():
+        return None
+    return _directorio().execute(
+        "INSERT INTO directorio_formularios (cliente_id) VALUES (?)", (cliente_id,)
+    ).lastrowid
+
+
+def asignar_particion(cliente_id: int, particion: int):
+    """Apunta un cliente a otra partición (lo usa el rebalanceo)"""
+    _directorio().execute(
+        "UPDATE directorio_clientes SET particion = ? WHERE cliente_id = ?",
+        (particion, cliente_id)
+    )
+
+
+def clientes_por_particion() -> Dict[int, List[int]]:
+    """{partición: [cliente_id]} de todos los clientes del directorio"""
+    grupos = {particion: [] for particion in range(numero_particiones())}
+    for cliente_id, particion in _directorio().execute(
+        "SELECT cliente_id, particion FROM directorio_clientes ORDER BY cliente_id"
+    ):
+        grupos.setdefault(particion, []).append(cliente_id)
+    return grupos
+
+
+# --- Inicialización -----------------------------------------------------------
+
+def inicializar_particiones() -> Dict[str, List[str]]:
+    """
+    Aplica las migraciones pendientes en cada partición y en el directorio,
+    registra en el directorio los clientes que aún no figuran en él (los de
+    la base de datos anterior al particionado) y borra de él los que no
+    están en su partición (altas interrumpidas)
+
+    Returns:
+        dict: {ruta: [migraciones aplicadas]} de las bases de datos con cambios
+    """
+    from database.migraciones import DIRECTORIO, aplicar_migraciones, listar_migraciones
+
+    aplicadas = {}
+    rutas = [ruta_particion(p) for p in range(numero_particiones())]
+    for particion, ruta in enumerate(rutas):
+        Path(ruta).parent.mkdir(parents=True, exist_ok=True)
+        nueva = not Path(ruta).exists()
+        conn = conectar(ruta)
+        try:
+            if particionado():
+                # Lectores y escritor no se bloquean entre sí dentro de una partición
+                conn.execute("PRAGMA journal_mode = WAL")
+            aplicadas[ruta] = aplicar_migraciones(conn)
+            if nueva and particion > 0:
+                # Los clientes de ejemplo del esquema inicial solo van en la partición 0
+                conn.execute("DELETE FROM clientes")
+                conn.commit()
+        finally:
+            conn.close()
+
+    if particionado():
+        conn = conectar(ruta_directorio())
+        try:
+            conn.execute("PRAGMA journal_mode = WAL")
+            aplicadas[ruta_directorio()] = aplicar_migraciones(
+                conn, listar_migraciones(DIRECTORIO / 'directorio')
+            )
+            for particion, ruta in enumerate(rutas):
+                _adoptar(conn, particion, ruta)
+        finally:
+            conn.close()
+
+    return {ruta: nombres for ruta, nombres in aplicadas.items() if nombres}
+
+
+def _adoptar(directorio: sqlite3.Connection, particion: int, ruta: str):
+    """
+    Registra en el directorio los clientes y formularios de una partición que
+    no figuran en él, y borra los clientes que el directorio sitúa en ella
+    pero no existen (un alta cuya inserción en la partición falló)
+    """
+    directorio.execute("ATTACH DATABASE ? AS particion", (ruta,))
+    try:
+        with directorio:
+            directorio.execute(
+                """DELETE FROM directorio_clientes
+                   WHERE particion = ?
+                     AND NOT EXISTS (SELECT 1 FROM particion.clientes c WHERE c.id = cliente_id)""",
+                (particion,)
+            )
+            directorio.execute(
+                """INSERT INTO directorio_clientes (cliente_id, nombre_cliente, slug, particion)
+                   SELECT c.id, c.nombre_cliente, c.slug, ?
+                   FROM particion.clientes c
+                   WHERE NOT EXISTS (SELECT 1 FROM directorio_clientes d WHERE d.cliente_id = c.id)""",
+                (particion,)
+            )
+            directorio.execute(
+                """INSERT INTO directorio_formularios (formulario_id, cliente_id)
+                   SELECT f.id, f.cliente_id
+                   FROM particion.formularios_clientes f
+                   WHERE NOT EXISTS (SELECT 1 FROM directorio_formularios d WHERE d.formulario_id = f.id)"""
+            )
+    finally:
+        directorio.execute("DETACH DATABASE particion")
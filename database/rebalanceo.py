@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Traslado de clientes entre particiones con la aplicación en marcha
+
+    python -m database.rebalanceo                      # reparte por igual
+    python -m database.rebalanceo --mover 42 --a 3     # un cliente concreto
+    python -m database.rebalanceo --simular            # solo muestra el plan
+
+Cada cliente se traslada por separado: se bloquea la escritura en su
+partición de origen (BEGIN IMMEDIATE), se copian sus filas a la de destino,
+se actualiza el directorio y se borran del origen antes de liberar el
+bloqueo. Los guardados de ese cliente esperan a que termine (unos
+milisegundos) y los que ya habían consultado el directorio fallan como
+"no encontrado" y el navegador los reintenta. Durante ese intervalo un
+listado puede mostrar al cliente en las dos particiones.
+
+El número de particiones y la ruta base salen de la configuración
+(PARTICIONES, DATABASE_PATH): para añadir particiones se aumenta
+PARTICIONES, se reinicia la aplicación y se ejecuta este comando.
+"""
+
+import argparse
+import sys
+import time
+from typing import Dict, List, Optional
+
+from database import consultas, particiones
+
+# Tablas con datos de un cliente, en orden de copia: (tabla, condición, ¿conserva el ID?).
+# Clientes y formularios conservan su ID (lo asigna el directorio); el resto
+# usa IDs locales de cada partición.
+TABLAS_CLIENTE = (
+    ('clientes', 'id = :cliente', True),
+    ('formularios_clientes', 'cliente_id = :cliente', True),
+    ('trasteros_formulario', 'formulario_id IN ({formularios})', False),
+    ('usuarios_formulario', 'formulario_id IN ({formularios})', False),
+    ('niveles_acceso_formulario', 'formulario_id IN ({formularios})', False),
+    ('archivos_clientes', 'formulario_id IN ({formularios})', False),
+    ('revisiones_pasos', 'formulario_id IN ({formularios})', False),
+    ('logs_formulario', 'cliente_id = :cliente', False),
+    ('operaciones_sincronizadas', 'cliente_id = :cliente', True),
+    ('busqueda_clientes', 'rowid IN ({formularios})', True),
+)
+
+
+def _condicion(condicion: str, formularios: List[int]) -> str:
+    return condicion.format(formularios=', '.join(str(int(f)) for f in formularios) or 'NULL')
+
+
+def _columnas(conn, tabla: str, conserva_id: bool) -> List[str]:
+    columnas = [row['name'] for row in conn.execute(f"PRAGMA table_info({tabla})")]
+    if tabla == 'busqueda_clientes':
+        return ['rowid', *columnas]
+    return columnas if conserva_id else [c for c in columnas if c != 'id']
+
+
+def _copiar(origen, destino, cliente_id: int, formularios: List[int]) -> int:
+    """Copia las filas de un cliente de una partición a otra; devuelve cuántas"""
+    copiadas = 0
+    for tabla, condicion, conserva_id in TABLAS_CLIENTE:
+        columnas = _columnas(origen, tabla, conserva_id)
+        lista = ', '.join(columnas)
+        filas = origen.execute(
+            f"SELECT {lista} FROM {tabla} WHERE {_condicion(condicion, formularios)}",
+            {'cliente': cliente_id}
+        ).fetchall()
+        destino.executemany(
+            f"INSERT INTO {tabla} ({lista}) VALUES ({', '.join('?' for _ in columnas)})",
+            [tuple(fila) for fila in filas]
+        )
+        copiadas += len(filas)
+    return copiadas
+
+
+def _borrar(conn, cliente_id: int, formularios: List[int]):
+    """Borra las filas de un cliente de una partición (hijas antes que padres)"""
+    for tabla, condicion, _ in reversed(TABLAS_CLIENTE):
+        conn.execute(
+            f"DELETE FROM {tabla} WHERE {_condicion(condicion, formularios)}",
+            {'cliente': cliente_id}
+        )
+
+
+def mover_cliente(cliente_id: int, destino: int) -> Optional[Dict]:
+    """
+    Traslada un cliente con todos sus datos a otra partición
+
+    Args:
+        cliente_id (int): ID del cliente
+        destino (int): Partición de destino
+
+    Returns:
+        dict: origen, filas copiadas y milisegundos con la escritura bloqueada,
+              o None si el cliente no existe o ya está en el destino
+
+    Raises:
+        ValueError: Si la partición de destino no existe
+    """
+    if not 0 <= destino < particiones.numero_particiones():
+        raise ValueError(f"Partición no válida: {destino}")
+    origen = particiones.localizar(cliente_id=cliente_id)
+    if origen == destino:
+        return None
+
+    # Transacciones explícitas en las dos particiones
+    conn_origen = particiones.conectar(particiones.ruta_particion(origen))
+    conn_destino = particiones.conectar(particiones.ruta_particion(destino))
+    conn_origen.isolation_level = conn_destino.isolation_level = None
+    try:
+        conn_origen.execute("BEGIN IMMEDIATE")
+        inicio = time.perf_counter()
+        try:
+            # Comprobado de nuevo con el bloqueo: otro rebalanceo pudo adelantarse
+            if (particiones.localizar(cliente_id=cliente_id) != origen or not conn_origen.execute(
+                    "SELECT 1 FROM clientes WHERE id = ?", (cliente_id,)).fetchone()):
+                conn_origen.execute("ROLLBACK")
+                return None
+            formularios = [row[0] for row in conn_origen.execute(
+                "SELECT id FROM formularios_clientes WHERE cliente_id = ?", (cliente_id,)
+            )]
+
+            conn_destino.execute("BEGIN IMMEDIATE")
+            try:
+                # Restos de un traslado anterior interrumpido
+                _borrar(conn_destino, cliente_id, formularios)
+                filas = _copiar(conn_origen, conn_destino, cliente_id, formularios)
+                conn_destino.execute(consultas.CONTAR_CAMBIO_LISTA)
+                conn_destino.execute("COMMIT")
+            except Exception:
+                conn_destino.execute("ROLLBACK")
+                raise
+
+            particiones.asignar_particion(cliente_id, destino)
+            _borrar(conn_origen, cliente_id, formularios)
+            conn_origen.execute(consultas.CONTAR_CAMBIO_LISTA)
+            conn_origen.execute("COMMIT")
+        except Exception:
+            if conn_origen.in_transaction:
+                conn_origen.execute("ROLLBACK")
+            raise
+        bloqueo = time.perf_counter() - inicio
+    finally:
+        conn_origen.close()
+        conn_destino.close()
+
+    return {'origen': origen, 'filas': filas, 'bloqueo_ms': bloqueo * 1000}
+
+
+def plan_equilibrado() -> List[tuple]:
+    """
+    Traslados necesarios para que todas las particiones tengan el mismo
+    número de clientes (±1), moviendo el mínimo posible
+
+    Returns:
+        list: [(cliente_id, origen, destino)]
+    """
+    grupos = particiones.clientes_por_particion()
+    numero = particiones.numero_particiones()
+    total = sum(len(ids) for ids in grupos.values())
+    # Las particiones con más clientes se quedan con los que sobran del reparto
+    mayores = sorted(range(numero), key=lambda p: -len(grupos.get(p, [])))
+    objetivo = {p: total // numero + (1 if p in mayores[:total % numero] else 0) for p in range(numero)}
+
+    # Clientes sobrantes (los más recientes de cada partición) y huecos
+    sobrantes = [
+        (cliente_id, particion)
+        for particion, ids in grupos.items()
+        for cliente_id in ids[objetivo.get(particion, 0):]
+    ]
+    huecos = [
+        particion
+        for particion in range(numero)
+        for _ in range(max(0, objetivo[particion] - len(grupos.get(particion, []))))
+    ]
+    return [(cliente_id, origen, destino) for (cliente_id, origen), destino in zip(sobrantes, huecos)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mover', type=int, metavar='CLIENTE_ID', help='trasladar solo este cliente')
+    parser.add_argument('--a', type=int, metavar='PARTICION', help='partición de destino de --mover')
+    parser.add_argument('--simular', action='store_true', help='mostrar los traslados sin hacerlos')
+    parser.add_argument('--pausa', type=float, default=0.0,
+                        help='segundos entre traslados, para dejar paso a los guardados')
+    args = parser.parse_args()
+
+    import config
+    cfg = config.config_entorno()
+    particiones.configurar_particiones(cfg.PARTICIONES, cfg.DATABASE_PATH)
+    if not particiones.particionado():
+        sys.exit("Con PARTICIONES = 1 no hay nada que repartir")
+    particiones.inicializar_particiones()
+
+    if args.mover is not None:
+        if args.a is None:
+            parser.error("--mover necesita --a")
+        plan = [(args.mover, particiones.localizar(cliente_id=args.mover), args.a)]
+    else:
+        plan = plan_equilibrado()
+
+    if not plan:
+        print("Las particiones ya están equilibradas")
+        return
+
+    filas = 0
+    bloqueos = []
+    inicio = time.perf_counter()
+    for cliente_id, origen, destino in plan:
+        if args.simular:
+            print(f"cliente {cliente_id}: {origen} -> {destino}")
+            continue
+        resultado = mover_cliente(cliente_id, destino)
+        if resultado is None:
+            print(f"cliente {cliente_id}: sin cambios")
+        else:
+            filas += resultado['filas']
+            bloqueos.append(resultado['bloqueo_ms'])
+            print(f"cliente {cliente_id}: {resultado['origen']} -> {destino} "
+                  f"({resultado['filas']} filas, bloqueo {resultado['bloqueo_ms']:.1f} ms)")
+        if args.pausa:
+            time.sleep(args.pausa)
+
+    if bloqueos:
+        duracion = time.perf_counter() - inicio
+        print(f"\n{len(bloqueos)} clientes, {filas} filas en {duracion:.2f} s; "
+              f"bloqueo máximo {max(bloqueos):.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,5 +4,7 @@ Paquete de modelos para el formulario de clientes
 
 from .cliente import Cliente
 from .formulario import Formulario
+from .busqueda import Busqueda
+from .sincronizacion import Sincronizacion
 
-__all__ = ['Cliente', 'Formulario']
+__all__ = ['Cliente', 'Formulario', 'Busqueda', 'Sincronizacion']
@@ -0,0 +1,244 @@
+"""
+Búsqueda indexada de clientes y contenido de formularios (SQLite FTS5)
+"""
+
+import heapq
+import re
+from typing import Callable, Optional, Dict, List, Any
+from database import particiones
+
+
+# Búsquedas exactas soportadas: cada campo usa exactamente la misma expresión
+# que su índice en las migraciones para que SQLite pueda aprovecharlo.
+CAMPOS_EXACTOS = {
+    'nif': ("upper(json_extract(f.datos_empresa, '$.nif'))", str.upper),
+    'email': ("lower(json_extract(f.datos_empresa, '$.email'))", str.lower),
+    'telefono': ("json_extract(f.datos_empresa, '$.telefono')", str),
+    'numero_trastero': ('t.numero_trastero', str),
+    'email_usuario': ('u.email_usuario', str),
+}
+
+# Pesos de bm25 por columna de busqueda_clientes (nombre, slug, nif, email,
+# telefono, trasteros, usuarios, contenido); cliente_id no está indexada.
+PESOS_BM25 = (10.0, 5.0, 8.0, 8.0, 8.0, 4.0, 3.0, 1.0)
+
+MAX_POR_PAGINA = 100
+
+
+class Busqueda:
+    """Índice de búsqueda de clientes sincronizado con los formularios"""
+
+    @staticmethod
+    def _textos(datos: Any) -> List[str]:
+        """Extrae los valores de texto de un paso, omitiendo contraseñas"""
+        if isinstance(datos, dict):
+            textos = []
+            for clave, valor in datos.items():
+                if 'password' in clave:
+                    continue
+                textos.extend(Busqueda._textos(valor))
+            return textos
+        if isinstance(datos, list):
+            return [t for elemento in datos for t in Busqueda._textos(elemento)]
+        if isinstance(datos, (str, int, float)) and not isinstance(datos, bool):
+            return [str(datos)]
+        return []
+
+    @classmethod
+    def indexar_formulario(cls, conn, formulario) -> None:
+        """
+        Actualiza la entrada del índice de un formulario.
+
+        Se ejecuta dentro de la conexión del guardado para que el índice se
+        confirme en la misma transacción que los datos.
+        """
+        cliente = conn.execute(
+            "SELECT nombre_cliente, slug FROM clientes WHERE id = ?",
+            (formulario.cliente_id,)
+        ).fetchone()
+        if not cliente:
+            return
+
+        empresa = formulario.datos_empresa or {}
+        trasteros = ' '.join(
+            str(t.get('numero_trastero') or '') for t in formulario.info_trasteros or []
+            if isinstance(t, dict)
+        )
+        usuarios = ' '.join(cls._textos([
+            {'nombre': u.get('nombre_usuario'), 'email': u.get('email_usuario')}
+            for u in formulario.usuarios_app or [] if isinstance(u, dict)
+        ]))
+        contenido = ' '.join(cls._textos([
+            empresa, formulario.info_trasteros, formulario.config_correo, formulario.niveles_acceso
+        ]))
+
+        conn.execute("DELETE FROM busqueda_clientes WHERE rowid = ?", (formulario.id,))
+        conn.execute(
+            """INSERT INTO busqueda_clientes (rowid, nombre_cliente, slug, nif, email, telefono,
+                                              trasteros, usuarios, contenido, cliente_id)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                formulario.id,
+                cliente['nombre_cliente'],
+                cliente['slug'],
+                str(empresa.get('nif') or ''),
+                str(empresa.get('email') or ''),
+                str(empresa.get('telefono') or ''),
+                trasteros,
+                usuarios,
+                contenido,
+                formulario.cliente_id
+            )
+        )
+
+    @classmethod
+    def reconstruir_indice(cls, conn) -> int:
+        """
+        Regenera el índice completo a partir de los formularios guardados
+
+        Args:
+            conn (sqlite3.Connection): Conexión abierta (la transacción la confirma el llamador)
+
+        Returns:
+            int: Número de formularios indexados
+        """
+        from models.formulario import Formulario
+
+        conn.execute("DELETE FROM busqueda_clientes")
+        rows = conn.execute("SELECT * FROM formularios_clientes").fetchall()
+        for row in rows:
+            cls.indexar_formulario(conn, Formulario._from_row(row, conn))
+        return len(rows)
+
+    @staticmethod
+    def _consulta_fts(texto: str) -> Optional[str]:
+        """
+        Convierte el texto del usuario en una consulta FTS5 segura: cada término
+        se entrecomilla y se busca por prefijo, y todos deben aparecer.
+        """
+        terminos = re.findall(r'[\w@.+-]+', texto, flags=re.UNICODE)
+        if not terminos:
+            return None
+        return ' '.join('"{}"*'.format(t.replace('"', '""')) for t in terminos)
+
+    @staticmethod
+    def _paginacion(pagina: int, por_pagina: int) -> tuple:
+        pagina = max(1, int(pagina or 1))
+        por_pagina = min(MAX_POR_PAGINA, max(1, int(por_pagina or 20)))
+        return pagina, por_pagina
+
+    @staticmethod
+    def _paginar(sql_total: str, sql_filas: str, valores: tuple, orden: Callable,
+                 pagina: int, por_pagina: int) -> Dict:
+        """
+        Ejecuta una búsqueda paginada (sql_filas recibe además LIMIT y OFFSET)
+        en todas las particiones: cada una devuelve sus primeros
+        pagina * por_pagina resultados ya ordenados y se mezclan para quedarse
+        con la página. Sin particionar se pide directamente la página.
+        """
+        hasta = pagina * por_pagina
+        limite, desde = (hasta, 0) if particiones.particionado() else (por_pagina, hasta - por_pagina)
+
+        def buscar(conn):
+            total = conn.execute(sql_total, valores).fetchone()[0]
+            filas = conn.execute(sql_filas, (*valores, limite, desde)).fetchall() if total else []
+            return total, [dict(row) for row in filas]
+
+        por_particion = particiones.en_todas(buscar)
+        filas = list(heapq.merge(*(f for _, f in por_particion), key=orden))
+        return {
+            'resultados': filas[hasta - por_pagina - desde:hasta - desde],
+            'total': sum(total for total, _ in por_particion),
+            'pagina': pagina,
+            'por_pagina': por_pagina
+        }
+
+    @classmethod
+    def buscar(cls, texto: str, pagina: int = 1, por_pagina: int = 20) -> Dict:
+        """
+        Búsqueda de texto completo ordenada por relevancia (bm25)
+
+        Con particiones, bm25 se calcula con las estadísticas de cada una,
+        así que el orden entre resultados de particiones distintas es aproximado.
+
+        Args:
+            texto (str): Términos a buscar (nombre, NIF, email, teléfono, trastero...)
+            pagina (int): Página de resultados, empezando en 1
+            por_pagina (int): Resultados por página (máximo MAX_POR_PAGINA)
+
+        Returns:
+            dict: Resultados de la página, total de coincidencias y paginación
+        """
+        pagina, por_pagina = cls._paginacion(pagina, por_pagina)
+        consulta = cls._consulta_fts(texto or '')
+        if not consulta:
+            return {'resultados': [], 'total': 0, 'pagina': pagina, 'por_pagina': por_pagina}
+
+        pesos = ', '.join(str(p) for p in PESOS_BM25)
+        return cls._paginar(
+            "SELECT COUNT(*) FROM busqueda_clientes WHERE busqueda_clientes MATCH ?",
+            f"""SELECT b.rowid AS formulario_id,
+                       b.cliente_id,
+                       c.nombre_cliente,
+                       c.slug,
+                       f.porcentaje_completado,
+                       snippet(busqueda_clientes, -1, '<mark>', '</mark>', '…', 12) AS fragmento,
+                       bm25(busqueda_clientes, {pesos}) AS relevancia
+                FROM busqueda_clientes b
+                         JOIN clientes c ON c.id = b.cliente_id
+                         JOIN formularios_clientes f ON f.id = b.rowid
+                WHERE busqueda_clientes MATCH ?
+                ORDER BY relevancia
+                LIMIT ? OFFSET ?""",
+            (consulta,),
+            lambda fila: fila['relevancia'],
+            pagina, por_pagina
+        )
+
+    @classmethod
+    def buscar_exacto(cls, campo: str, valor: str, pagina: int = 1, por_pagina: int = 20) -> Dict:
+        """
+        Búsqueda por coincidencia exacta de un campo indexado
+
+        Args:
+            campo (str): Uno de CAMPOS_EXACTOS
+            valor (str): Valor a buscar
+
+        Returns:
+            dict: Resultados de la página, total de coincidencias y paginación
+
+        Raises:
+            ValueError: Si el campo no admite búsqueda exacta
+        """
+        if campo not in CAMPOS_EXACTOS:
+            raise ValueError(f"Campo de búsqueda no soportado: {campo}")
+
+        pagina, por_pagina = cls._paginacion(pagina, por_pagina)
+        expresion, normalizar = CAMPOS_EXACTOS[campo]
+        valor = normalizar((valor or '').strip())
+
+        joins = ''
+        if campo == 'numero_trastero':
+            joins = 'JOIN trasteros_formulario t ON t.formulario_id = f.id'
+        elif campo == 'email_usuario':
+            joins = 'JOIN usuarios_formulario u ON u.formulario_id = f.id'
+
+        base = f"""FROM formularios_clientes f
+                       JOIN clientes c ON c.id = f.cliente_id
+                       {joins}
+                   WHERE {expresion} = ?"""
+
+        return cls._paginar(
+            f"SELECT COUNT(DISTINCT f.id) {base}",
+            f"""SELECT DISTINCT f.id AS formulario_id,
+                       f.cliente_id,
+                       c.nombre_cliente,
+                       c.slug,
+                       f.porcentaje_completado
+                {base}
+                ORDER BY c.nombre_cliente
+                LIMIT ? OFFSET ?""",
+            (valor,),
+            lambda fila: fila['nombre_cliente'],
+            pagina, por_pagina
+        )
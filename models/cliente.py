@@ -2,23 +2,31 @@
 Modelo Cliente para el formulario dinámico
 """
 
+import heapq
 import sqlite3
 import json
 from datetime import datetime
 from typing import Optional, Dict, List
+from database import consultas, particiones
 from database.init_db import get_connection
 
 class Cliente:
     """Modelo para gestionar clientes"""
+
+    __slots__ = ('id', 'nombre_cliente', 'slug', 'fecha_creacion', 'activo', 'completado',
+                 'version', '_progreso')
     
     def __init__(self, id=None, nombre_cliente=None, slug=None, 
-                 fecha_creacion=None, activo=True, completado=False):
+                 fecha_creacion=None, activo=True, completado=False, version=1):
         self.id = id
         self.nombre_cliente = nombre_cliente
         self.slug = slug
         self.fecha_creacion = fecha_creacion
         self.activo = activo
         self.completado = completado
+        self.version = version
+        # Progreso precargado por cargar_progreso() (None = sin cargar)
+        self._progreso = None
     
     @classmethod
     def crear(cls, nombre_cliente: str, slug: str = None) -> Optional['Cliente']:
@@ -38,16 +46,24 @@ class Cliente:
             slug = re.sub(r'[^a-zA-Z0-9\s-]', '', nombre_cliente.lower())
             slug = re.sub(r'\s+', '-', slug.strip())
         
-        conn = get_connection()
-        cursor = conn.cursor()
-        
+        conn = None
         try:
-            cursor.execute(
-                "INSERT INTO clientes (nombre_cliente, slug) VALUES (?, ?)",
-                (nombre_cliente, slug)
-            )
-            cliente_id = cursor.lastrowid
-            conn.commit()
+            # Con particiones, el directorio asigna el ID y la partición
+            cliente_id, particion = particiones.registrar_cliente(nombre_cliente, slug)
+            try:
+                conn = get_connection(particiones.ruta_particion(particion))
+                cursor = conn.cursor()
+                cursor.execute(
+                    "INSERT INTO clientes (id, nombre_cliente, slug) VALUES (?, ?, ?)",
+                    (cliente_id, nombre_cliente, slug)
+                )
+                cliente_id = cursor.lastrowid
+                cursor.execute(consultas.CONTAR_CAMBIO_LISTA)
+                conn.commit()
+            except Exception:
+                # Sin la fila en la partición, el nombre y el slug no deben quedar reservados
+                particiones.anular_cliente(cliente_id)
+                raise
             
             # Retornar instancia del cliente creado
             return cls.obtener_por_id(cliente_id)
@@ -55,12 +71,26 @@ class Cliente:
         except sqlite3.IntegrityError:
             return None
         finally:
-            conn.close()
+            if conn is not None:
+                conn.close()
+    
+    @classmethod
+    def _from_row(cls, row) -> 'Cliente':
+        """Crea una instancia de Cliente desde una fila de la BD"""
+        return cls(
+            id=row['id'],
+            nombre_cliente=row['nombre_cliente'],
+            slug=row['slug'],
+            fecha_creacion=row['fecha_creacion'],
+            activo=bool(row['activo']),
+            completado=bool(row['completado']),
+            version=row['version']
+        )
     
     @classmethod
     def obtener_por_id(cls, cliente_id: int) -> Optional['Cliente']:
         """Obtiene un cliente por su ID"""
-        conn = get_connection()
+        conn = get_connection(cliente_id=cliente_id)
         cursor = conn.cursor()
         
         cursor.execute("SELECT * FROM clientes WHERE id = ?", (cliente_id,))
@@ -68,20 +98,13 @@ class Cliente:
         conn.close()
         
         if row:
-            return cls(
-                id=row['id'],
-                nombre_cliente=row['nombre_cliente'],
-                slug=row['slug'],
-                fecha_creacion=row['fecha_creacion'],
-                activo=bool(row['activo']),
-                completado=bool(row['completado'])
-            )
+            return cls._from_row(row)
         return None
     
     @classmethod
     def obtener_por_slug(cls, slug: str) -> Optional['Cliente']:
         """Obtiene un cliente por su slug"""
-        conn = get_connection()
+        conn = get_connection(slug=slug)
         cursor = conn.cursor()
         
         cursor.execute("SELECT * FROM clientes WHERE slug = ? AND activo = 1", (slug,))
@@ -89,62 +112,141 @@ class Cliente:
         conn.close()
         
         if row:
-            return cls(
-                id=row['id'],
-                nombre_cliente=row['nombre_cliente'],
-                slug=row['slug'],
-                fecha_creacion=row['fecha_creacion'],
-                activo=bool(row['activo']),
-                completado=bool(row['completado'])
-            )
+            return cls._from_row(row)
         return None
     
+    @staticmethod
+    def listar_con_progreso() -> List[sqlite3.Row]:
+        """
+        Filas de todos los clientes (de todas las particiones) con el progreso
+        de su formulario más reciente, los más nuevos primero
+
+        Returns:
+            list: Columnas de clientes más paso_actual, porcentaje_completado
+                  y ultima_actualizacion
+        """
+        por_particion = particiones.en_todas(lambda conn: conn.execute(consultas.LISTA_CLIENTES).fetchall())
+        return list(heapq.merge(*por_particion, key=lambda c: c['fecha_creacion'], reverse=True))
+
+    @staticmethod
+    def contar_por_prefijo(prefijo: str) -> int:
+        """Clientes cuyo nombre empieza exactamente por `prefijo` (en todas las particiones)"""
+        patron = ''.join(f'[{c}]' if c in '*?[' else c for c in prefijo) + '*'
+        return sum(particiones.en_todas(
+            lambda conn: conn.execute(consultas.CONTAR_CLIENTES_PREFIJO, (patron,)).fetchone()[0]
+        ))
+
     @classmethod
     def listar_todos(cls, solo_activos: bool = True) -> List['Cliente']:
-        """Lista todos los clientes"""
-        conn = get_connection()
-        cursor = conn.cursor()
-        
+        """Lista todos los clientes (de todas las particiones)"""
         query = "SELECT * FROM clientes"
         if solo_activos:
             query += " WHERE activo = 1"
         query += " ORDER BY nombre_cliente"
         
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        conn.close()
+        def listar(conn):
+            clientes = [cls._from_row(row) for row in conn.execute(query)]
+            cls.cargar_progreso(clientes, conn)
+            return clientes
         
-        return [
-            cls(
-                id=row['id'],
-                nombre_cliente=row['nombre_cliente'],
-                slug=row['slug'],
-                fecha_creacion=row['fecha_creacion'],
-                activo=bool(row['activo']),
-                completado=bool(row['completado'])
-            )
-            for row in rows
-        ]
+        return list(heapq.merge(*particiones.en_todas(listar), key=lambda c: c.nombre_cliente))
+    
+    @classmethod
+    def cargar_progreso(cls, clientes: List['Cliente'], conn=None) -> None:
+        """
+        Precarga el progreso de varios clientes con una única consulta, para
+        que to_dict() no lance una consulta por cliente
+        
+        Args:
+            clientes (list): Clientes cuyo progreso se quiere cargar
+            conn (sqlite3.Connection): Conexión a reutilizar, si todos los
+                clientes son de su partición (opcional)
+        """
+        from models.formulario import Formulario
+        
+        pendientes = [c for c in clientes if c._progreso is None]
+        if not pendientes:
+            return
+        
+        progreso = Formulario.progreso_por_clientes([c.id for c in pendientes], conn)
+        for cliente in pendientes:
+            cliente._progreso = cls._construir_progreso(progreso.get(cliente.id))
+    
+    @classmethod
+    def lista_to_dict(cls, clientes: List['Cliente']) -> List[Dict]:
+        """Serializa una lista de clientes cargando su progreso en bloque"""
+        cls.cargar_progreso(clientes)
+        return [cliente.to_dict() for cliente in clientes]
     
     def actualizar(self) -> bool:
         """Actualiza los datos del cliente en la base de datos"""
-        conn = get_connection()
-        cursor = conn.cursor()
-        
+        conn = None
+        anterior = None
         try:
+            # El directorio comprueba que el nombre y el slug sigan siendo únicos
+            anterior = particiones.renombrar_cliente(self.id, self.nombre_cliente, self.slug)
+            conn = get_connection(cliente_id=self.id)
+            cursor = conn.cursor()
             cursor.execute(
                 """UPDATE clientes 
-                   SET nombre_cliente = ?, slug = ?, activo = ?, completado = ?
+                   SET nombre_cliente = ?, slug = ?, activo = ?, completado = ?,
+                       version = version + 1
                    WHERE id = ?""",
                 (self.nombre_cliente, self.slug, self.activo, self.completado, self.id)
             )
+            # Mantener sincronizado el índice de búsqueda
+            cursor.execute(
+                "UPDATE busqueda_clientes SET nombre_cliente = ?, slug = ? WHERE cliente_id = ?",
+                (self.nombre_cliente, self.slug, self.id)
+            )
+            cursor.execute(consultas.CONTAR_CAMBIO_LISTA)
             conn.commit()
+            self.version += 1
             return True
         except sqlite3.Error:
+            if anterior is not None:
+                # La partición no cambió: el directorio vuelve al nombre y slug anteriores
+                particiones.renombrar_cliente(self.id, *anterior)
             return False
+        finally:
+            if conn is not None:
+                conn.close()
+    
+    @staticmethod
+    def version_por_slug(slug: str) -> Optional[tuple]:
+        """
+        Versión de la página de un cliente sin cargar su formulario: las
+        versiones del cliente y de su formulario más reciente
+        
+        Args:
+            slug (str): Slug del cliente
+            
+        Returns:
+            tuple: (cliente_id, versión, formulario_id, versión del formulario)
+                   o None si el cliente no existe
+        """
+        conn = get_connection(slug=slug)
+        try:
+            row = conn.execute(consultas.VERSION_CLIENTE, (slug,)).fetchone()
+            return tuple(row) if row else None
         finally:
             conn.close()
     
+    @staticmethod
+    def version_lista() -> tuple:
+        """
+        Versión del listado de clientes con su progreso: el contador de
+        cambios de cada partición, que los triggers incrementan al crear,
+        modificar o eliminar cualquier cliente o formulario
+        
+        Returns:
+            tuple: Contador de cada partición
+        """
+        def contador(conn):
+            return conn.execute(consultas.VERSION_LISTA).fetchone()[0]
+        
+        return tuple(particiones.en_todas(contador))
+    
     def eliminar(self) -> bool:
         """Elimina el cliente (soft delete - marca como inactivo)"""
         self.activo = False
@@ -160,9 +262,9 @@ class Cliente:
         from models.formulario import Formulario
         return Formulario.crear(self.id)
     
-    def calcular_progreso(self) -> Dict:
-        """Calcula el progreso del formulario del cliente"""
-        formulario = self.obtener_formulario()
+    @staticmethod
+    def _construir_progreso(formulario: Optional[Dict]) -> Dict:
+        """Construye el diccionario de progreso a partir de paso y porcentaje"""
         if not formulario:
             return {
                 'paso_actual': 1,
@@ -172,12 +274,18 @@ class Cliente:
             }
         
         return {
-            'paso_actual': formulario.paso_actual,
-            'porcentaje': formulario.porcentaje_completado,
-            'pasos_completados': formulario.paso_actual - 1,
+            'paso_actual': formulario['paso_actual'],
+            'porcentaje': formulario['porcentaje_completado'],
+            'pasos_completados': formulario['paso_actual'] - 1,
             'total_pasos': 6
         }
     
+    def calcular_progreso(self) -> Dict:
+        """Calcula el progreso del formulario del cliente"""
+        if self._progreso is None:
+            self.cargar_progreso([self])
+        return self._progreso
+    
     def to_dict(self) -> Dict:
         """Convierte el cliente a diccionario"""
         return {
@@ -0,0 +1,134 @@
+"""
+Capa de serialización JSON intercambiable para modelos y respuestas de la API
+
+Usa la librería más rápida disponible (orjson, ujson) y recurre a la librería
+estándar si no hay ninguna instalada. Todos los códecs producen JSON compacto
+en UTF-8, de modo que el texto guardado en la BD es intercambiable entre ellos.
+"""
+
+import os
+import json
+from typing import Any, Callable, Optional
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover - dependencia opcional
+    ujson = None
+
+
+class CodecStdlib:
+    """Códec basado en el módulo json de la librería estándar"""
+
+    nombre = 'json'
+
+    def dumps(self, obj: Any, default: Optional[Callable] = None,
+              sort_keys: bool = False, indent: Optional[int] = None) -> str:
+        return json.dumps(
+            obj,
+            ensure_ascii=False,
+            separators=None if indent else (',', ':'),
+            default=default,
+            sort_keys=sort_keys,
+            indent=indent
+        )
+
+    def loads(self, datos) -> Any:
+        return json.loads(datos)
+
+
+class CodecOrjson:
+    """Códec basado en orjson (extensión en Rust)"""
+
+    nombre = 'orjson'
+
+    def dumps(self, obj: Any, default: Optional[Callable] = None,
+              sort_keys: bool = False, indent: Optional[int] = None) -> str:
+        opciones = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            opciones |= orjson.OPT_SORT_KEYS
+        if indent:
+            opciones |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=default, option=opciones).decode('utf-8')
+
+    def loads(self, datos) -> Any:
+        return orjson.loads(datos)
+
+
+class CodecUjson:
+    """Códec basado en ujson (extensión en C)"""
+
+    nombre = 'ujson'
+
+    def dumps(self, obj: Any, default: Optional[Callable] = None,
+              sort_keys: bool = False, indent: Optional[int] = None) -> str:
+        return ujson.dumps(
+            obj,
+            ensure_ascii=False,
+            escape_forward_slashes=False,
+            sort_keys=sort_keys,
+            indent=indent or 0,
+            default=default
+        )
+
+    def loads(self, datos) -> Any:
+        return ujson.loads(datos)
+
+
+CODECS = {
+    'orjson': CodecOrjson if orjson is not None else None,
+    'ujson': CodecUjson if ujson is not None else None,
+    'json': CodecStdlib,
+}
+
+
+def obtener_codec(nombre: str = 'auto'):
+    """
+    Devuelve una instancia del códec solicitado
+
+    Args:
+        nombre (str): 'auto' (el más rápido instalado), 'orjson', 'ujson' o 'json'
+
+    Returns:
+        Instancia del códec
+
+    Raises:
+        ValueError: Si el códec no existe o no está instalado
+    """
+    if nombre == 'auto':
+        return next(clase() for clase in CODECS.values() if clase is not None)
+
+    if nombre not in CODECS:
+        raise ValueError(f"Códec JSON desconocido: {nombre}")
+    if CODECS[nombre] is None:
+        raise ValueError(f"El códec JSON '{nombre}' no está instalado")
+    return CODECS[nombre]()
+
+
+_codec = obtener_codec(os.environ.get('JSON_CODEC', 'auto'))
+
+
+def configurar_codec(nombre: str = 'auto'):
+    """Selecciona el códec usado por dumps() y loads()"""
+    global _codec
+    _codec = obtener_codec(nombre)
+    return _codec
+
+
+def codec_activo():
+    """Devuelve el códec en uso"""
+    return _codec
+
+
+def dumps(obj: Any, **kwargs) -> str:
+    """Serializa a JSON compacto (UTF-8, sin escapar caracteres no ASCII)"""
+    return _codec.dumps(obj, **kwargs)
+
+
+def loads(datos) -> Any:
+    """Deserializa JSON (str o bytes)"""
+    return _codec.loads(datos)
@@ -2,32 +2,194 @@
 Modelo Formulario para gestionar los datos del formulario dinámico
 """
 
+import logging
 import sqlite3
-import json
 from datetime import datetime
 from typing import Optional, Dict, List, Any
+from database import consultas, particiones
 from database.init_db import get_connection
+from models import codec
+from models.busqueda import Busqueda
+
+logger = logging.getLogger(__name__)
+
+
+# Pasos con listas que se guardan normalizados en tablas hijas, un registro por
+# elemento. 'columnas' son los campos que se copian a columnas propias para
+# poder indexarlos.
+TABLAS_HIJAS = {
+    'info_trasteros': {
+        'tabla': 'trasteros_formulario',
+        'columnas': ('numero_trastero', 'metros', 'precio_sin_iva'),
+    },
+    'usuarios_app': {
+        'tabla': 'usuarios_formulario',
+        'columnas': ('email_usuario', 'nombre_usuario', 'rol_usuario'),
+    },
+    'niveles_acceso': {
+        'tabla': 'niveles_acceso_formulario',
+        'columnas': ('nombre', 'prioridad'),
+    },
+}
+
+
+class _Crudo:
+    """Marca el JSON de un paso que todavía no se ha decodificado"""
+
+    __slots__ = ('valor',)
+
+    def __init__(self, valor):
+        self.valor = valor
+
+
+class CampoJSON:
+    """
+    Atributo de paso que conserva el JSON de su columna sin decodificar y solo
+    lo decodifica, una vez, la primera vez que se lee.
+
+    El valor se guarda en el slot '_<nombre>' de la instancia: primero como
+    _Crudo (texto de la columna o, en los pasos normalizados, lista de textos
+    de las filas de su tabla hija) y tras el primer acceso ya decodificado.
+    """
+
+    def __init__(self, vacio):
+        self.vacio = vacio
+
+    def __set_name__(self, owner, nombre):
+        self.nombre = nombre
+        self.slot = f'_{nombre}'
+
+    def __get__(self, obj, tipo=None):
+        if obj is None:
+            return self
+        valor = getattr(obj, self.slot, None)
+        if valor is None or isinstance(valor, _Crudo):
+            valor = self.decodificar(valor.valor if valor is not None else None)
+            setattr(obj, self.slot, valor)
+        return valor
+
+    def __set__(self, obj, valor):
+        setattr(obj, self.slot, valor)
+
+    def cargar(self, obj, crudo):
+        """Asigna el JSON sin decodificar de la columna"""
+        setattr(obj, self.slot, _Crudo(crudo))
+
+    def decodificar(self, crudo):
+        if not crudo:
+            return self.vacio()
+        if isinstance(crudo, list):
+            return [codec.loads(datos) for datos in crudo]
+
+        valor = codec.loads(crudo)
+        if self.vacio is list and not isinstance(valor, list):
+            return []
+        return valor
+
+
+# Máximo de IDs por consulta IN (por debajo del límite de variables de SQLite)
+TAMANO_BLOQUE_IDS = 500
+
+# Campo del formulario que guarda cada paso
+CAMPOS_PASO = {
+    1: 'datos_empresa',
+    2: 'info_trasteros',
+    3: 'usuarios_app',
+    4: 'config_correo',
+    5: 'niveles_acceso',
+    6: 'documentacion'
+}
+
+def consultar_por_bloques(conn, consulta: str, valores: List) -> List:
+    """
+    Ejecuta una consulta con IN ({placeholders}) por bloques de TAMANO_BLOQUE_IDS
+
+    Returns:
+        list: Filas de todos los bloques
+    """
+    filas = []
+    for inicio in range(0, len(valores), TAMANO_BLOQUE_IDS):
+        bloque = valores[inicio:inicio + TAMANO_BLOQUE_IDS]
+        placeholders = ', '.join('?' for _ in bloque)
+        filas.extend(conn.execute(consulta.format(placeholders=placeholders), bloque).fetchall())
+    return filas
+
+
+def entero_id(valor: Any) -> Optional[int]:
+    """
+    Entero recibido en JSON como en /api/save: un número entero (no un
+    booleano) o una cadena de dígitos
+
+    Returns:
+        int: El valor, o None si no es un entero válido
+    """
+    if type(valor) is int:
+        return valor
+    if isinstance(valor, str) and valor.isascii() and valor.isdigit():
+        return int(valor)
+    return None
+
+
+# Funciones a las que se avisa tras confirmar un cambio de progreso
+_oyentes_progreso = []
+
+
+def suscribir_progreso(funcion):
+    """
+    Registra una función que recibe el progreso de un cliente cada vez que se
+    confirma un guardado: {cliente_id, paso_actual, porcentaje_completado,
+    version} y 'completado' cuando se marca el formulario como terminado.
+    """
+    _oyentes_progreso.append(funcion)
+
+
+def notificar_progreso(progreso: Dict[str, Any]):
+    """Avisa a los oyentes; un oyente que falla no afecta al guardado"""
+    for funcion in list(_oyentes_progreso):
+        try:
+            funcion(progreso)
+        except Exception:
+            logger.exception("Error notificando progreso del cliente %s", progreso.get('cliente_id'))
+
+
+PASOS_JSON = ('datos_empresa', 'info_trasteros', 'usuarios_app',
+              'config_correo', 'niveles_acceso', 'documentacion')
 
 
 class Formulario:
     """Modelo para gestionar formularios de clientes"""
 
+    __slots__ = ('id', 'cliente_id', 'paso_actual', 'porcentaje_completado',
+                 'fecha_creacion', 'fecha_actualizacion', 'version',
+                 *(f'_{campo}' for campo in PASOS_JSON))
+
+    datos_empresa = CampoJSON(dict)
+    info_trasteros = CampoJSON(list)
+    usuarios_app = CampoJSON(list)
+    config_correo = CampoJSON(dict)
+    niveles_acceso = CampoJSON(list)
+    documentacion = CampoJSON(dict)
+
     def __init__(self, id=None, cliente_id=None, datos_empresa=None,
                  info_trasteros=None, usuarios_app=None, config_correo=None,
                  niveles_acceso=None, documentacion=None, paso_actual=1,
-                 porcentaje_completado=0, fecha_creacion=None, fecha_actualizacion=None):
+                 porcentaje_completado=0, fecha_creacion=None, fecha_actualizacion=None,
+                 version=1):
         self.id = id
         self.cliente_id = cliente_id
-        self.datos_empresa = datos_empresa or {}
-        self.info_trasteros = info_trasteros or []
-        self.usuarios_app = usuarios_app or {}
-        self.config_correo = config_correo or {}
-        self.niveles_acceso = niveles_acceso or {}
-        self.documentacion = documentacion or {}
+        # Los pasos no indicados quedan vacíos (se inicializan al leerlos)
+        self.datos_empresa = datos_empresa
+        self.info_trasteros = info_trasteros
+        self.usuarios_app = usuarios_app
+        self.config_correo = config_correo
+        self.niveles_acceso = niveles_acceso
+        self.documentacion = documentacion
         self.paso_actual = paso_actual
         self.porcentaje_completado = porcentaje_completado
         self.fecha_creacion = fecha_creacion
         self.fecha_actualizacion = fecha_actualizacion
+        # Contador de guardados; cambia con cada modificación (ETags)
+        self.version = version
 
     @classmethod
     def crear(cls, cliente_id: int) -> 'Formulario':
@@ -40,69 +202,247 @@ class Formulario:
         Returns:
             Formulario: Instancia del formulario creado
         """
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """INSERT INTO formularios_clientes (cliente_id, datos_empresa, info_trasteros,
-                                                 usuarios_app, config_correo, niveles_acceso, documentacion)
-               VALUES (?, ?, ?, ?, ?, ?, ?)""",
-            (cliente_id, '{}', '[]', '{}', '{}', '{}', '{}')
-        )
-        formulario_id = cursor.lastrowid
+        conn = get_connection(cliente_id=cliente_id)
+        formulario_id = cls._insertar(conn, cliente_id)
         conn.commit()
         conn.close()
 
         return cls.obtener_por_id(formulario_id)
 
+    @classmethod
+    def _insertar(cls, conn, cliente_id: int) -> int:
+        """Inserta un formulario vacío e indexado sin confirmar la transacción"""
+        cursor = conn.execute(
+            """INSERT INTO formularios_clientes (id, cliente_id, datos_empresa, info_trasteros,
+                                                 usuarios_app, config_correo, niveles_acceso, documentacion)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (particiones.registrar_formulario(cliente_id), cliente_id, '{}', '[]', '{}', '{}', '{}', '{}')
+        )
+        # El listado pasa a mostrar el progreso de este formulario
+        conn.execute(consultas.CONTAR_CAMBIO_LISTA)
+        Busqueda.indexar_formulario(conn, cls(id=cursor.lastrowid, cliente_id=cliente_id))
+        return cursor.lastrowid
+
     @classmethod
     def obtener_por_id(cls, formulario_id: int) -> Optional['Formulario']:
         """Obtiene un formulario por su ID"""
-        conn = get_connection()
+        conn = get_connection(formulario_id=formulario_id)
         cursor = conn.cursor()
 
         cursor.execute("SELECT * FROM formularios_clientes WHERE id = ?", (formulario_id,))
         row = cursor.fetchone()
-        conn.close()
 
-        if row:
-            return cls._from_row(row)
-        return None
+        try:
+            if row:
+                return cls._from_row(row, conn)
+            return None
+        finally:
+            conn.close()
 
     @classmethod
     def obtener_por_cliente(cls, cliente_id: int) -> Optional['Formulario']:
         """Obtiene el formulario de un cliente específico"""
-        conn = get_connection()
+        conn = get_connection(cliente_id=cliente_id)
         cursor = conn.cursor()
 
-        cursor.execute(
-            "SELECT * FROM formularios_clientes WHERE cliente_id = ? ORDER BY fecha_creacion DESC LIMIT 1",
-            (cliente_id,)
-        )
+        cursor.execute(consultas.FORMULARIO_RECIENTE, (cliente_id,))
         row = cursor.fetchone()
-        conn.close()
 
-        if row:
-            return cls._from_row(row)
-        return None
+        try:
+            if row:
+                return cls._from_row(row, conn)
+            return None
+        finally:
+            conn.close()
+
+    @staticmethod
+    def id_por_cliente(cliente_id: int) -> Optional[int]:
+        """ID del formulario más reciente de un cliente, sin cargar sus datos"""
+        conn = get_connection(cliente_id=cliente_id)
+        try:
+            row = conn.execute(consultas.ID_FORMULARIO_RECIENTE, (cliente_id,)).fetchone()
+            return row['id'] if row else None
+        finally:
+            conn.close()
+
+    @classmethod
+    def progreso_por_clientes(cls, cliente_ids: List[int], conn=None) -> Dict[int, Dict[str, int]]:
+        """
+        Obtiene el progreso del formulario más reciente de varios clientes con
+        una sola consulta por bloque de IDs, sin cargar ni decodificar los pasos
+
+        Args:
+            cliente_ids (list): IDs de los clientes
+            conn (sqlite3.Connection): Conexión a reutilizar, si todos los
+                clientes son de su partición (opcional)
+
+        Returns:
+            dict: {cliente_id: {'paso_actual': int, 'porcentaje_completado': int}}
+                  solo para los clientes que tienen formulario
+        """
+        if conn is None:
+            # Una conexión por partición con los clientes que viven en ella
+            progreso = {}
+            for particion, ids in particiones.agrupar(cliente_ids).items():
+                conn = get_connection(particiones.ruta_particion(particion))
+                try:
+                    progreso.update(cls.progreso_por_clientes(ids, conn))
+                finally:
+                    conn.close()
+            return progreso
+
+        ids = list(dict.fromkeys(cliente_ids))
+        progreso = {}
+        for inicio in range(0, len(ids), TAMANO_BLOQUE_IDS):
+            bloque = ids[inicio:inicio + TAMANO_BLOQUE_IDS]
+            placeholders = ', '.join('?' for _ in bloque)
+            rows = conn.execute(consultas.PROGRESO_CLIENTES.format(placeholders=placeholders), bloque).fetchall()
+            for row in rows:
+                progreso[row['cliente_id']] = {
+                    'paso_actual': row['paso_actual'],
+                    'porcentaje_completado': row['porcentaje_completado'],
+                }
+
+        return progreso
 
     @classmethod
-    def _from_row(cls, row) -> 'Formulario':
-        """Crea una instancia de Formulario desde una fila de la BD"""
-        return cls(
+    def _from_row(cls, row, conn) -> 'Formulario':
+        """
+        Crea una instancia de Formulario desde una fila de la BD
+
+        Los pasos no se decodifican aquí: cada uno se decodifica al leerlo.
+        """
+        formulario = cls(
             id=row['id'],
             cliente_id=row['cliente_id'],
-            datos_empresa=json.loads(row['datos_empresa'] or '{}'),
-            info_trasteros=json.loads(row['info_trasteros'] or '[]'),
-            usuarios_app=json.loads(row['usuarios_app'] or '[]'),
-            config_correo=json.loads(row['config_correo'] or '{}'),
-            niveles_acceso=json.loads(row['niveles_acceso'] or '[]'),
-            documentacion=json.loads(row['documentacion'] or '{}'),
             paso_actual=row['paso_actual'],
             porcentaje_completado=row['porcentaje_completado'],
             fecha_creacion=row['fecha_creacion'],
-            fecha_actualizacion=row['fecha_actualizacion']
+            fecha_actualizacion=row['fecha_actualizacion'],
+            version=row['version']
         )
+        for campo in ('datos_empresa', 'config_correo', 'documentacion'):
+            getattr(cls, campo).cargar(formulario, row[campo])
+        for campo in TABLAS_HIJAS:
+            getattr(cls, campo).cargar(formulario, cls._cargar_elementos(conn, row['id'], campo, row[campo]))
+        return formulario
+
+    @staticmethod
+    def _cargar_elementos(conn, formulario_id: int, campo: str, json_legado: Optional[str]):
+        """
+        Obtiene el JSON sin decodificar de un paso con lista desde su tabla hija.
+
+        Si la tabla no tiene filas se usa la columna JSON original, que solo
+        contiene datos en formularios aún no migrados.
+
+        Returns:
+            list | str: Textos JSON de cada fila, o el JSON de la columna legada
+        """
+        tabla = TABLAS_HIJAS[campo]['tabla']
+        rows = conn.execute(consultas.ELEMENTOS_PASO.format(tabla=tabla), (formulario_id,)).fetchall()
+
+        if rows:
+            return [r['datos'] for r in rows]
+        return json_legado
+
+    @staticmethod
+    def _valores_columnas(campo: str, elemento: Dict) -> tuple:
+        """Extrae los valores de las columnas indexadas de un elemento"""
+        return tuple(elemento.get(col) for col in TABLAS_HIJAS[campo]['columnas'])
+
+    @classmethod
+    def _sincronizar_elementos(cls, conn, formulario_id: int, campo: str, elementos: List[Dict]):
+        """
+        Sincroniza la tabla hija de un paso con la lista de elementos recibida.
+
+        Solo se escriben las posiciones cuyo contenido ha cambiado y se eliminan
+        las que sobran, en lugar de reescribir la lista completa.
+        """
+        tabla = TABLAS_HIJAS[campo]['tabla']
+
+        actuales = {
+            r['posicion']: r['datos']
+            for r in conn.execute(
+                f"SELECT posicion, datos FROM {tabla} WHERE formulario_id = ?",
+                (formulario_id,)
+            )
+        }
+
+        for posicion, elemento in enumerate(elementos):
+            datos = codec.dumps(elemento)
+            if actuales.get(posicion) == datos:
+                continue
+            cls._escribir_elemento(conn, formulario_id, campo, posicion, elemento, datos)
+
+        conn.execute(
+            f"DELETE FROM {tabla} WHERE formulario_id = ? AND posicion >= ?",
+            (formulario_id, len(elementos))
+        )
+
+    @classmethod
+    def _escribir_elemento(cls, conn, formulario_id: int, campo: str, posicion: int,
+                           elemento: Dict, datos: Optional[str] = None):
+        """Inserta o reemplaza el elemento de una posición de la tabla hija"""
+        tabla, columnas = TABLAS_HIJAS[campo]['tabla'], TABLAS_HIJAS[campo]['columnas']
+        cols_sql = ', '.join(columnas)
+        placeholders = ', '.join('?' for _ in columnas)
+        updates_sql = ', '.join(f"{col} = excluded.{col}" for col in columnas)
+
+        conn.execute(
+            f"""INSERT INTO {tabla} (formulario_id, posicion, {cols_sql}, datos)
+                VALUES (?, ?, {placeholders}, ?)
+                ON CONFLICT (formulario_id, posicion) DO UPDATE
+                SET {updates_sql},
+                    datos = excluded.datos,
+                    fecha_actualizacion = CURRENT_TIMESTAMP""",
+            (formulario_id, posicion, *cls._valores_columnas(campo, elemento),
+             datos if datos is not None else codec.dumps(elemento))
+        )
+
+    @classmethod
+    def migrar_json_a_tablas(cls, conn) -> int:
+        """
+        Mueve los pasos con listas guardados como JSON a sus tablas hijas.
+
+        Es idempotente: tras migrar un formulario su columna JSON queda en '[]'.
+
+        Args:
+            conn (sqlite3.Connection): Conexión abierta (la transacción la confirma el llamador)
+
+        Returns:
+            int: Número de formularios migrados
+        """
+        migrados = 0
+        rows = conn.execute(
+            """SELECT id, info_trasteros, usuarios_app, niveles_acceso
+               FROM formularios_clientes
+               WHERE COALESCE(info_trasteros, '[]') NOT IN ('[]', '')
+                  OR COALESCE(usuarios_app, '[]') NOT IN ('[]', '{}', '')
+                  OR COALESCE(niveles_acceso, '[]') NOT IN ('[]', '{}', '')"""
+        ).fetchall()
+
+        for row in rows:
+            for campo in TABLAS_HIJAS:
+                elementos = codec.loads(row[campo] or '[]')
+                if isinstance(elementos, list) and elementos:
+                    cls._sincronizar_elementos(conn, row['id'], campo, elementos)
+            conn.execute(
+                """UPDATE formularios_clientes
+                   SET info_trasteros = '[]', usuarios_app = '[]', niveles_acceso = '[]',
+                       fecha_actualizacion = CURRENT_TIMESTAMP
+                   WHERE id = ?""",
+                (row['id'],)
+            )
+            migrados += 1
+
+        return migrados
+
+    @staticmethod
+    def contar_trasteros() -> int:
+        """Cuenta los trasteros registrados entre todos los clientes"""
+        return sum(particiones.en_todas(
+            lambda conn: conn.execute("SELECT COUNT(*) FROM trasteros_formulario").fetchone()[0]
+        ))
 
     def guardar_paso(self, paso: int, datos: Dict[str, Any]) -> bool:
         """
@@ -115,21 +455,28 @@ class Formulario:
         Returns:
             bool: True si se guardó correctamente
         """
-        # Mapear paso a campo correspondiente
-        campos_paso = {
-            1: 'datos_empresa',
-            2: 'info_trasteros',
-            3: 'usuarios_app',
-            4: 'config_correo',
-            5: 'niveles_acceso',
-            6: 'documentacion'
-        }
-
-        if paso not in campos_paso:
+        campo = self._aplicar_paso(paso, datos)
+        if campo is None:
             return False
 
+        # Calcular porcentaje de completado
+        self.porcentaje_completado = self._calcular_porcentaje()
+
+        # Guardar en base de datos (solo la tabla hija del paso modificado)
+        return self._guardar_en_bd([campo] if campo in TABLAS_HIJAS else [])
+
+    def _aplicar_paso(self, paso: int, datos: Any) -> Optional[str]:
+        """
+        Asigna en memoria los datos de un paso y avanza paso_actual
+
+        Returns:
+            str: Campo modificado, o None si el paso no existe
+        """
+        if paso not in CAMPOS_PASO:
+            return None
+
         # Actualizar datos en memoria
-        campo = campos_paso[paso]
+        campo = CAMPOS_PASO[paso]
 
         if paso == 2:
             if isinstance(datos, dict):
@@ -155,11 +502,277 @@ class Formulario:
         if paso > self.paso_actual:
             self.paso_actual = paso
 
-        # Calcular porcentaje de completado
-        self.porcentaje_completado = self._calcular_porcentaje()
+        return campo
+
+    @classmethod
+    def guardar_pasos_lote(cls, elementos: List[Dict]) -> Dict:
+        """
+        Guarda varios pasos completos, de uno o varios clientes, en una única
+        transacción por partición
+
+        Cada formulario se carga una sola vez, recibe todos sus pasos con la
+        misma lógica que guardar_paso() y se escribe una vez con el porcentaje
+        recalculado. Un elemento no válido se rechaza sin afectar al resto; un
+        error de la BD deshace los pasos de la partición en que se produce
+        (sin particionar, el lote completo).
+
+        Args:
+            elementos (list): [{cliente_id, paso, datos}] en orden de aplicación
+
+        Returns:
+            dict: 'resultados' (uno por elemento, en el mismo orden) y
+                  'formularios' (progreso final de cada cliente modificado)
+        """
+        def validar(elemento):
+            if not isinstance(elemento, dict):
+                return "Elemento con formato no válido"
+            if elemento['cliente_id'] is None or elemento.get('datos') is None:
+                return "Datos incompletos (cliente_id o datos faltantes)"
+            if elemento['paso'] not in CAMPOS_PASO:
+                return "Paso no válido"
+            return None
+
+        # IDs y pasos como en /api/save: "1" vale, true no
+        elementos = [
+            dict(elemento, cliente_id=entero_id(elemento.get('cliente_id')), paso=entero_id(elemento.get('paso')))
+            if isinstance(elemento, dict) else elemento
+            for elemento in elementos
+        ]
+        errores = [validar(elemento) for elemento in elementos]
+        cliente_ids = list({e['cliente_id'] for e, error in zip(elementos, errores) if error is None})
+
+        formularios = {}
+        modificados = {}
+        for particion, ids_particion in particiones.agrupar(cliente_ids).items():
+            conn = get_connection(particiones.ruta_particion(particion))
+            try:
+                ids = cls._ids_por_clientes(conn, ids_particion)
+                for cliente_id, formulario_id in ids.items():
+                    if formulario_id is None:
+                        ids[cliente_id] = cls._insertar(conn, cliente_id)
+
+                # Una carga por formulario (sus pasos se decodifican al usarlos)
+                cargados = {
+                    row['cliente_id']: cls._from_row(row, conn)
+                    for row in consultar_por_bloques(
+                        conn,
+                        "SELECT * FROM formularios_clientes WHERE id IN ({placeholders})",
+                        list(ids.values())
+                    )
+                }
+
+                cambios = {}
+                for elemento, error in zip(elementos, errores):
+                    if error is None and elemento['cliente_id'] in cargados:
+                        formulario = cargados[elemento['cliente_id']]
+                        campo = formulario._aplicar_paso(elemento['paso'], elemento['datos'])
+                        cambios.setdefault(formulario, set()).add(campo)
+
+                for formulario, campos in cambios.items():
+                    formulario.porcentaje_completado = formulario._calcular_porcentaje()
+                    formulario._escribir_en_bd(conn, [c for c in TABLAS_HIJAS if c in campos])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+
+            for formulario in cambios:
+                formulario.version += 1
+                formulario._notificar_progreso()
+            formularios.update(cargados)
+            modificados.update(cambios)
+
+        resultados = []
+        for indice, (elemento, error) in enumerate(zip(elementos, errores)):
+            resultado = {'indice': indice, 'estado': 'guardado'}
+            if error is None and elemento['cliente_id'] not in formularios:
+                error = "Cliente no encontrado"
+            if error is None:
+                resultado.update(cliente_id=elemento['cliente_id'], paso=elemento['paso'])
+            else:
+                resultado.update(estado='error', error=error)
+            resultados.append(resultado)
+
+        progreso = {}
+        for formulario in modificados:
+            progreso[formulario.cliente_id] = {
+                'paso_actual': formulario.paso_actual,
+                'porcentaje_completado': formulario.porcentaje_completado,
+                'version': formulario.version,
+            }
+        return {'resultados': resultados, 'formularios': progreso}
+
+    @staticmethod
+    def _ids_por_clientes(conn, cliente_ids: List[int]) -> Dict[int, Optional[int]]:
+        """
+        ID del formulario más reciente de cada cliente existente
+
+        Returns:
+            dict: {cliente_id: formulario_id o None si aún no tiene formulario};
+                  los clientes que no existen no aparecen
+        """
+        return {
+            row['id']: row['formulario_id']
+            for row in consultar_por_bloques(
+                conn,
+                """SELECT c.id,
+                          (SELECT f.id FROM formularios_clientes f
+                           WHERE f.cliente_id = c.id
+                           ORDER BY f.fecha_creacion DESC, f.id DESC LIMIT 1) AS formulario_id
+                   FROM clientes c
+                   WHERE c.id IN ({placeholders})""",
+                cliente_ids
+            )
+        }
+
+    @classmethod
+    def aplicar_cambios(cls, formulario_id: int, paso: int, cambios: Dict[str, Any],
+                        total: Optional[int] = None) -> Optional[Dict[str, int]]:
+        """
+        Aplica en la BD solo los campos modificados de un paso, sin reescribir
+        el resto del formulario.
+
+        En los pasos con objeto (1, 4, 6) los campos se fusionan en el JSON
+        guardado con json_patch() dentro del propio UPDATE, de modo que dos
+        guardados simultáneos de campos distintos no se pisan. En los pasos
+        con lista (2, 3, 5) `cambios` indica los elementos modificados por
+        posición y `total` la nueva longitud de la lista.
 
-        # Guardar en base de datos
-        return self._guardar_en_bd()
+        Args:
+            formulario_id (int): ID del formulario
+            paso (int): Número del paso (1-6)
+            cambios (dict): {campo: valor} o {posición: elemento}
+            total (int): Número de elementos de la lista (pasos con lista)
+
+        Returns:
+            dict: paso_actual, porcentaje_completado y version tras guardar,
+                  o None si el formulario no existe
+
+        Raises:
+            ValueError: Si el paso o los cambios no son válidos
+        """
+        conn = get_connection(formulario_id=formulario_id)
+        try:
+            if not cls._escribir_cambios(conn, formulario_id, paso, cambios, total):
+                conn.rollback()
+                return None
+            resultado = cls._actualizar_derivados(conn, formulario_id)
+            conn.commit()
+            notificar_progreso(resultado)
+            return resultado
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    @classmethod
+    def _escribir_cambios(cls, conn, formulario_id: int, paso: int, cambios: Dict[str, Any],
+                          total: Optional[int] = None) -> bool:
+        """
+        Escribe los cambios de un paso (ver aplicar_cambios) sin confirmar la
+        transacción ni recalcular el porcentaje
+
+        Returns:
+            bool: False si el formulario no existe
+
+        Raises:
+            ValueError: Si el paso o los cambios no son válidos
+        """
+        campo = CAMPOS_PASO.get(paso)
+        if campo is None or not isinstance(cambios, dict):
+            raise ValueError("Paso o cambios no válidos")
+
+        conn.execute(consultas.CONTAR_CAMBIO_PROGRESO, (formulario_id, paso, None))
+        if campo not in TABLAS_HIJAS:
+            return conn.execute(
+                f"""UPDATE formularios_clientes
+                    SET {campo} = json_patch(
+                            CASE WHEN NOT json_valid({campo}) THEN '{{}}'
+                                 WHEN json_type({campo}) = 'object' THEN {campo}
+                                 ELSE '{{}}' END, ?),
+                        paso_actual = MAX(paso_actual, ?),
+                        version = version + 1,
+                        fecha_actualizacion = CURRENT_TIMESTAMP
+                    WHERE id = ?""",
+                (codec.dumps(cambios), paso, formulario_id)
+            ).rowcount > 0
+
+        if not isinstance(total, int) or isinstance(total, bool) or total < 0:
+            raise ValueError("Falta el número total de elementos")
+        try:
+            elementos = {int(posicion): elemento for posicion, elemento in cambios.items()}
+        except (TypeError, ValueError):
+            raise ValueError("Las posiciones deben ser números enteros")
+        if any(not 0 <= p < total or not isinstance(e, dict) for p, e in elementos.items()):
+            raise ValueError("Elemento fuera de la lista o con formato no válido")
+
+        actualizado = conn.execute(
+            """UPDATE formularios_clientes
+               SET paso_actual = MAX(paso_actual, ?), version = version + 1,
+                   fecha_actualizacion = CURRENT_TIMESTAMP
+               WHERE id = ?""",
+            (paso, formulario_id)
+        ).rowcount
+        if not actualizado:
+            return False
+
+        cls._migrar_legado(conn, formulario_id, campo)
+        for posicion, elemento in sorted(elementos.items()):
+            cls._escribir_elemento(conn, formulario_id, campo, posicion, elemento)
+        conn.execute(
+            f"DELETE FROM {TABLAS_HIJAS[campo]['tabla']} WHERE formulario_id = ? AND posicion >= ?",
+            (formulario_id, total)
+        )
+        return True
+
+    @classmethod
+    def _actualizar_derivados(cls, conn, formulario_id: int) -> Dict[str, int]:
+        """
+        Recalcula el porcentaje y el índice de búsqueda de un formulario tras
+        escribir cambios parciales, ya que dependen de todos los pasos
+
+        Returns:
+            dict: cliente_id, paso_actual, porcentaje_completado y version
+        """
+        row = conn.execute("SELECT * FROM formularios_clientes WHERE id = ?", (formulario_id,)).fetchone()
+        formulario = cls._from_row(row, conn)
+        porcentaje = formulario._calcular_porcentaje()
+        if porcentaje != formulario.porcentaje_completado:
+            conn.execute(
+                """UPDATE formularios_clientes
+                   SET porcentaje_completado = ?, fecha_actualizacion = CURRENT_TIMESTAMP
+                   WHERE id = ?""",
+                (porcentaje, formulario_id)
+            )
+            conn.execute(consultas.CONTAR_CAMBIO_LISTA)
+        Busqueda.indexar_formulario(conn, formulario)
+
+        return {
+            'cliente_id': formulario.cliente_id,
+            'paso_actual': formulario.paso_actual,
+            'porcentaje_completado': porcentaje,
+            'version': formulario.version,
+        }
+
+    @classmethod
+    def _migrar_legado(cls, conn, formulario_id: int, campo: str):
+        """Pasa a la tabla hija la lista de un formulario aún no migrado"""
+        tabla = TABLAS_HIJAS[campo]['tabla']
+        if conn.execute(f"SELECT 1 FROM {tabla} WHERE formulario_id = ? LIMIT 1", (formulario_id,)).fetchone():
+            return
+        legado = conn.execute(
+            f"SELECT {campo} FROM formularios_clientes WHERE id = ?", (formulario_id,)
+        ).fetchone()[0]
+        elementos = codec.loads(legado) if legado else []
+        if isinstance(elementos, list) and elementos:
+            cls._sincronizar_elementos(conn, formulario_id, campo, elementos)
+        conn.execute(
+            f"UPDATE formularios_clientes SET {campo} = '[]', fecha_actualizacion = CURRENT_TIMESTAMP WHERE id = ?",
+            (formulario_id,)
+        )
 
     def _calcular_porcentaje(self) -> int:
         """Calcula el porcentaje de completado basado en los datos"""
@@ -197,6 +810,11 @@ class Formulario:
 
         obligatorios = campos_obligatorios[paso]
 
+        # Trasteros, usuarios y niveles se guardan como lista (ver
+        # _aplicar_paso): basta con que tenga algún elemento
+        if isinstance(datos, list):
+            return paso in (2, 3, 5) and len(datos) > 0
+
         # Verificar campos obligatorios
         for campo in obligatorios:
             if campo not in datos or not datos[campo]:
@@ -212,42 +830,119 @@ class Formulario:
 
         return True
 
-    def _guardar_en_bd(self) -> bool:
-        """Guarda el formulario en la base de datos"""
-        conn = get_connection()
-        cursor = conn.cursor()
+    def pasos_incompletos(self) -> List[int]:
+        """Pasos cuyos campos obligatorios no están rellenos"""
+        return [paso for paso in CAMPOS_PASO if not self._paso_completo(paso, self.obtener_datos_paso(paso))]
+
+    def _notificar_progreso(self):
+        notificar_progreso({
+            'cliente_id': self.cliente_id,
+            'paso_actual': self.paso_actual,
+            'porcentaje_completado': self.porcentaje_completado,
+            'version': self.version,
+        })
 
+    @staticmethod
+    def completar(cliente_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Marca como terminado el formulario de un cliente (100 %) y el cliente
+
+        Returns:
+            dict: Progreso final del cliente, o None si no tiene formulario
+        """
+        conn = get_connection(cliente_id=cliente_id)
         try:
-            cursor.execute(
+            row = conn.execute(
                 """UPDATE formularios_clientes
-                   SET datos_empresa         = ?,
-                       info_trasteros        = ?,
-                       usuarios_app          = ?,
-                       config_correo         = ?,
-                       niveles_acceso        = ?,
-                       documentacion         = ?,
-                       paso_actual           = ?,
-                       porcentaje_completado = ?
-                   WHERE id = ?""",
-                (
-                    json.dumps(self.datos_empresa, ensure_ascii=False),
-                    json.dumps(self.info_trasteros, ensure_ascii=False),
-                    json.dumps(self.usuarios_app, ensure_ascii=False),
-                    json.dumps(self.config_correo, ensure_ascii=False),
-                    json.dumps(self.niveles_acceso, ensure_ascii=False),
-                    json.dumps(self.documentacion, ensure_ascii=False),
-                    self.paso_actual,
-                    self.porcentaje_completado,
-                    self.id
-                )
+                   SET porcentaje_completado = 100, version = version + 1,
+                       fecha_actualizacion = CURRENT_TIMESTAMP
+                   WHERE id = (SELECT id FROM formularios_clientes WHERE cliente_id = ?
+                               ORDER BY fecha_creacion DESC, id DESC LIMIT 1)
+                   RETURNING paso_actual, version""",
+                (cliente_id,)
+            ).fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            conn.execute(
+                "UPDATE clientes SET completado = 1, version = version + 1 WHERE id = ?",
+                (cliente_id,)
             )
+            conn.execute(consultas.CONTAR_CAMBIO_LISTA)
             conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        progreso = {
+            'cliente_id': cliente_id,
+            'paso_actual': row['paso_actual'],
+            'porcentaje_completado': 100,
+            'version': row['version'],
+            'completado': True,
+        }
+        notificar_progreso(progreso)
+        return progreso
+
+    def _guardar_en_bd(self, campos_lista: Optional[List[str]] = None) -> bool:
+        """
+        Guarda el formulario en la base de datos
+
+        Args:
+            campos_lista (list): Pasos con listas a sincronizar en sus tablas
+                hijas. Por defecto se sincronizan todos.
+        """
+        if campos_lista is None:
+            campos_lista = list(TABLAS_HIJAS)
+
+        conn = get_connection(cliente_id=self.cliente_id)
+        try:
+            self._escribir_en_bd(conn, campos_lista)
+            conn.commit()
+            self.version += 1
+            self._notificar_progreso()
             return True
         except sqlite3.Error:
+            conn.rollback()
             return False
         finally:
             conn.close()
 
+    def _escribir_en_bd(self, conn, campos_lista: List[str]):
+        """Escribe el formulario y las tablas hijas indicadas sin confirmar"""
+        # Las columnas JSON de los pasos sincronizados quedan vacías: su
+        # contenido vive ahora en la tabla hija correspondiente
+        legado_sql = ''.join(f"{campo} = '[]', " for campo in campos_lista)
+
+        conn.execute(consultas.CONTAR_CAMBIO_PROGRESO, (self.id, self.paso_actual, self.porcentaje_completado))
+        actualizado = conn.execute(
+            f"""UPDATE formularios_clientes
+               SET {legado_sql}datos_empresa = ?,
+                   config_correo         = ?,
+                   documentacion         = ?,
+                   paso_actual           = ?,
+                   porcentaje_completado = ?,
+                   version               = version + 1,
+                   fecha_actualizacion   = CURRENT_TIMESTAMP
+               WHERE id = ?""",
+            (
+                codec.dumps(self.datos_empresa),
+                codec.dumps(self.config_correo),
+                codec.dumps(self.documentacion),
+                self.paso_actual,
+                self.porcentaje_completado,
+                self.id
+            )
+        ).rowcount
+        if not actualizado:
+            # Borrado, o trasladado a otra partición mientras se editaba
+            raise sqlite3.IntegrityError(f"El formulario {self.id} ya no existe en esta base de datos")
+        for campo in campos_lista:
+            self._sincronizar_elementos(conn, self.id, campo, getattr(self, campo))
+        Busqueda.indexar_formulario(conn, self)
+
     def obtener_datos_paso(self, paso: int) -> Dict[str, Any]:
         """Obtiene los datos de un paso específico"""
         campos_paso = {
@@ -270,16 +965,10 @@ class Formulario:
 
     def obtener_archivos(self) -> List[Dict]:
         """Obtiene la lista de archivos subidos para este formulario"""
-        conn = get_connection()
+        conn = get_connection(cliente_id=self.cliente_id)
         cursor = conn.cursor()
 
-        cursor.execute(
-            """SELECT *
-               FROM archivos_clientes
-               WHERE formulario_id = ?
-               ORDER BY fecha_subida DESC""",
-            (self.id,)
-        )
+        cursor.execute(consultas.ARCHIVOS_FORMULARIO, (self.id,))
         rows = cursor.fetchall()
         conn.close()
 
@@ -312,6 +1001,7 @@ class Formulario:
             'documentacion': self.documentacion,
             'fecha_creacion': self.fecha_creacion,
             'fecha_actualizacion': self.fecha_actualizacion,
+            'version': self.version,
             'archivos': self.obtener_archivos(),
             'completo': self.esta_completo()
         }
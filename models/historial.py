@@ -0,0 +1,347 @@
+"""
+Historial de revisiones de los pasos del formulario
+
+Cada paso guarda su historia como una serie de revisiones numeradas: cada
+REVISIONES_BASE_CADA revisiones una copia completa (punto de control) y
+entre medias solo los cambios respecto a la anterior, todo en JSON
+comprimido. Reconstruir una revisión cuesta como mucho un punto de control y
+REVISIONES_BASE_CADA - 1 deltas.
+
+Las revisiones no se escriben durante el guardado: EscritorRevisiones recibe
+el aviso de progreso tras cada guardado confirmado y, en un hilo aparte,
+compara los pasos del formulario con su última revisión. Los guardados que
+llegan mientras tanto se agrupan en una sola revisión.
+"""
+
+import logging
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from database import consultas
+from database.init_db import get_connection
+from models import codec
+from models.formulario import CAMPOS_PASO, Formulario
+
+logger = logging.getLogger(__name__)
+
+# Delta: lista de operaciones sobre el JSON del paso, con la ruta como lista
+# de claves y posiciones:
+#   ['s', ruta, valor]  asigna (o añade al final de una lista)
+#   ['d', ruta]         borra una clave
+#   ['t', ruta, n]      recorta una lista a n elementos
+
+
+def calcular_delta(antes: Any, despues: Any) -> List[list]:
+    """Operaciones que convierten `antes` en `despues`"""
+    operaciones = []
+    _diferenciar(antes, despues, [], operaciones)
+    return operaciones
+
+
+def _diferenciar(antes, despues, ruta: list, operaciones: List[list]):
+    if isinstance(antes, dict) and isinstance(despues, dict):
+        for clave, valor in despues.items():
+            if clave in antes:
+                _diferenciar(antes[clave], valor, ruta + [clave], operaciones)
+            else:
+                operaciones.append(['s', ruta + [clave], valor])
+        operaciones.extend(['d', ruta + [clave]] for clave in antes if clave not in despues)
+    elif isinstance(antes, list) and isinstance(despues, list):
+        if len(antes) > len(despues):
+            operaciones.append(['t', ruta, len(despues)])
+        for posicion, valor in enumerate(despues):
+            if posicion < len(antes):
+                _diferenciar(antes[posicion], valor, ruta + [posicion], operaciones)
+            else:
+                operaciones.append(['s', ruta + [posicion], valor])
+    # 1 == True en Python, pero no en el JSON
+    elif type(antes) is not type(despues) or antes != despues:
+        operaciones.append(['s', ruta, despues])
+
+
+def aplicar_delta(datos: Any, delta: List[list]) -> Any:
+    """
+    Aplica un delta de calcular_delta (modifica `datos`)
+
+    Returns:
+        El resultado, que es otro objeto si el delta reemplaza la raíz
+    """
+    for operacion in delta:
+        tipo, ruta = operacion[0], operacion[1]
+        if tipo == 't':
+            del _resolver(datos, ruta)[operacion[2]:]
+        elif not ruta:
+            datos = operacion[2]
+        else:
+            padre = _resolver(datos, ruta[:-1])
+            clave = ruta[-1]
+            if tipo == 'd':
+                del padre[clave]
+            elif isinstance(padre, list) and clave == len(padre):
+                padre.append(operacion[2])
+            else:
+                padre[clave] = operacion[2]
+    return datos
+
+
+def _resolver(datos, ruta: list):
+    for clave in ruta:
+        datos = datos[clave]
+    return datos
+
+
+def _comprimir(datos: Any) -> bytes:
+    return zlib.compress(codec.dumps(datos).encode('utf-8'))
+
+
+def _descomprimir(blob: bytes) -> Any:
+    return codec.loads(zlib.decompress(blob))
+
+
+class Historial:
+    """Revisiones de los pasos de los formularios"""
+
+    @staticmethod
+    def _formulario_id(conn, cliente_id: int) -> Optional[int]:
+        row = conn.execute(consultas.ID_FORMULARIO_RECIENTE, (cliente_id,)).fetchone()
+        return row['id'] if row else None
+
+    @staticmethod
+    def _reconstruir(conn, formulario_id: int, paso: int, numero: Optional[int] = None) -> Optional[tuple]:
+        """
+        Datos de una revisión (la última si numero es None)
+
+        Returns:
+            tuple: (datos, número, número del punto de control del que parte),
+                   o None si la revisión no existe
+        """
+        if numero is None:
+            row = conn.execute(
+                "SELECT MAX(numero) FROM revisiones_pasos WHERE formulario_id = ? AND paso = ?",
+                (formulario_id, paso)
+            ).fetchone()
+            numero = row[0]
+            if numero is None:
+                return None
+
+        filas = conn.execute(
+            consultas.REVISIONES_DESDE_CONTROL,
+            (formulario_id, paso, numero, formulario_id, paso, numero)
+        ).fetchall()
+        if not filas or filas[-1]['numero'] != numero:
+            return None
+
+        datos = _descomprimir(filas[0]['datos'])
+        for fila in filas[1:]:
+            datos = aplicar_delta(datos, _descomprimir(fila['datos']))
+        return datos, numero, filas[0]['numero']
+
+    @classmethod
+    def capturar(cls, cliente_id: int, base_cada: int = 50, cache: Optional[OrderedDict] = None) -> int:
+        """
+        Añade una revisión por cada paso del formulario de un cliente que ha
+        cambiado desde su última revisión
+
+        Args:
+            cliente_id (int): ID del cliente
+            base_cada (int): Revisiones entre dos puntos de control
+            cache (OrderedDict): Última revisión de cada paso por formulario,
+                para no reconstruirla en cada captura (la mantiene el llamador)
+
+        Returns:
+            int: Revisiones añadidas
+        """
+        conn = get_connection(cliente_id=cliente_id)
+        try:
+            # Con el bloqueo de escritura: otro proceso puede estar capturando el mismo formulario
+            conn.execute("BEGIN IMMEDIATE")
+            formulario_id = cls._formulario_id(conn, cliente_id)
+            if formulario_id is None:
+                conn.rollback()
+                return 0
+            formulario = Formulario._from_row(
+                conn.execute("SELECT * FROM formularios_clientes WHERE id = ?", (formulario_id,)).fetchone(),
+                conn
+            )
+            ultimas = dict(conn.execute(
+                """SELECT paso, MAX(numero) FROM revisiones_pasos
+                   WHERE formulario_id = ? GROUP BY paso""",
+                (formulario_id,)
+            ).fetchall())
+
+            anteriores = cache.get(formulario_id, {}) if cache is not None else {}
+            actuales = {}
+            nuevas = 0
+            for paso, campo in CAMPOS_PASO.items():
+                datos = getattr(formulario, campo)
+                numero = ultimas.get(paso)
+                anterior = anteriores.get(paso)
+                if numero is None:
+                    anterior = None
+                elif anterior is None or anterior[1] != numero:
+                    anterior = cls._reconstruir(conn, formulario_id, paso, numero)
+
+                if anterior is None:
+                    delta, base = None, 1
+                else:
+                    delta = calcular_delta(anterior[0], datos)
+                    if not delta:
+                        actuales[paso] = anterior
+                        continue
+                    base = anterior[2]
+                numero = (numero or 0) + 1
+
+                completo = _comprimir(datos)
+                if delta is not None and numero - base < base_cada:
+                    blob = _comprimir(delta)
+                    # Un delta mayor que la copia completa no ahorra nada
+                    if len(blob) < len(completo):
+                        conn.execute(
+                            """INSERT INTO revisiones_pasos (formulario_id, paso, numero, version, completa, datos)
+                               VALUES (?, ?, ?, ?, 0, ?)""",
+                            (formulario_id, paso, numero, formulario.version, blob)
+                        )
+                        actuales[paso] = (datos, numero, base)
+                        nuevas += 1
+                        continue
+
+                conn.execute(
+                    """INSERT INTO revisiones_pasos (formulario_id, paso, numero, version, completa, datos)
+                       VALUES (?, ?, ?, ?, 1, ?)""",
+                    (formulario_id, paso, numero, formulario.version, completo)
+                )
+                actuales[paso] = (datos, numero, numero)
+                nuevas += 1
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        if cache is not None:
+            cache[formulario_id] = actuales
+            cache.move_to_end(formulario_id)
+        return nuevas
+
+    @classmethod
+    def listar(cls, cliente_id: int, paso: int) -> Optional[List[Dict]]:
+        """
+        Revisiones de un paso, de la más reciente a la más antigua
+
+        Returns:
+            list: [{numero, version, completa, bytes, fecha}], o None si el
+                  cliente no tiene formulario
+        """
+        conn = get_connection(cliente_id=cliente_id)
+        try:
+            formulario_id = cls._formulario_id(conn, cliente_id)
+            if formulario_id is None:
+                return None
+            return [
+                dict(row) for row in conn.execute(consultas.LISTA_REVISIONES, (formulario_id, paso))
+            ]
+        finally:
+            conn.close()
+
+    @classmethod
+    def reconstruir(cls, cliente_id: int, paso: int, numero: Optional[int] = None) -> Optional[Any]:
+        """
+        Datos de un paso tal como estaban en una revisión
+
+        Args:
+            numero (int): Número de revisión (la última si no se indica)
+
+        Returns:
+            Los datos del paso, o None si la revisión no existe
+        """
+        conn = get_connection(cliente_id=cliente_id)
+        try:
+            formulario_id = cls._formulario_id(conn, cliente_id)
+            resultado = formulario_id and cls._reconstruir(conn, formulario_id, paso, numero)
+            return resultado[0] if resultado else None
+        finally:
+            conn.close()
+
+    @classmethod
+    def diferencias(cls, cliente_id: int, paso: int, desde: int, hasta: Optional[int] = None) -> Optional[List[list]]:
+        """
+        Cambios de un paso entre dos revisiones
+
+        Args:
+            desde (int): Revisión de partida
+            hasta (int): Revisión final (la última si no se indica)
+
+        Returns:
+            list: Operaciones del delta (ver calcular_delta), o None si alguna
+                  de las revisiones no existe
+        """
+        conn = get_connection(cliente_id=cliente_id)
+        try:
+            formulario_id = cls._formulario_id(conn, cliente_id)
+            if formulario_id is None:
+                return None
+            inicial = cls._reconstruir(conn, formulario_id, paso, desde)
+            final = cls._reconstruir(conn, formulario_id, paso, hasta)
+            if inicial is None or final is None:
+                return None
+            return calcular_delta(inicial[0], final[0])
+        finally:
+            conn.close()
+
+
+class EscritorRevisiones:
+    """
+    Captura revisiones en un hilo propio a partir de los avisos de progreso
+    (suscribir_progreso), fuera del tiempo de respuesta de los guardados
+
+    Args:
+        base_cada (int): Revisiones entre dos puntos de control
+        max_cache (int): Formularios cuya última revisión se recuerda
+    """
+
+    def __init__(self, base_cada: int = 50, max_cache: int = 1000):
+        self.base_cada = base_cada
+        self.max_cache = max_cache
+        self._cache = OrderedDict()
+        # Clientes pendientes, sin repetir y en orden de llegada
+        self._pendientes = OrderedDict()
+        self._ocupado = False
+        self._condicion = threading.Condition()
+        # El hilo se arranca en cada proceso al recibir el primer aviso (tras un fork)
+        self._pid = None
+
+    def encolar(self, progreso: Dict[str, Any]):
+        """Oyente de suscribir_progreso"""
+        with self._condicion:
+            self._pendientes[progreso['cliente_id']] = None
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._cache.clear()
+                threading.Thread(target=self._trabajar, name='revisiones', daemon=True).start()
+            self._condicion.notify_all()
+
+    def esperar(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que no quede nada por capturar; False si se agota el tiempo"""
+        with self._condicion:
+            return self._condicion.wait_for(lambda: not self._pendientes and not self._ocupado, timeout)
+
+    def _trabajar(self):
+        while True:
+            with self._condicion:
+                self._condicion.wait_for(lambda: self._pendientes)
+                cliente_id, _ = self._pendientes.popitem(last=False)
+                self._ocupado = True
+            try:
+                Historial.capturar(cliente_id, self.base_cada, self._cache)
+                while len(self._cache) > self.max_cache:
+                    self._cache.popitem(last=False)
+            except Exception:
+                logger.exception("Error capturando revisiones del cliente %s", cliente_id)
+            finally:
+                with self._condicion:
+                    self._ocupado = False
+                    self._condicion.notify_all()
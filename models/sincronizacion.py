@@ -0,0 +1,163 @@
+"""
+Sincronización por lotes de los guardados hechos sin conexión
+"""
+
+from typing import Dict, List, Any, Optional
+from database import particiones
+from database.init_db import get_connection
+from models import codec
+from models.formulario import Formulario, consultar_por_bloques, entero_id, notificar_progreso
+
+
+MAX_LONGITUD_CLAVE = 64
+
+
+class Sincronizacion:
+    """
+    Aplica las operaciones de guardado encoladas por el navegador.
+
+    Cada operación es un guardado parcial de un paso (el mismo formato que
+    /api/save/delta) con una clave de idempotencia generada en el cliente.
+    """
+
+    @staticmethod
+    def _validar(operacion: Any) -> Optional[str]:
+        """Devuelve el motivo por el que una operación no es válida, o None"""
+        if not isinstance(operacion, dict):
+            return "Operación con formato no válido"
+        clave = operacion.get('clave')
+        if not isinstance(clave, str) or not 0 < len(clave) <= MAX_LONGITUD_CLAVE:
+            return "Clave de idempotencia no válida"
+        if operacion['cliente_id'] is None or operacion['paso'] is None:
+            return "Datos incompletos (cliente_id o paso faltantes)"
+        if not isinstance(operacion.get('cambios'), dict):
+            return "Datos incompletos (cambios faltantes)"
+        return None
+
+    @classmethod
+    def aplicar_lote(cls, operaciones: List[Dict], retencion_dias: int = 30) -> Dict:
+        """
+        Aplica una lista de operaciones, en orden, en una única transacción
+        por partición
+
+        Las operaciones cuya clave ya se aplicó devuelven el resultado guardado
+        sin volver a aplicarse, por lo que reenviar un lote es seguro. Una
+        operación no válida se rechaza sin afectar al resto; un error de la BD
+        deshace las operaciones de la partición en que se produce (sin
+        particionar, el lote completo) y el navegador las reenvía más tarde.
+
+        Args:
+            operaciones (list): [{clave, cliente_id, paso, cambios, total}]
+            retencion_dias (int): Días que se conservan las claves aplicadas
+
+        Returns:
+            dict: 'resultados' (uno por operación, en el mismo orden) y
+                  'formularios' (progreso final de cada cliente modificado)
+        """
+        # IDs y pasos como en /api/save: "1" vale, true no
+        operaciones = [
+            dict(op, cliente_id=entero_id(op.get('cliente_id')), paso=entero_id(op.get('paso')))
+            if isinstance(op, dict) else op
+            for op in operaciones
+        ]
+        errores = [cls._validar(op) for op in operaciones]
+        resultados = [
+            {'clave': op.get('clave') if isinstance(op, dict) else None, 'estado': 'error', 'error': error}
+            if error else None
+            for op, error in zip(operaciones, errores)
+        ]
+        cliente_ids = [op['cliente_id'] for op, error in zip(operaciones, errores) if error is None]
+
+        progreso = {}
+        for particion, ids in particiones.agrupar(cliente_ids).items():
+            ids = set(ids)
+            indices = [
+                i for i, (op, error) in enumerate(zip(operaciones, errores))
+                if error is None and op['cliente_id'] in ids
+            ]
+            conn = get_connection(particiones.ruta_particion(particion))
+            try:
+                cambios = cls._aplicar_en_particion(
+                    conn, [operaciones[i] for i in indices], list(ids), retencion_dias
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+
+            for indice, resultado in zip(indices, cambios['resultados']):
+                resultados[indice] = resultado
+            for cambio in cambios['formularios'].values():
+                notificar_progreso(cambio)
+            progreso.update(cambios['formularios'])
+
+        return {'resultados': resultados, 'formularios': progreso}
+
+    @staticmethod
+    def _aplicar_en_particion(conn, operaciones: List[Dict], cliente_ids: List[int],
+                              retencion_dias: int) -> Dict:
+        """
+        Aplica operaciones válidas de clientes de una misma partición sin
+        confirmar la transacción
+
+        Returns:
+            dict: 'resultados' de cada operación y 'formularios' modificados
+        """
+        conn.execute(
+            "DELETE FROM operaciones_sincronizadas WHERE fecha < datetime('now', ?)",
+            (f'-{int(retencion_dias)} days',)
+        )
+
+        aplicadas = {
+            row['clave']: codec.loads(row['resultado'])
+            for row in consultar_por_bloques(
+                conn,
+                "SELECT clave, resultado FROM operaciones_sincronizadas WHERE clave IN ({placeholders})",
+                list({op['clave'] for op in operaciones})
+            )
+        }
+
+        # Formulario más reciente de cada cliente existente
+        formularios = Formulario._ids_por_clientes(conn, cliente_ids)
+
+        modificados = {}
+        resultados = []
+
+        for operacion in operaciones:
+            clave = operacion['clave']
+            if clave in aplicadas:
+                resultados.append({'clave': clave, **aplicadas[clave], 'duplicada': True})
+                continue
+
+            cliente_id = operacion['cliente_id']
+            resultado = {'estado': 'aplicada'}
+            if cliente_id not in formularios:
+                resultado = {'estado': 'error', 'error': 'Cliente no encontrado'}
+            else:
+                if formularios[cliente_id] is None:
+                    formularios[cliente_id] = Formulario._insertar(conn, cliente_id)
+                try:
+                    Formulario._escribir_cambios(
+                        conn, formularios[cliente_id], operacion['paso'],
+                        operacion['cambios'], operacion.get('total')
+                    )
+                    modificados[formularios[cliente_id]] = cliente_id
+                except ValueError as e:
+                    resultado = {'estado': 'error', 'error': str(e)}
+
+            conn.execute(
+                """INSERT INTO operaciones_sincronizadas (clave, cliente_id, paso, resultado)
+                   VALUES (?, ?, ?, ?)""",
+                (clave, cliente_id, operacion['paso'], codec.dumps(resultado))
+            )
+            aplicadas[clave] = resultado
+            resultados.append({'clave': clave, **resultado})
+
+        # Porcentaje e índice de búsqueda una sola vez por formulario
+        progreso = {
+            cliente_id: Formulario._actualizar_derivados(conn, formulario_id)
+            for formulario_id, cliente_id in modificados.items()
+        }
+        return {'resultados': resultados, 'formularios': progreso}
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Servidor de producción: varios procesos con la aplicación precargada
+
+    FLASK_CONFIG=production python servidor.py
+
+- El proceso principal importa la aplicación, inicializa la base de datos y
+  construye los recursos estáticos una sola vez; los workers se crean con fork
+  y comparten esa memoria sin copiarla.
+- Cada worker se recicla tras SERVIDOR_MAX_PETICIONES peticiones para acotar
+  el crecimiento de la memoria.
+- SIGHUP recarga el código sin cortar el servicio: se importan de nuevo los
+  módulos de la aplicación, se crean workers nuevos y los antiguos terminan
+  las peticiones en curso (guardados, subidas) durante SERVIDOR_TIEMPO_DRENADO
+  segundos antes de salir. SIGTERM detiene el servidor con el mismo drenado.
+- El progreso en vivo (SSE) funciona con cualquier número de workers: los
+  eventos pasan por el fichero SSE_ALMACEN_RUTA (web/eventos.py), que todos
+  los workers deben ver, así que deben correr en el mismo equipo. Con varios
+  equipos, cada uno solo ve los guardados que recibe. En modo wsgi cada
+  conexión SSE abierta ocupa un hilo hasta SSE_DURACION_MAX.
+
+Los ajustes (SERVIDOR_*) salen de la misma configuración que la aplicación.
+Requiere gunicorn (pip install gunicorn) y, con SERVIDOR_MODO=asgi, uvicorn.
+"""
+
+import gc
+import importlib
+import signal
+import sys
+import traceback
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    sys.exit("El servidor de producción necesita gunicorn: pip install gunicorn")
+
+
+# Paquetes y módulos de la aplicación que SIGHUP vuelve a importar
+MODULOS_APLICACION = {'app', 'asgi', 'config', 'models', 'web', 'database'}
+
+
+def _es_modulo_aplicacion(nombre: str) -> bool:
+    return nombre.split('.', 1)[0] in MODULOS_APLICACION
+
+
+def _bus_eventos():
+    return sys.modules['app'].app.extensions['eventos']
+
+
+def _post_worker_init(worker):
+    """
+    Cierra los flujos SSE en cuanto el worker empieza a salir, para que no
+    retengan el drenado hasta SERVIDOR_TIEMPO_DRENADO
+    """
+    salida = signal.getsignal(signal.SIGTERM)
+
+    def drenar(signo, marco):
+        _bus_eventos().cerrar()
+        if callable(salida):
+            salida(signo, marco)
+
+    signal.signal(signal.SIGTERM, drenar)
+
+
+def _post_request(worker, peticion, environ, respuesta):
+    # Reciclado por número de peticiones: el worker deja de aceptar y drena
+    if not worker.alive:
+        _bus_eventos().cerrar()
+
+
+def ajustes_servidor(cfg) -> dict:
+    """Ajustes de gunicorn a partir de una clase de configuración"""
+    asgi = cfg.SERVIDOR_MODO == 'asgi'
+    ajustes = {
+        'bind': cfg.SERVIDOR_DIRECCION,
+        'workers': cfg.SERVIDOR_WORKERS,
+        'worker_class': 'uvicorn.workers.UvicornWorker' if asgi else 'gthread',
+        'threads': cfg.SERVIDOR_HILOS,
+        'preload_app': True,
+        'max_requests': cfg.SERVIDOR_MAX_PETICIONES,
+        'max_requests_jitter': cfg.SERVIDOR_MAX_PETICIONES_VARIACION,
+        'graceful_timeout': cfg.SERVIDOR_TIEMPO_DRENADO,
+        'timeout': cfg.SERVIDOR_TIMEOUT,
+    }
+    # uvicorn gestiona sus propias señales y su cierre ordenado
+    if not asgi:
+        ajustes['post_worker_init'] = _post_worker_init
+        ajustes['post_request'] = _post_request
+    return ajustes
+
+
+class ServidorProduccion(BaseApplication):
+    """Aplicación de gunicorn que precarga la app y la recarga con SIGHUP"""
+
+    def load_config(self):
+        config = importlib.import_module('config')
+        for clave, valor in ajustes_servidor(config.config_entorno()).items():
+            self.cfg.set(clave, valor)
+
+    def load(self):
+        modulo = importlib.import_module('app')
+        modulo.init_db()
+        if modulo.app.config['SERVIDOR_MODO'] == 'asgi':
+            aplicacion = importlib.import_module('asgi').aplicacion
+        else:
+            aplicacion = modulo.app
+
+        # Lo cargado hasta aquí pasa a la generación permanente: el recolector
+        # deja de recorrerlo y sus páginas siguen compartidas tras el fork
+        gc.collect()
+        gc.freeze()
+        return aplicacion
+
+    def reload(self):
+        anteriores = {n: m for n, m in sys.modules.items() if _es_modulo_aplicacion(n)}
+        callable_anterior = self.callable
+        for nombre in anteriores:
+            del sys.modules[nombre]
+
+        gc.unfreeze()
+        try:
+            self.callable = self.load()
+        except Exception:
+            # Código nuevo con errores: se sigue sirviendo el anterior
+            traceback.print_exc()
+            sys.modules.update(anteriores)
+            self.callable = callable_anterior
+            gc.freeze()
+
+        super().reload()
+
+
+if __name__ == '__main__':
+    ServidorProduccion().run()
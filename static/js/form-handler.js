@@ -7,9 +7,20 @@ class FormularioCliente {
         this.currentStep = 1;
         this.totalSteps = 6;
         this.clienteId = null;
-        this.autoSaveInterval = null;
         this.isSubmitting = false;
 
+        // Autoguardado por diferencias
+        this.autoSaveDelay = 1500;      // ms sin escribir antes de guardar
+        this.autoSaveTimer = null;
+        this.dirtyFields = new Map();   // paso -> Set de campos modificados
+        this.savedData = {};            // paso -> datos confirmados por el servidor
+        this.saveInFlight = null;       // promesa del guardado en curso
+        this.savePending = false;       // hubo cambios durante el guardado en curso
+
+        // Guardados sin conexión pendientes de sincronizar
+        this.colaOffline = null;
+        this.offlinePendientes = 0;
+
         this.init();
     }
 
@@ -35,6 +46,9 @@ class FormularioCliente {
 
         // Cargar datos existentes
         this.loadExistingData();
+
+        // Precargar en segundo plano los pasos vecinos (renderizado bajo demanda)
+        this.prefetchAdjacentSteps();
         console.log('Formulario inicializado correctamente');
     }
 
@@ -141,14 +155,290 @@ class FormularioCliente {
     }
 
     setupAutoSave() {
-        // Guardar automáticamente cada 30 segundos
-        this.autoSaveInterval = setInterval(() => {
-            this.autoSave();
-        }, 30000);
-
-        // Guardar al cambiar de pestaña/ventana
-        window.addEventListener('beforeunload', () => {
-            this.saveCurrentStep();
+        this.savedData = this._initialSavedData();
+        this.setupOfflineQueue();
+
+        // Marcar los campos modificados y guardar cuando se deja de escribir
+        if (this.elements.form) {
+            const marcar = (e) => this.markDirty(e);
+            this.elements.form.addEventListener('input', marcar);
+            this.elements.form.addEventListener('change', marcar);
+            // Añadir o quitar filas en los pasos con lista no genera 'input'
+            this.elements.form.addEventListener('click', (e) => {
+                if (e.target.closest('button')) marcar(e);
+            });
+        }
+
+        // Al salir de la página los fetch pueden cancelarse: enviar lo
+        // pendiente con sendBeacon
+        window.addEventListener('pagehide', () => this.flushWithBeacon());
+        document.addEventListener('visibilitychange', () => {
+            if (document.visibilityState === 'hidden') this.flushWithBeacon();
+        });
+    }
+
+    setupOfflineQueue() {
+        if (!ColaSincronizacion.disponible()) return;
+
+        this.colaOffline = new ColaSincronizacion();
+        this.colaOffline.onCambio = (pendientes) => {
+            this.offlinePendientes = pendientes;
+            if (pendientes) this.updateSaveStatus('offline');
+        };
+        this.colaOffline.onSincronizado = (resultado) => {
+            const progreso = resultado.formularios && resultado.formularios[this.clienteId];
+            if (progreso) this.updateProgress(progreso.porcentaje_completado);
+            this.updateSaveStatus('saved');
+        };
+        this.colaOffline.escuchar();
+        this.colaOffline.notificar();
+
+        // Enviar lo que quedara pendiente de una sesión anterior
+        this.colaOffline.sincronizar().catch(error => console.log('Error al sincronizar:', error));
+    }
+
+    async _queueDeltas(deltas) {
+        // Las diferencias se dan por guardadas en local y se enviarán en orden
+        this.offlinePendientes += deltas.length;
+        deltas.forEach(delta => this._markSaved(delta));
+        this.updateSaveStatus('offline');
+
+        await this.colaOffline.encolar(deltas.map(delta => ({
+            cliente_id: this.clienteId,
+            paso: delta.paso,
+            cambios: delta.cambios,
+            total: delta.total
+        })));
+        if (navigator.onLine) {
+            this.colaOffline.sincronizar().catch(error => console.log('Error al sincronizar:', error));
+        }
+    }
+
+    _initialSavedData() {
+        const df = (window.formularioData && window.formularioData.datosFormulario) || {};
+        const lista = (valor) => Array.isArray(valor) ? valor : [];
+        const objeto = (valor) => (valor && !Array.isArray(valor) && typeof valor === 'object') ? {...valor} : {};
+
+        return {
+            1: objeto(df.datos_empresa),
+            2: lista(df.info_trasteros),
+            3: lista(df.usuarios_app),
+            4: objeto(df.config_correo),
+            5: lista(df.niveles_acceso)
+        };
+    }
+
+    markDirty(event) {
+        // composedPath conserva el paso aunque el elemento ya se haya eliminado
+        const stepElement = event.composedPath().find(
+            el => el.classList && el.classList.contains('form-step')
+        );
+        if (!stepElement) return;
+
+        const step = parseInt(stepElement.dataset.step, 10);
+        if (!this._markStepDirty(step, event.target.name ? [event.target.name] : [])) return;
+
+        clearTimeout(this.autoSaveTimer);
+        this.autoSaveTimer = setTimeout(() => this.autoSave(), this.autoSaveDelay);
+    }
+
+    _markStepDirty(step, names) {
+        if (!(step in FormularioCliente.STEP_FIELDS)) return false;
+
+        if (!this.dirtyFields.has(step)) {
+            this.dirtyFields.set(step, new Set());
+        }
+        if (!FormularioCliente.LIST_STEPS.includes(step)) {
+            names.forEach(name => this.dirtyFields.get(step).add(name));
+        }
+        return true;
+    }
+
+    _readField(stepElement, name) {
+        const inputs = [...stepElement.querySelectorAll('input, select, textarea')]
+            .filter(input => input.name === name);
+        if (!inputs.length) return undefined;
+
+        const input = inputs[0];
+        if (input.type === 'checkbox') return input.checked;
+        if (input.type === 'radio') {
+            const checked = inputs.find(i => i.checked);
+            return checked ? checked.value : undefined;
+        }
+        return input.value;
+    }
+
+    _readListStep(step) {
+        if (step === 2) return this.getTrasterosData();
+        if (step === 3) return this.getUsuariosData();
+        return this.getNivelesData();
+    }
+
+    collectDeltas() {
+        // Calcula, por paso, solo lo que difiere de lo último guardado
+        const deltas = [];
+
+        for (const [step, fields] of this.dirtyFields) {
+            const stepElement = document.querySelector(`.form-step[data-step="${step}"]`);
+            // Un paso sin cargar no tiene datos en el DOM: no hay nada que enviar
+            if (!stepElement || stepElement.dataset.cargado === 'false') continue;
+
+            const guardado = this.savedData[step];
+
+            if (FormularioCliente.LIST_STEPS.includes(step)) {
+                const datos = this._readListStep(step);
+                const cambios = {};
+                datos.forEach((elemento, posicion) => {
+                    if (JSON.stringify(elemento) !== JSON.stringify(guardado[posicion])) {
+                        cambios[posicion] = elemento;
+                    }
+                });
+                if (Object.keys(cambios).length || datos.length !== guardado.length) {
+                    deltas.push({paso: step, cambios, total: datos.length, datos, fields});
+                }
+            } else {
+                const cambios = {};
+                fields.forEach(name => {
+                    const valor = this._readField(stepElement, name);
+                    if (valor !== undefined && valor !== guardado[name]) {
+                        cambios[name] = valor;
+                    }
+                });
+                if (Object.keys(cambios).length) {
+                    deltas.push({paso: step, cambios, datos: {...guardado, ...cambios}, fields});
+                }
+            }
+        }
+
+        this.dirtyFields.clear();
+        return deltas;
+    }
+
+    _deltaBody(delta) {
+        const body = {cliente_id: this.clienteId, paso: delta.paso, cambios: delta.cambios};
+        if (delta.total !== undefined) body.total = delta.total;
+        return JSON.stringify(body);
+    }
+
+    _markSaved(delta) {
+        this.savedData[delta.paso] = delta.datos;
+
+        // Mantener formularioData al día para volver al paso sin recargar
+        if (window.formularioData) {
+            window.formularioData.datosFormulario = window.formularioData.datosFormulario || {};
+            window.formularioData.datosFormulario[FormularioCliente.STEP_FIELDS[delta.paso]] = delta.datos;
+        }
+    }
+
+    _restoreDirty(delta) {
+        // Si el envío falla, los campos vuelven a quedar pendientes
+        if (!this.dirtyFields.has(delta.paso)) {
+            this.dirtyFields.set(delta.paso, new Set());
+        }
+        delta.fields.forEach(name => this.dirtyFields.get(delta.paso).add(name));
+    }
+
+    async flushChanges() {
+        clearTimeout(this.autoSaveTimer);
+        this.autoSaveTimer = null;
+
+        if (!this.clienteId) return;
+
+        // Un solo guardado a la vez: los cambios que lleguen mientras tanto
+        // se envían juntos al terminar
+        if (this.saveInFlight) {
+            this.savePending = true;
+            return this.saveInFlight;
+        }
+
+        const deltas = this.collectDeltas();
+        if (!deltas.length) return;
+
+        this.saveInFlight = this._sendDeltas(deltas).finally(() => {
+            this.saveInFlight = null;
+            if (this.savePending) {
+                this.savePending = false;
+                this.flushChanges().catch(error => console.log('Error en guardado automático:', error));
+            }
+        });
+        return this.saveInFlight;
+    }
+
+    async _sendDeltas(deltas) {
+        // Sin conexión, o con operaciones aún en cola, se encola para no
+        // adelantar a las anteriores
+        if (this.colaOffline && (!navigator.onLine || this.offlinePendientes > 0)) {
+            return this._queueDeltas(deltas);
+        }
+
+        this.updateSaveStatus('saving');
+
+        for (let i = 0; i < deltas.length; i++) {
+            const delta = deltas[i];
+            try {
+                const response = await fetch('/api/save/delta', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: this._deltaBody(delta)
+                });
+                if (response.status === 429 || response.status === 503) {
+                    // Servidor saturado: se reintenta cuando indique Retry-After
+                    deltas.slice(i).forEach(d => this._restoreDirty(d));
+                    this._retryAutoSave(response);
+                    return;
+                }
+                const result = await response.json();
+                if (!response.ok) {
+                    throw new Error(result.error || 'Error al guardar');
+                }
+
+                this._markSaved(delta);
+                if (typeof result.porcentaje === 'number') {
+                    this.updateProgress(result.porcentaje);
+                }
+            } catch (error) {
+                // fetch solo lanza TypeError si no llega al servidor (sin red)
+                if (this.colaOffline && error instanceof TypeError) {
+                    return this._queueDeltas(deltas.slice(i));
+                }
+                deltas.slice(i).forEach(d => this._restoreDirty(d));
+                this.updateSaveStatus('error');
+                throw error;
+            }
+        }
+
+        this.updateSaveStatus('saved');
+    }
+
+    _retryAutoSave(response) {
+        const segundos = parseInt(response.headers.get('Retry-After'), 10) || 2;
+        clearTimeout(this.autoSaveTimer);
+        this.autoSaveTimer = setTimeout(() => this.autoSave(), segundos * 1000);
+    }
+
+    flushWithBeacon() {
+        clearTimeout(this.autoSaveTimer);
+        this.autoSaveTimer = null;
+        if (!this.clienteId) return;
+
+        if (this.colaOffline && (!navigator.onLine || this.offlinePendientes > 0)) {
+            const deltas = this.collectDeltas();
+            if (deltas.length) this._queueDeltas(deltas).catch(() => {});
+            return;
+        }
+
+        this.collectDeltas().forEach(delta => {
+            const body = this._deltaBody(delta);
+            const enviado = navigator.sendBeacon &&
+                navigator.sendBeacon('/api/save/delta', new Blob([body], {type: 'application/json'}));
+            if (!enviado) {
+                fetch('/api/save/delta', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body,
+                    keepalive: true
+                }).catch(() => {});
+            }
         });
     }
 
@@ -620,9 +910,98 @@ class FormularioCliente {
         }
     }
 
-    _navigateToStep(step) {
+    ensureStepLoaded(step) {
+        // Con el renderizado bajo demanda, los pasos que no son el actual llegan
+        // vacíos y su HTML se descarga la primera vez que se necesitan
+        const stepElement = document.querySelector(`.form-step[data-step="${step}"]`);
+        if (!stepElement || stepElement.dataset.cargado !== 'false') {
+            return Promise.resolve();
+        }
+
+        // La promesa se guarda en el propio elemento para no descargar ni
+        // insertar dos veces el mismo paso
+        if (!stepElement._cargaPromise) {
+            const url = (window.formularioData?.fragmentosUrl || [])[step - 1];
+
+            stepElement._cargaPromise = fetch(url, {credentials: 'same-origin'})
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`Error ${response.status} al cargar el paso ${step}`);
+                    }
+                    return response.text();
+                })
+                .then(html => {
+                    stepElement.innerHTML = html;
+                    this._runFragmentScripts(stepElement);
+                    stepElement.dataset.cargado = 'true';
+
+                    stepElement.querySelectorAll('[data-bs-toggle="tooltip"]').forEach(el => {
+                        new bootstrap.Tooltip(el);
+                    });
+                })
+                .catch(error => {
+                    delete stepElement._cargaPromise;
+                    throw error;
+                });
+        }
+
+        return stepElement._cargaPromise;
+    }
+
+    _runFragmentScripts(container) {
+        // Los <script> insertados con innerHTML no se ejecutan: se recrean.
+        // Los scripts de los pasos se registran en DOMContentLoaded, que ya se
+        // disparó, así que durante su ejecución ese evento se invoca al momento.
+        const originalAddEventListener = document.addEventListener;
+
+        document.addEventListener = function (type, listener, options) {
+            if (type === 'DOMContentLoaded') {
+                listener.call(document, new Event('DOMContentLoaded'));
+                return;
+            }
+            return originalAddEventListener.call(document, type, listener, options);
+        };
+
+        try {
+            container.querySelectorAll('script').forEach(oldScript => {
+                const script = document.createElement('script');
+                script.textContent = oldScript.textContent;
+                oldScript.replaceWith(script);
+            });
+        } finally {
+            document.addEventListener = originalAddEventListener;
+        }
+    }
+
+    prefetchAdjacentSteps() {
+        const prefetch = () => {
+            [this.currentStep + 1, this.currentStep - 1].forEach(step => {
+                if (step >= 1 && step <= this.totalSteps) {
+                    this.ensureStepLoaded(step).catch(error => {
+                        console.log('Error al precargar el paso:', error);
+                    });
+                }
+            });
+        };
+
+        if ('requestIdleCallback' in window) {
+            window.requestIdleCallback(prefetch);
+        } else {
+            setTimeout(prefetch, 200);
+        }
+    }
+
+    async _navigateToStep(step) {
         console.log(`Navegando al paso ${step}`);
 
+        try {
+            await this.ensureStepLoaded(step);
+        } catch (error) {
+            console.error('Error al cargar el paso:', error);
+            this.showToast('No se pudo cargar el paso. Compruebe su conexión.', 'error');
+            return;
+        }
+
         // Guardar datos del paso actual si estamos avanzando
         if (step > this.currentStep) {
             this.saveCurrentStep().catch(error => {
@@ -640,6 +1019,8 @@ class FormularioCliente {
             this.loadStepData(step, window.formularioData.datosFormulario);
         }
 
+        this.prefetchAdjacentSteps();
+
         console.log(`Navegación completada al paso ${step}`);
     }
 
@@ -859,6 +1240,16 @@ class FormularioCliente {
             return;
         }
 
+        if (this.colaOffline && !navigator.onLine) {
+            // Sin conexión el paso se encola como diferencias con lo guardado
+            const stepElement = document.querySelector(`.form-step[data-step="${this.currentStep}"]`);
+            const names = stepElement
+                ? [...stepElement.querySelectorAll('[name]')].map(input => input.name)
+                : [];
+            this._markStepDirty(this.currentStep, names);
+            return this.flushChanges();
+        }
+
         this.updateSaveStatus('saving');
 
         const data = this.getCurrentStepData();
@@ -919,6 +1310,9 @@ class FormularioCliente {
                 if (result.formulario_data_actualizada.documentacion !== undefined) {
                     df.documentacion = result.formulario_data_actualizada.documentacion;
                 }
+
+                // Base para calcular las diferencias del autoguardado
+                this.savedData = this._initialSavedData();
             }
 
             return result;
@@ -931,11 +1325,10 @@ class FormularioCliente {
     }
 
     autoSave() {
-        if (this.validateCurrentStep()) {
-            this.saveCurrentStep().catch(error => {
-                console.log('Error en guardado automático:', error);
-            });
-        }
+        // Borrador: se guarda aunque el paso aún no sea válido
+        this.flushChanges().catch(error => {
+            console.log('Error en guardado automático:', error);
+        });
     }
 
     updateSaveStatus(status) {
@@ -956,6 +1349,10 @@ class FormularioCliente {
                 this.elements.saveIcon.className = 'bi bi-cloud-slash me-2';
                 this.elements.saveStatus.textContent = 'Error al guardar';
                 break;
+            case 'offline':
+                this.elements.saveIcon.className = 'bi bi-wifi-off me-2';
+                this.elements.saveStatus.textContent = 'Sin conexión: cambios guardados en el dispositivo';
+                break;
         }
     }
 
@@ -1234,16 +1631,21 @@ class FormularioCliente {
     }
 
     destroy() {
-        // Limpiar intervalos y eventos
-        if (this.autoSaveInterval) {
-            clearInterval(this.autoSaveInterval);
-        }
-
-        // Guardar datos antes de destruir
-        this.saveCurrentStep().catch(console.error);
+        // Enviar los cambios pendientes antes de destruir
+        this.flushWithBeacon();
     }
 }
 
+// Campo del formulario de cada paso con autoguardado (el 6 solo admite subidas)
+FormularioCliente.STEP_FIELDS = {
+    1: 'datos_empresa',
+    2: 'info_trasteros',
+    3: 'usuarios_app',
+    4: 'config_correo',
+    5: 'niveles_acceso'
+};
+FormularioCliente.LIST_STEPS = [2, 3, 5];
+
 // Inicializar cuando el DOM esté listo
 document.addEventListener('DOMContentLoaded', function () {
     // Lógica específica para la página del formulario
@@ -0,0 +1,84 @@
+/**
+ * Progreso en vivo de la lista de clientes
+ *
+ * Escucha /api/eventos/progreso (Server-Sent Events) y actualiza la tarjeta
+ * de cada cliente cuando se guarda o se completa su formulario. EventSource
+ * reconecta solo y envía Last-Event-ID, de modo que no se pierden eventos;
+ * si el servidor ya no los conserva manda 'reinicio' y se recarga la página.
+ */
+
+class ProgresoEnVivo {
+    constructor(contenedor) {
+        this.contenedor = contenedor;
+        this.fuente = null;
+    }
+
+    static disponible() {
+        return typeof window !== 'undefined' && 'EventSource' in window;
+    }
+
+    iniciar() {
+        this.fuente = new EventSource(this.contenedor.dataset.eventosUrl);
+        this.fuente.addEventListener('progreso', evento => {
+            this.actualizar(JSON.parse(evento.data));
+        });
+        this.fuente.addEventListener('reinicio', () => {
+            this.fuente.close();
+            window.location.reload();
+        });
+        // Al salir de la página se libera la conexión en el servidor
+        window.addEventListener('pagehide', () => this.fuente.close());
+    }
+
+    actualizar(progreso) {
+        const tarjeta = this.contenedor.querySelector(`[data-cliente-id="${progreso.cliente_id}"]`);
+        if (!tarjeta) return;
+
+        const porcentaje = progreso.porcentaje_completado;
+        const color = porcentaje === 100 ? 'success' : 'primary';
+        if (progreso.completado !== undefined) {
+            tarjeta.dataset.completado = progreso.completado ? '1' : '0';
+        }
+
+        const insignia = tarjeta.querySelector('[data-progreso="porcentaje"]');
+        if (insignia) {
+            insignia.textContent = `${porcentaje}%`;
+            insignia.className = `badge bg-${color}`;
+        }
+
+        const barra = tarjeta.querySelector('[data-progreso="barra"]');
+        if (barra) {
+            barra.style.width = `${porcentaje}%`;
+            barra.setAttribute('aria-valuenow', porcentaje);
+            barra.className = `progress-bar bg-${color}`;
+        }
+
+        const paso = tarjeta.querySelector('[data-progreso="paso"]');
+        if (paso) {
+            paso.textContent = `Paso ${progreso.paso_actual} de 6`;
+        }
+
+        const estado = tarjeta.querySelector('[data-progreso="estado"]');
+        if (estado) {
+            estado.innerHTML = this._insigniaEstado(tarjeta.dataset.completado === '1', porcentaje);
+        }
+    }
+
+    _insigniaEstado(completado, porcentaje) {
+        if (completado) {
+            return '<span class="badge bg-success"><i class="bi bi-check-circle me-1"></i>Completado</span>';
+        }
+        if (porcentaje > 0) {
+            return '<span class="badge bg-warning"><i class="bi bi-clock me-1"></i>En Progreso</span>';
+        }
+        return '<span class="badge bg-secondary"><i class="bi bi-circle me-1"></i>Sin Iniciar</span>';
+    }
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const contenedor = document.getElementById('clientes-container');
+    if (contenedor && contenedor.dataset.eventosUrl && ProgresoEnVivo.disponible()) {
+        window.progresoEnVivo = new ProgresoEnVivo(contenedor);
+        window.progresoEnVivo.iniciar();
+    }
+});
@@ -0,0 +1,169 @@
+/**
+ * Cola de guardados pendientes en IndexedDB para trabajar sin conexión
+ *
+ * Los guardados que no llegan al servidor se conservan en el navegador y se
+ * reenvían por lotes a /api/sync cuando vuelve la conexión. Cada operación
+ * lleva una clave de idempotencia, de modo que reenviarla es seguro.
+ */
+
+class ColaSincronizacion {
+    constructor(nombreBD = 'formulario-offline') {
+        this.nombreBD = nombreBD;
+        this.almacen = 'pendientes';
+        this.maxLote = 50;              // operaciones por petición a /api/sync
+        this.db = null;
+        this.sincronizando = null;      // promesa de la sincronización en curso
+        this.intentos = 0;
+        this.reintentoTimer = null;
+
+        // Callbacks opcionales
+        this.onCambio = null;           // (nº de operaciones pendientes)
+        this.onSincronizado = null;     // (respuesta de /api/sync)
+    }
+
+    static disponible() {
+        return typeof window !== 'undefined' && 'indexedDB' in window;
+    }
+
+    static nuevaClave() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`;
+    }
+
+    _abrir() {
+        if (!this.db) {
+            this.db = new Promise((resolve, reject) => {
+                const peticion = indexedDB.open(this.nombreBD, 1);
+                peticion.onupgradeneeded = () => {
+                    // 'seq' autoincremental conserva el orden en que se encolaron
+                    peticion.result.createObjectStore(this.almacen, {keyPath: 'seq', autoIncrement: true});
+                };
+                peticion.onsuccess = () => resolve(peticion.result);
+                peticion.onerror = () => reject(peticion.error);
+            });
+        }
+        return this.db;
+    }
+
+    async _transaccion(modo, operacion) {
+        const db = await this._abrir();
+        return new Promise((resolve, reject) => {
+            const tx = db.transaction(this.almacen, modo);
+            const peticion = operacion(tx.objectStore(this.almacen));
+            tx.oncomplete = () => resolve(peticion ? peticion.result : undefined);
+            tx.onerror = () => reject(tx.error);
+            tx.onabort = () => reject(tx.error);
+        });
+    }
+
+    async encolar(operaciones) {
+        await this._transaccion('readwrite', almacen => {
+            operaciones.forEach(operacion => almacen.add({
+                ...operacion,
+                clave: operacion.clave || ColaSincronizacion.nuevaClave(),
+                creada: Date.now()
+            }));
+        });
+        this.notificar();
+    }
+
+    pendientes() {
+        return this._transaccion('readonly', almacen => almacen.getAll());
+    }
+
+    contar() {
+        return this._transaccion('readonly', almacen => almacen.count());
+    }
+
+    _eliminar(seqs) {
+        return this._transaccion('readwrite', almacen => {
+            seqs.forEach(seq => almacen.delete(seq));
+        });
+    }
+
+    notificar() {
+        if (!this.onCambio) return;
+        this.contar().then(this.onCambio).catch(() => {});
+    }
+
+    sincronizar() {
+        // Una sola sincronización a la vez
+        if (!this.sincronizando) {
+            this.sincronizando = this._sincronizar().finally(() => {
+                this.sincronizando = null;
+            });
+        }
+        return this.sincronizando;
+    }
+
+    async _sincronizar() {
+        clearTimeout(this.reintentoTimer);
+
+        // Se relee la cola en cada vuelta para incluir lo encolado mientras tanto
+        let pendientes;
+        while ((pendientes = await this.pendientes()).length) {
+            const lote = pendientes.slice(0, this.maxLote);
+            let resultado;
+
+            try {
+                const response = await fetch('/api/sync', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({
+                        operaciones: lote.map(({seq, creada, ...operacion}) => operacion)
+                    })
+                });
+                if (response.status === 429 || response.status === 503) {
+                    // Servidor saturado: no antes de lo que indique Retry-After
+                    const segundos = parseInt(response.headers.get('Retry-After'), 10) || 0;
+                    this._programarReintento(segundos * 1000);
+                    return false;
+                }
+                if (!response.ok) {
+                    throw new Error(`Error ${response.status} al sincronizar`);
+                }
+                resultado = await response.json();
+            } catch (error) {
+                console.log('Sincronización pospuesta:', error);
+                this._programarReintento();
+                return false;
+            }
+
+            // El servidor ya respondió por cada operación: las rechazadas no
+            // se pueden aplicar nunca, así que tampoco se reintentan
+            resultado.resultados
+                .filter(r => r.estado === 'error')
+                .forEach(r => console.warn(`Operación ${r.clave} rechazada:`, r.error));
+
+            await this._eliminar(lote.map(operacion => operacion.seq));
+            this.intentos = 0;
+
+            if (this.onSincronizado) {
+                this.onSincronizado(resultado);
+            }
+        }
+
+        this.notificar();
+        return true;
+    }
+
+    _programarReintento(minimo = 0) {
+        // Espera exponencial con variación aleatoria para que los dispositivos
+        // que recuperan la conexión a la vez no saturen el servidor
+        const espera = Math.min(60000, 2000 * 2 ** this.intentos);
+        this.intentos++;
+        this.reintentoTimer = setTimeout(
+            () => this.sincronizar(), Math.max(minimo, espera / 2 + Math.random() * espera / 2)
+        );
+        this.notificar();
+    }
+
+    escuchar() {
+        window.addEventListener('online', () => {
+            this.intentos = 0;
+            setTimeout(() => this.sincronizar(), Math.random() * 3000);
+        });
+    }
+}
@@ -0,0 +1,26 @@
+"""
+Configuración común de las pruebas (python -m pytest)
+"""
+
+import contextlib
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from database import particiones  # noqa: E402
+
+
+@pytest.fixture(params=[1, 3], ids=['sin_particiones', '3_particiones'])
+def base_de_datos(request, tmp_path):
+    """Base de datos temporal con las migraciones aplicadas, sin y con particiones"""
+    anteriores = particiones.numero_particiones(), particiones.ruta_particion(0)
+    particiones.configurar_particiones(request.param, tmp_path / 'formulario_clientes.db')
+    with contextlib.redirect_stdout(io.StringIO()):
+        particiones.inicializar_particiones()
+    yield request.param
+    particiones.configurar_particiones(*anteriores)
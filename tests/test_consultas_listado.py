@@ -0,0 +1,62 @@
+"""
+Los listados de clientes hacen las mismas consultas con pocos y con muchos
+clientes (sin N+1)
+"""
+
+import sqlite3
+
+import pytest
+
+from models.cliente import Cliente
+
+LISTADOS = {
+    'listar_todos + lista_to_dict': lambda: Cliente.lista_to_dict(Cliente.listar_todos()),
+    'listar_con_progreso': Cliente.listar_con_progreso,
+    'version_lista': Cliente.version_lista,
+}
+
+
+@pytest.fixture
+def consultas(monkeypatch):
+    """Lista con las sentencias SELECT ejecutadas por las conexiones nuevas"""
+    ejecutadas = []
+    conectar = sqlite3.connect
+
+    def conectar_con_traza(*args, **kwargs):
+        conn = conectar(*args, **kwargs)
+        conn.set_trace_callback(
+            lambda sentencia: ejecutadas.append(sentencia)
+            if sentencia.lstrip().upper().startswith(('SELECT', 'WITH')) else None
+        )
+        return conn
+
+    monkeypatch.setattr(sqlite3, 'connect', conectar_con_traza)
+    return ejecutadas
+
+
+def crear_clientes(desde: int, hasta: int):
+    for i in range(desde, hasta):
+        formulario = Cliente.crear(f'Cliente listado {i}').crear_formulario()
+        formulario.guardar_paso(1, {'nombre': f'Empresa {i}'})
+
+
+def contar(consultas) -> dict:
+    cuentas = {}
+    for nombre, listado in LISTADOS.items():
+        consultas.clear()
+        listado()
+        cuentas[nombre] = len(consultas)
+    return cuentas
+
+
+def test_listados_sin_consultas_por_cliente(base_de_datos, consultas):
+    # Con particiones hay como mucho una consulta por partición: los 3
+    # primeros clientes ya ocupan todas
+    crear_clientes(0, 3)
+    pocos = contar(consultas)
+    crear_clientes(3, 50)
+    muchos = contar(consultas)
+
+    assert all(pocos.values()), 'no se han registrado las consultas'
+    assert len(Cliente.listar_todos()) >= 50
+    assert muchos == pocos
@@ -0,0 +1,3 @@
+"""
+Utilidades de la capa web (Flask) para el formulario de clientes
+"""
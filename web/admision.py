@@ -0,0 +1,326 @@
+"""
+Control de admisión de los guardados y las subidas de archivos
+
+Cada petición a una ruta protegida (@controlar_admision) pasa, antes de abrir
+ninguna conexión a SQLite, por estas comprobaciones:
+
+1. Descarte por carga: si la petición ha esperado en cola más de
+   ADMISION_ESPERA_MAX segundos antes de llegar a un hilo libre, responde 503
+   en lugar de hacer esperar aún más a las que vienen detrás. La espera se
+   mide desde la llegada: en modo ASGI la anota web/asgi.py al pasar la
+   petición al grupo de hilos; en modo WSGI sale de la cabecera
+   X-Request-Start del proxy (nginx: proxy_set_header X-Request-Start
+   "t=${msec}"), y sin ella no se descarta por carga.
+2. Cubeta de fichas por IP: 429 si se ha agotado. Detrás de un proxy la IP
+   es la de X-Forwarded-For según PROXY_SALTOS (ver app.py).
+3. Subidas simultáneas por proceso (ADMISION_SUBIDAS_SIMULTANEAS): 503. El
+   cuerpo multipart no se lee hasta tener plaza.
+4. Cubeta de fichas por cliente_id (del JSON o del formulario): 429.
+
+Todas las respuestas de rechazo llevan Retry-After. Las cubetas se guardan
+en un AlmacenCubetas: en memoria del proceso o, con varios workers
+(servidor.py), en un fichero SQLite compartido por todos.
+"""
+
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from flask import current_app, jsonify, request
+
+# Clave del entorno WSGI con el instante (time.time()) de llegada de la
+# petición, cuando el servidor lo conoce
+LLEGADA = 'formulario.llegada'
+
+
+class AlmacenCubetas(ABC):
+    """
+    Estado de las cubetas de fichas (token bucket)
+
+    Cada cubeta admite ráfagas de hasta `capacidad` peticiones y se rellena
+    a `por_segundo` fichas por segundo.
+    """
+
+    @abstractmethod
+    def consumir(self, clave: str, capacidad: float, por_segundo: float,
+                 ahora: Optional[float] = None) -> float:
+        """
+        Gasta una ficha de la cubeta `clave`
+
+        Args:
+            ahora (float): Instante (time.time()); se puede fijar para probar
+
+        Returns:
+            float: 0 si había ficha, o segundos hasta que haya una
+        """
+
+    @staticmethod
+    def _rellenar(estado: Optional[Tuple[float, float]], capacidad: float,
+                  por_segundo: float, ahora: float) -> Tuple[float, float]:
+        """Nuevo número de fichas tras intentar gastar una y espera (0 si se gastó)"""
+        fichas, actualizado = estado if estado else (capacidad, ahora)
+        fichas = min(capacidad, fichas + max(0.0, ahora - actualizado) * por_segundo)
+        if fichas >= 1:
+            return fichas - 1, 0.0
+        return fichas, (1 - fichas) / por_segundo
+
+
+class AlmacenMemoria(AlmacenCubetas):
+    """
+    Cubetas en memoria del proceso; con varios workers cada uno lleva su
+    propia cuenta
+
+    Args:
+        max_claves (int): Cubetas guardadas antes de olvidar las que ya se han
+            rellenado del todo (equivalen a una cubeta nueva)
+    """
+
+    def __init__(self, max_claves: int = 10000):
+        self._cubetas: Dict[str, Tuple[float, float, float]] = {}
+        self._cerrojo = threading.Lock()
+        self.max_claves = max_claves
+
+    def consumir(self, clave, capacidad, por_segundo, ahora=None):
+        ahora = time.time() if ahora is None else ahora
+        with self._cerrojo:
+            estado = self._cubetas.get(clave)
+            fichas, espera = self._rellenar(estado and estado[:2], capacidad, por_segundo, ahora)
+            # Momento en que la cubeta vuelve a estar llena
+            self._cubetas[clave] = (fichas, ahora, ahora + (capacidad - fichas) / por_segundo)
+            if len(self._cubetas) > self.max_claves:
+                self._purgar(ahora)
+            return espera
+
+    def _purgar(self, ahora: float):
+        for clave in [c for c, (_, _, llena) in self._cubetas.items() if llena <= ahora]:
+            del self._cubetas[clave]
+
+
+class AlmacenSQLite(AlmacenCubetas):
+    """
+    Cubetas en un fichero SQLite compartido por todos los procesos de la
+    aplicación, independiente de las bases de datos de los clientes
+
+    Si el fichero está bloqueado más de `timeout` segundos la petición se
+    admite: el limitador nunca debe dejar sin servicio a la aplicación.
+
+    Args:
+        ruta (str): Fichero de las cubetas (se crea si no existe)
+        timeout (float): Espera máxima por el bloqueo del fichero
+    """
+
+    def __init__(self, ruta, timeout: float = 0.5):
+        self.ruta = str(ruta)
+        self.timeout = timeout
+        self._local = threading.local()
+        Path(self.ruta).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conexion()
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS cubetas (
+                   clave TEXT PRIMARY KEY,
+                   fichas REAL NOT NULL,
+                   actualizado REAL NOT NULL
+               ) WITHOUT ROWID"""
+        )
+
+    def _conexion(self) -> sqlite3.Connection:
+        """Conexión del hilo actual, de nuevo en cada proceso tras un fork"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.ruta, timeout=self.timeout, isolation_level=None)
+            # Perder las últimas cuentas en un corte de luz no importa
+            conn.execute("PRAGMA synchronous = OFF")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def consumir(self, clave, capacidad, por_segundo, ahora=None):
+        ahora = time.time() if ahora is None else ahora
+        conn = self._conexion()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError:
+            return 0.0
+        try:
+            estado = conn.execute(
+                "SELECT fichas, actualizado FROM cubetas WHERE clave = ?", (clave,)
+            ).fetchone()
+            fichas, espera = self._rellenar(estado, capacidad, por_segundo, ahora)
+            conn.execute(
+                """INSERT INTO cubetas (clave, fichas, actualizado) VALUES (?, ?, ?)
+                   ON CONFLICT (clave) DO UPDATE SET fichas = excluded.fichas,
+                                                     actualizado = excluded.actualizado""",
+                (clave, fichas, ahora)
+            )
+            # De vez en cuando se borran las cubetas sin uso desde hace una hora
+            if random.random() < 0.001:
+                conn.execute("DELETE FROM cubetas WHERE actualizado < ?", (ahora - 3600,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return espera
+
+
+class ControlAdmision:
+    """
+    Límites de admisión de un proceso
+
+    Args:
+        almacen (AlmacenCubetas): Dónde se guardan las cubetas
+        rafaga_ip, ritmo_ip: Capacidad y fichas por segundo de cada IP
+        rafaga_cliente, ritmo_cliente: Capacidad y fichas por segundo de cada cliente
+        espera_max (float): Segundos de espera en cola antes de descartar
+        subidas_simultaneas (int): Subidas de archivos simultáneas
+        reintento (int): Segundos de Retry-After de los 503
+    """
+
+    def __init__(self, almacen: AlmacenCubetas, rafaga_ip: float, ritmo_ip: float,
+                 rafaga_cliente: float, ritmo_cliente: float, espera_max: float,
+                 subidas_simultaneas: int, reintento: int):
+        self.almacen = almacen
+        self.rafaga_ip, self.ritmo_ip = rafaga_ip, ritmo_ip
+        self.rafaga_cliente, self.ritmo_cliente = rafaga_cliente, ritmo_cliente
+        self.espera_max = espera_max
+        self.reintento = reintento
+        self._subidas = threading.BoundedSemaphore(subidas_simultaneas)
+        self._cerrojo = threading.Lock()
+        # Peticiones rechazadas por motivo, para el registro y las medidas
+        self.rechazos = Counter()
+
+    def _rechazo(self, motivo: str, estado: int, mensaje: str, espera: float):
+        with self._cerrojo:
+            self.rechazos[motivo] += 1
+        respuesta = jsonify({'error': mensaje})
+        respuesta.status_code = estado
+        respuesta.headers['Retry-After'] = str(max(1, math.ceil(espera)))
+        return respuesta
+
+    @contextmanager
+    def turno(self, subida: bool = False):
+        """
+        Reserva plaza para la petición actual
+
+        Yields:
+            Response: La respuesta de rechazo, o None si la petición se admite
+        """
+        espera_cola = _espera_en_cola()
+        if espera_cola is not None and espera_cola > self.espera_max:
+            yield self._rechazo('carga', 503, 'Servidor ocupado, inténtalo de nuevo en unos segundos',
+                                self.reintento)
+            return
+
+        plaza_subida = False
+        try:
+            espera = self.almacen.consumir(f'ip:{request.remote_addr}', self.rafaga_ip, self.ritmo_ip)
+            if espera:
+                yield self._rechazo('ip', 429, 'Demasiadas peticiones', espera)
+                return
+
+            if subida:
+                plaza_subida = self._subidas.acquire(blocking=False)
+                if not plaza_subida:
+                    yield self._rechazo('subidas', 503, 'Demasiadas subidas en curso, inténtalo de nuevo',
+                                        self.reintento)
+                    return
+
+            cliente_id = _cliente_peticion()
+            if cliente_id is not None:
+                espera = self.almacen.consumir(f'cliente:{cliente_id}', self.rafaga_cliente, self.ritmo_cliente)
+                if espera:
+                    yield self._rechazo('cliente', 429, 'Demasiados guardados seguidos de este cliente', espera)
+                    return
+
+            yield None
+        finally:
+            if plaza_subida:
+                self._subidas.release()
+
+
+def _espera_en_cola(ahora: Optional[float] = None) -> Optional[float]:
+    """
+    Segundos que lleva la petición actual desde que llegó al servidor
+
+    Returns:
+        float: La espera, o None si no se sabe cuándo llegó
+    """
+    ahora = time.time() if ahora is None else ahora
+    llegada = request.environ.get(LLEGADA)
+    if llegada is None:
+        # X-Request-Start: "t=<segundos>" (nginx), o en milisegundos o
+        # microsegundos según el proxy
+        cabecera = request.headers.get('X-Request-Start', '')
+        try:
+            llegada = float(cabecera.strip().removeprefix('t='))
+        except ValueError:
+            return None
+        while llegada > ahora * 100:
+            llegada /= 1000
+    return max(0.0, ahora - llegada)
+
+
+def _cliente_peticion() -> Optional[str]:
+    """cliente_id del formulario o del cuerpo JSON (sin comprobar el tipo, como sendBeacon)"""
+    if request.mimetype in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        cliente_id = request.form.get('cliente_id')
+    else:
+        # Queda en caché para el request.get_json() de la vista
+        datos = request.get_json(force=True, silent=True)
+        cliente_id = datos.get('cliente_id') if isinstance(datos, dict) else None
+    return None if cliente_id in (None, '') else str(cliente_id)
+
+
+def controlar_admision(subida: bool = False):
+    """
+    Decorador de las vistas de guardado y subida: aplica los límites de
+    ControlAdmision antes de ejecutar la vista
+
+    Args:
+        subida (bool): La vista recibe archivos (cuenta para el límite de
+            subidas simultáneas)
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            control = current_app.extensions.get('admision')
+            if control is None:
+                return vista(*args, **kwargs)
+            with control.turno(subida) as rechazo:
+                if rechazo is not None:
+                    return rechazo
+                return vista(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def configurar_admision(app) -> Optional[ControlAdmision]:
+    """Crea el control de admisión de la aplicación según su configuración"""
+    if not app.config['ADMISION_ACTIVA']:
+        return None
+
+    if app.config['ADMISION_ALMACEN'] == 'sqlite':
+        almacen = AlmacenSQLite(app.config['ADMISION_ALMACEN_RUTA'])
+    else:
+        almacen = AlmacenMemoria()
+
+    control = ControlAdmision(
+        almacen,
+        rafaga_ip=app.config['ADMISION_RAFAGA_IP'],
+        ritmo_ip=app.config['ADMISION_RITMO_IP'],
+        rafaga_cliente=app.config['ADMISION_RAFAGA_CLIENTE'],
+        ritmo_cliente=app.config['ADMISION_RITMO_CLIENTE'],
+        espera_max=app.config['ADMISION_ESPERA_MAX'],
+        subidas_simultaneas=app.config['ADMISION_SUBIDAS_SIMULTANEAS'],
+        reintento=app.config['ADMISION_REINTENTO'],
+    )
+    app.extensions['admision'] = control
+    return control
@@ -0,0 +1,260 @@
+"""
+Modo de despliegue ASGI
+
+Envuelve la aplicación Flask para servirla con un servidor ASGI (uvicorn):
+
+- El flujo de progreso en vivo (/api/eventos/progreso) se atiende de forma
+  asíncrona en el bucle de eventos: una conexión abierta no ocupa ningún hilo.
+- El resto de rutas se ejecutan como vistas WSGI en un grupo de hilos acotado,
+  que limita también los accesos simultáneos a SQLite. El cuerpo de la
+  petición se recibe entero antes de ocupar un hilo y la respuesta se envía
+  trozo a trozo fuera de él, de modo que una subida o descarga lenta solo
+  ocupa el hilo mientras se procesa, no mientras viaja por la red.
+"""
+
+import asyncio
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from flask import Flask
+
+from web.admision import LLEGADA
+
+# Tamaño a partir del cual el cuerpo de una petición se vuelca a disco
+CUERPO_EN_MEMORIA = 1024 * 1024
+
+# Respuestas que se generan de una vez en lugar de trozo a trozo
+RESPUESTA_EN_UN_PASO = 256 * 1024
+
+_FIN = object()
+
+
+class ClienteDesconectado(Exception):
+    """El cliente cerró la conexión antes de enviar todo el cuerpo"""
+
+
+class AplicacionASGI:
+    """
+    Aplicación ASGI sobre una aplicación Flask
+
+    Args:
+        app (Flask): Aplicación Flask (con sus middlewares WSGI instalados)
+        hilos (int): Tamaño del grupo de hilos para las vistas síncronas
+    """
+
+    def __init__(self, app: Flask, hilos: int = 8):
+        self.app = app
+        self.hilos = hilos
+        self._grupo = None
+        self.rutas_async = {
+            '/api/eventos/progreso': self._eventos_progreso,
+        }
+
+    @property
+    def grupo(self) -> ThreadPoolExecutor:
+        # Se crea al primer uso: cada worker del servidor tiene el suyo
+        if self._grupo is None:
+            self._grupo = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix='vista')
+        return self._grupo
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._ciclo_de_vida(receive, send)
+        elif scope['type'] == 'http':
+            manejador = self.rutas_async.get(scope['path'])
+            if manejador is not None and scope['method'] == 'GET':
+                await manejador(scope, receive, send)
+            else:
+                await self._vista_wsgi(scope, receive, send)
+
+    async def _ciclo_de_vida(self, receive, send):
+        while True:
+            mensaje = await receive()
+            if mensaje['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensaje['type'] == 'lifespan.shutdown':
+                # Termina las vistas en curso (guardados, subidas) antes de salir
+                if self._grupo is not None:
+                    await asyncio.get_running_loop().run_in_executor(None, self._grupo.shutdown)
+                    self._grupo = None
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _eventos_progreso(self, scope, receive, send):
+        """Equivalente asíncrono de la vista eventos_progreso"""
+        cabeceras = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope['headers']}
+        parametros = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        ultimo_id = cabeceras.get('last-event-id') or parametros.get('ultimo_id', [None])[0]
+
+        bus = self.app.extensions['eventos']
+        flujo = bus.flujo_sse_async(
+            ultimo_id,
+            latido=self.app.config['SSE_LATIDO'],
+            duracion_max=self.app.config['SSE_DURACION_MAX']
+        )
+
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+
+        async def enviar():
+            async for trozo in flujo:
+                await send({'type': 'http.response.body', 'body': trozo.encode('utf-8'), 'more_body': True})
+
+        async def esperar_desconexion():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        # El flujo termina al cumplir SSE_DURACION_MAX o al desconectarse el cliente
+        envio = asyncio.ensure_future(enviar())
+        desconexion = asyncio.ensure_future(esperar_desconexion())
+        try:
+            await asyncio.wait([envio, desconexion], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for tarea in (envio, desconexion):
+                tarea.cancel()
+            await asyncio.gather(envio, desconexion, return_exceptions=True)
+            await flujo.aclose()
+
+        if not envio.cancelled():
+            envio.result()
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    async def _vista_wsgi(self, scope, receive, send):
+        try:
+            cuerpo = await self._leer_cuerpo(receive)
+        except ClienteDesconectado:
+            # Nadie recibiría la respuesta: no se ejecuta la vista con un cuerpo a medias
+            return
+        if cuerpo is None:
+            await self._responder_error(send, 413, b'Request Entity Too Large')
+            return
+
+        bucle = asyncio.get_running_loop()
+        environ = self._environ(scope, cuerpo)
+        # El control de admisión mide desde aquí la espera por un hilo libre
+        environ[LLEGADA] = time.time()
+        respuesta = {}
+
+        def start_response(status, headers, exc_info=None):
+            respuesta['status'] = int(status.split(' ', 1)[0])
+            respuesta['headers'] = [
+                (k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers
+            ]
+
+        def ejecutar():
+            app_iter = self.app(environ, start_response)
+            iterador = iter(app_iter)
+            trozo = next(iterador, _FIN)
+            # Las respuestas pequeñas de longitud conocida se leen enteras en
+            # el mismo paso por el grupo de hilos
+            longitud = dict(respuesta['headers']).get(b'content-length')
+            if trozo is not _FIN and longitud is not None and int(longitud) <= RESPUESTA_EN_UN_PASO:
+                return app_iter, None, b''.join([trozo, *iterador])
+            return app_iter, iterador, trozo
+
+        try:
+            app_iter, iterador, trozo = await bucle.run_in_executor(self.grupo, ejecutar)
+        finally:
+            cuerpo.close()
+
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': respuesta['status'],
+                'headers': respuesta['headers'],
+            })
+            while trozo is not _FIN:
+                if trozo:
+                    await send({'type': 'http.response.body', 'body': trozo, 'more_body': True})
+                if iterador is None:
+                    break
+                trozo = await bucle.run_in_executor(self.grupo, next, iterador, _FIN)
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            if hasattr(app_iter, 'close'):
+                await bucle.run_in_executor(self.grupo, app_iter.close)
+
+    async def _leer_cuerpo(self, receive):
+        """
+        Recibe el cuerpo completo de la petición sin ocupar un hilo
+
+        Returns:
+            Fichero temporal con el cuerpo, o None si supera MAX_CONTENT_LENGTH
+
+        Raises:
+            ClienteDesconectado: Si el cliente se desconecta antes de enviarlo entero
+        """
+        maximo = self.app.config.get('MAX_CONTENT_LENGTH')
+        cuerpo = tempfile.SpooledTemporaryFile(max_size=CUERPO_EN_MEMORIA)
+        tamano = 0
+        while True:
+            mensaje = await receive()
+            if mensaje['type'] == 'http.disconnect':
+                cuerpo.close()
+                raise ClienteDesconectado()
+            trozo = mensaje.get('body', b'')
+            tamano += len(trozo)
+            # Margen para la codificación multipart alrededor del archivo
+            if maximo is not None and tamano > maximo + 64 * 1024:
+                cuerpo.close()
+                return None
+            cuerpo.write(trozo)
+            if not mensaje.get('more_body'):
+                break
+        cuerpo.seek(0)
+        return cuerpo
+
+    @staticmethod
+    def _environ(scope, cuerpo) -> dict:
+        """Entorno WSGI (PEP 3333) de una petición HTTP ASGI"""
+        servidor = scope.get('server') or ('localhost', 80)
+        cliente = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': servidor[0],
+            'SERVER_PORT': str(servidor[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': cliente[0],
+            'REMOTE_PORT': str(cliente[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': cuerpo,
+            # El cuerpo ya está completo: se puede leer hasta el final aunque
+            # la petición no indicara Content-Length (chunked)
+            'wsgi.input_terminated': True,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+            'asgi.scope': scope,
+        }
+        for nombre, valor in scope['headers']:
+            nombre = nombre.decode('latin-1').upper().replace('-', '_')
+            valor = valor.decode('latin-1')
+            if nombre not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                nombre = f'HTTP_{nombre}'
+            environ[nombre] = f"{environ[nombre]},{valor}" if nombre in environ else valor
+        return environ
+
+    @staticmethod
+    async def _responder_error(send, status: int, mensaje: bytes):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'text/plain; charset=utf-8'),
+                        (b'content-length', str(len(mensaje)).encode())],
+        })
+        await send({'type': 'http.response.body', 'body': mensaje})
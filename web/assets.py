@@ -0,0 +1,289 @@
+"""
+Pipeline de recursos estáticos sin herramientas de build
+
+Concatena y minifica los JS/CSS configurados en ASSETS_BUNDLES, añade al
+nombre del fichero un hash de su contenido, genera variantes precomprimidas
+(gzip y, si está instalado el paquete brotli, br) y las sirve con caché
+inmutable. Se ejecuta al arrancar o con `flask --app app assets`.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import tempfile
+from pathlib import Path
+
+from flask import abort, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependencia opcional
+    brotli = None
+
+
+UN_ANO = 365 * 24 * 60 * 60
+
+# Caracteres tras los que una '/' en JS empieza una expresión regular
+_PREVIOS_REGEX = set('(,=:[!&|?{};+-*%<>~^')
+_PALABRAS_REGEX = ('return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new',
+                   'delete', 'void', 'throw', 'yield', 'await')
+
+
+def _fin_cadena(codigo: str, i: int) -> int:
+    """Índice siguiente al cierre de la cadena que empieza en i ('"`)"""
+    comilla = codigo[i]
+    n = len(codigo)
+    i += 1
+    while i < n:
+        c = codigo[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == comilla:
+            return i + 1
+        if comilla == '`' and c == '$' and i + 1 < n and codigo[i + 1] == '{':
+            # Expresión ${...} dentro de una plantilla: puede contener cadenas
+            i += 2
+            profundidad = 1
+            while i < n and profundidad:
+                c = codigo[i]
+                if c in '\'"`':
+                    i = _fin_cadena(codigo, i)
+                    continue
+                if c == '{':
+                    profundidad += 1
+                elif c == '}':
+                    profundidad -= 1
+                i += 1
+            continue
+        i += 1
+    return n
+
+
+def _fin_regex(codigo: str, i: int) -> int:
+    """Índice siguiente al final de la expresión regular que empieza en i"""
+    n = len(codigo)
+    i += 1
+    en_clase = False
+    while i < n:
+        c = codigo[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '\n':
+            return i
+        if c == '[':
+            en_clase = True
+        elif c == ']':
+            en_clase = False
+        elif c == '/' and not en_clase:
+            i += 1
+            while i < n and codigo[i].isalpha():
+                i += 1
+            return i
+        i += 1
+    return n
+
+
+def _empieza_regex(salida: list) -> bool:
+    texto = ''.join(salida[-12:]).rstrip()
+    if not texto:
+        return True
+    if texto[-1] in _PREVIOS_REGEX:
+        return True
+    for palabra in _PALABRAS_REGEX:
+        if texto.endswith(palabra):
+            anterior = texto[-len(palabra) - 1:-len(palabra)]
+            if not (anterior.isalnum() or anterior in ('_', '$')):
+                return True
+    return False
+
+
+def minificar(codigo: str, tipo: str) -> str:
+    """
+    Minificación conservadora de JS o CSS
+
+    Elimina comentarios, sangrías y líneas vacías sin tocar el contenido de
+    cadenas, plantillas ni expresiones regulares. En JS se conservan los saltos
+    de línea para no alterar la inserción automática de punto y coma; en CSS se
+    eliminan también los espacios alrededor de llaves, ';' y ','.
+    """
+    js = tipo == 'js'
+    salida = []
+    i, n = 0, len(codigo)
+    inicio_linea = True
+
+    while i < n:
+        c = codigo[i]
+        siguiente = codigo[i + 1] if i + 1 < n else ''
+
+        if c in '\'"' or (js and c == '`'):
+            fin = _fin_cadena(codigo, i)
+            salida.append(codigo[i:fin])
+            i, inicio_linea = fin, False
+            continue
+
+        if c == '/' and siguiente == '*':
+            fin = codigo.find('*/', i + 2)
+            i = n if fin < 0 else fin + 2
+            continue
+
+        if js and c == '/' and siguiente == '/':
+            fin = codigo.find('\n', i)
+            i = n if fin < 0 else fin
+            continue
+
+        if js and c == '/' and _empieza_regex(salida):
+            fin = _fin_regex(codigo, i)
+            salida.append(codigo[i:fin])
+            i, inicio_linea = fin, False
+            continue
+
+        if c == '\n' and js:
+            if not inicio_linea:
+                salida.append('\n')
+                inicio_linea = True
+            i += 1
+            continue
+
+        if c in ' \t\r\n':
+            fin = i
+            while fin < n and codigo[fin] in (' \t\r\n' if not js else ' \t\r'):
+                fin += 1
+            proximo = codigo[fin] if fin < n else '\n'
+            previo = salida[-1][-1] if salida else ''
+            omitir = inicio_linea or proximo == '\n'
+            if not js:
+                omitir = omitir or not previo or previo in '{};,>:' or proximo in '{};,>'
+            if not omitir:
+                salida.append(' ')
+            i = fin
+            continue
+
+        salida.append(c)
+        inicio_linea = False
+        i += 1
+
+    return ''.join(salida).strip() + '\n'
+
+
+class PipelineAssets:
+    """Construye y sirve los paquetes de recursos con nombre versionado"""
+
+    def __init__(self, app):
+        self.app = app
+        self.origen = Path(app.static_folder)
+        self.destino = Path(app.config['ASSETS_DIR'])
+        self.bundles = app.config['ASSETS_BUNDLES']
+        self.manifiesto = {}
+
+    @property
+    def ruta_manifiesto(self) -> Path:
+        return self.destino / 'manifest.json'
+
+    @staticmethod
+    def _escribir(ruta: Path, datos: bytes):
+        """Escritura atómica para que varios workers puedan construir a la vez"""
+        with tempfile.NamedTemporaryFile(dir=ruta.parent, delete=False) as tmp:
+            tmp.write(datos)
+        os.replace(tmp.name, ruta)
+
+    def construir(self) -> dict:
+        """
+        Genera todos los paquetes y sus variantes comprimidas
+
+        Returns:
+            dict: Manifiesto {nombre lógico: fichero versionado}
+        """
+        self.destino.mkdir(parents=True, exist_ok=True)
+        manifiesto = {}
+
+        for nombre, ficheros in self.bundles.items():
+            base, extension = nombre.rsplit('.', 1)
+            partes = [
+                (self.origen / fichero).read_text(encoding='utf-8')
+                for fichero in ficheros
+            ]
+            separador = ';\n' if extension == 'js' else '\n'
+            contenido = separador.join(minificar(p, extension) for p in partes).encode('utf-8')
+
+            huella = hashlib.sha256(contenido).hexdigest()[:12]
+            versionado = f"{base}.{huella}.{extension}"
+            ruta = self.destino / versionado
+
+            if not ruta.exists():
+                self._escribir(ruta, contenido)
+                self._escribir(ruta.with_name(versionado + '.gz'), gzip.compress(contenido, 9, mtime=0))
+                if brotli is not None:
+                    self._escribir(ruta.with_name(versionado + '.br'), brotli.compress(contenido))
+
+            manifiesto[nombre] = versionado
+
+        self._escribir(self.ruta_manifiesto, json.dumps(manifiesto, indent=2).encode('utf-8'))
+        self.manifiesto = manifiesto
+        return manifiesto
+
+    def cargar(self) -> dict:
+        """Carga el manifiesto generado por una construcción anterior"""
+        if self.ruta_manifiesto.exists():
+            self.manifiesto = json.loads(self.ruta_manifiesto.read_text(encoding='utf-8'))
+        return self.manifiesto
+
+    def urls(self, nombre: str) -> list:
+        """
+        URLs de un paquete: el fichero versionado si está construido o, si no,
+        los ficheros originales servidos por la ruta static de Flask
+        """
+        if nombre in self.manifiesto:
+            return [url_for('servir_asset', nombre=self.manifiesto[nombre])]
+        return [url_for('static', filename=f) for f in self.bundles[nombre]]
+
+    def servir(self, nombre: str):
+        """Sirve un fichero versionado, precomprimido si el cliente lo admite"""
+        if nombre not in self.manifiesto.values():
+            abort(404)
+
+        fichero, codificacion = nombre, None
+        for extension, encoding in (('.br', 'br'), ('.gz', 'gzip')):
+            if encoding in request.accept_encodings and (self.destino / (nombre + extension)).exists():
+                fichero, codificacion = nombre + extension, encoding
+                break
+
+        respuesta = send_from_directory(
+            self.destino, fichero, mimetype=mimetypes.guess_type(nombre)[0], max_age=UN_ANO
+        )
+        if codificacion:
+            respuesta.headers['Content-Encoding'] = codificacion
+        respuesta.vary.add('Accept-Encoding')
+        respuesta.cache_control.no_cache = None
+        respuesta.cache_control.public = True
+        respuesta.cache_control.immutable = True
+        return respuesta
+
+
+def configurar_assets(app) -> PipelineAssets:
+    """
+    Registra la ruta /assets/<nombre>, la función `asset_urls` de Jinja y el
+    comando `flask assets`, y construye los paquetes si así se configura
+    """
+    pipeline = PipelineAssets(app)
+    app.extensions['assets'] = pipeline
+
+    app.add_url_rule('/assets/<path:nombre>', 'servir_asset', pipeline.servir)
+    app.jinja_env.globals['asset_urls'] = pipeline.urls
+
+    @app.cli.command('assets')
+    def construir_assets():
+        """Construye los paquetes JS/CSS versionados y comprimidos"""
+        for nombre, versionado in pipeline.construir().items():
+            print(f"✅ {nombre} -> {versionado}")
+
+    if app.config['ASSETS_PIPELINE']:
+        if app.config['ASSETS_CONSTRUIR_AL_ARRANCAR']:
+            pipeline.construir()
+        else:
+            pipeline.cargar()
+
+    return pipeline
@@ -0,0 +1,96 @@
+"""
+Revisión periódica de la calidad de los datos (database/calidad.py) en
+segundo plano
+
+Si CALIDAD_INTERVALO es mayor que 0, un hilo de cada proceso comprueba cada
+cierto tiempo si la última revisión guardada es más antigua que el intervalo
+y, si lo es, lanza una nueva. Un cerrojo de fichero evita que varios
+procesos de la aplicación revisen a la vez.
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+
+from database import calidad
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - solo POSIX
+    fcntl = None
+
+
+class RevisionPeriodica:
+    """
+    Lanza database.calidad.revisar cada `intervalo` segundos
+
+    Args:
+        app (Flask): Aplicación (para la configuración y el log)
+        intervalo (float): Segundos entre revisiones
+    """
+
+    def __init__(self, app, intervalo: float):
+        self.app = app
+        self.intervalo = intervalo
+        self.directorio = Path(app.config['CALIDAD_DIR'])
+        self._pid = None
+        self._cerrojo = threading.Lock()
+
+    def arrancar(self):
+        """Arranca el hilo del proceso actual (una vez por proceso, también tras un fork)"""
+        with self._cerrojo:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._trabajar, name='calidad', daemon=True).start()
+
+    def pendiente(self) -> bool:
+        """True si la última revisión es más antigua que el intervalo"""
+        resumenes = sorted(self.directorio.glob('resumen_*.json'))
+        return not resumenes or time.time() - resumenes[-1].stat().st_mtime >= self.intervalo
+
+    def _trabajar(self):
+        while True:
+            try:
+                self.revisar_si_toca()
+            except Exception as e:
+                self.app.logger.exception("Error en la revisión de calidad: %s", e)
+            time.sleep(min(self.intervalo, 300))
+
+    def revisar_si_toca(self):
+        if not self.pendiente():
+            return
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        with open(self.directorio / '.revisando', 'w') as bloqueo:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(bloqueo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return  # otro proceso ya está revisando
+            if not self.pendiente():
+                return
+            resumen = calidad.revisar(
+                self.app.config['VALIDATION_RULES'], self.directorio,
+                self.app.config['CALIDAD_PROCESOS'] or None, self.app.config['CALIDAD_BLOQUE']
+            )
+            self.app.logger.info(
+                "Revisión de calidad: %s formularios, %s clientes con incidencias en %s s",
+                resumen['formularios'], resumen['clientes_con_incidencias'], resumen['segundos']
+            )
+
+
+def configurar_calidad(app):
+    """Programa la revisión periódica si CALIDAD_INTERVALO es mayor que 0"""
+    if app.config['CALIDAD_INTERVALO'] <= 0:
+        return None
+    revision = RevisionPeriodica(app, app.config['CALIDAD_INTERVALO'])
+    app.extensions['calidad'] = revision
+
+    @app.before_request
+    def _arrancar_revision():
+        # Tras la primera petición de cada proceso, no al importar la
+        # aplicación (servidor.py la importa antes de crear los procesos)
+        revision.arrancar()
+
+    return revision
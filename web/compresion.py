@@ -0,0 +1,159 @@
+"""
+Compresión de respuestas (gzip y, si está instalado el paquete brotli, br)
+
+Middleware WSGI: comprime al vuelo, trozo a trozo, las respuestas de texto
+(HTML, JSON, CSS, JS...) que superan un tamaño mínimo y cuyo cliente acepta
+la codificación. Las respuestas ya comprimidas (p. ej. /assets/) no se tocan.
+"""
+
+import zlib
+
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependencia opcional
+    brotli = None
+
+
+TIPOS_COMPRIMIBLES = {
+    'text/html', 'text/plain', 'text/css', 'text/javascript', 'text/xml',
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+}
+
+
+class _FlujoComprimido:
+    """Iterable WSGI que comprime el cuerpo de la respuesta original"""
+
+    def __init__(self, app_iter, compresor, vaciar_trozos: bool):
+        self.app_iter = app_iter
+        self.compresor = compresor
+        # En respuestas sin Content-Length (streaming) cada trozo se envía en
+        # cuanto se genera en lugar de esperar a llenar el búfer del compresor
+        self.vaciar_trozos = vaciar_trozos
+
+    def __iter__(self):
+        for trozo in self.app_iter:
+            datos = self.compresor.comprimir(trozo, self.vaciar_trozos)
+            if datos:
+                yield datos
+        datos = self.compresor.terminar()
+        if datos:
+            yield datos
+
+    def close(self):
+        if hasattr(self.app_iter, 'close'):
+            self.app_iter.close()
+
+
+class _CompresorGzip:
+    def __init__(self, nivel: int):
+        self._z = zlib.compressobj(nivel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def comprimir(self, datos: bytes, vaciar: bool) -> bytes:
+        salida = self._z.compress(datos)
+        if vaciar:
+            salida += self._z.flush(zlib.Z_SYNC_FLUSH)
+        return salida
+
+    def terminar(self) -> bytes:
+        return self._z.flush()
+
+
+class _CompresorBrotli:
+    def __init__(self, nivel: int):
+        self._b = brotli.Compressor(quality=nivel)
+
+    def comprimir(self, datos: bytes, vaciar: bool) -> bytes:
+        salida = self._b.process(datos)
+        if vaciar:
+            salida += self._b.flush()
+        return salida
+
+    def terminar(self) -> bytes:
+        return self._b.finish()
+
+
+class MiddlewareCompresion:
+    """
+    Envuelve una aplicación WSGI y comprime sus respuestas
+
+    Args:
+        wsgi_app: Aplicación WSGI original
+        min_bytes (int): Tamaño mínimo (Content-Length) para comprimir
+        nivel_gzip (int): Nivel de zlib (1-9)
+        nivel_brotli (int): Calidad de brotli (0-11)
+    """
+
+    def __init__(self, wsgi_app, min_bytes: int = 1024, nivel_gzip: int = 6, nivel_brotli: int = 5):
+        self.wsgi_app = wsgi_app
+        self.min_bytes = min_bytes
+        self.nivel_gzip = nivel_gzip
+        self.nivel_brotli = nivel_brotli
+
+    @staticmethod
+    def _negociar(environ):
+        """Codificación preferida que acepta el cliente ('br', 'gzip' o None)"""
+        aceptadas = parse_accept_header(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and aceptadas.quality('br') > 0:
+            return 'br'
+        if aceptadas.quality('gzip') > 0:
+            return 'gzip'
+        return None
+
+    def _es_comprimible(self, status: str, headers: list) -> bool:
+        codigo = int(status.split(' ', 1)[0])
+        if codigo < 200 or codigo in (204, 206, 304):
+            return False
+
+        cabeceras = {k.lower(): v for k, v in headers}
+        tipo = cabeceras.get('content-type', '').split(';', 1)[0].strip().lower()
+        if tipo not in TIPOS_COMPRIMIBLES or 'content-encoding' in cabeceras:
+            return False
+        if 'no-transform' in cabeceras.get('cache-control', ''):
+            return False
+
+        longitud = cabeceras.get('content-length')
+        return longitud is None or int(longitud) >= self.min_bytes
+
+    def __call__(self, environ, start_response):
+        codificacion = self._negociar(environ)
+        if codificacion is None or environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.wsgi_app(environ, start_response)
+
+        estado = {}
+
+        def start_response_compresion(status, headers, exc_info=None):
+            if self._es_comprimible(status, headers):
+                estado['streaming'] = not any(k.lower() == 'content-length' for k, _ in headers)
+                headers = [(k, v) for k, v in headers if k.lower() != 'content-length']
+                headers = [
+                    # El cuerpo ya no es byte a byte el original: el ETag pasa a ser débil
+                    (k, 'W/' + v if k.lower() == 'etag' and not v.startswith('W/') else v)
+                    for k, v in headers
+                ]
+                headers.append(('Content-Encoding', codificacion))
+                headers.append(('Vary', 'Accept-Encoding'))
+                estado['comprimir'] = True
+            return start_response(status, headers, exc_info)
+
+        app_iter = self.wsgi_app(environ, start_response_compresion)
+        if not estado.get('comprimir'):
+            return app_iter
+
+        if codificacion == 'br':
+            compresor = _CompresorBrotli(self.nivel_brotli)
+        else:
+            compresor = _CompresorGzip(self.nivel_gzip)
+        return _FlujoComprimido(app_iter, compresor, estado['streaming'])
+
+
+def configurar_compresion(app):
+    """Instala el middleware de compresión si COMPRESION_ACTIVA está habilitado"""
+    if app.config['COMPRESION_ACTIVA']:
+        app.wsgi_app = MiddlewareCompresion(
+            app.wsgi_app,
+            min_bytes=app.config['COMPRESION_MIN_BYTES'],
+            nivel_gzip=app.config['COMPRESION_NIVEL_GZIP'],
+            nivel_brotli=app.config['COMPRESION_NIVEL_BROTLI'],
+        )
@@ -0,0 +1,77 @@
+"""
+Peticiones condicionales: ETags débiles calculados a partir de las versiones
+de las filas, de modo que una página o un listado sin cambios se responde con
+304 sin cargar los datos ni renderizar la plantilla.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+
+from flask import current_app, make_response, request, session
+
+from web.plantillas import locale_actual
+
+
+def _fecha_codigo(app) -> int:
+    """Fecha de modificación más reciente de las plantillas y del código de la app"""
+    rutas = [Path(app.root_path) / 'app.py', Path(app.root_path) / 'config.py']
+    for directorio, _, ficheros in os.walk(Path(app.root_path) / app.template_folder):
+        rutas.extend(Path(directorio) / f for f in ficheros)
+    return max(int(os.path.getmtime(r)) for r in rutas if r.exists())
+
+
+def version_despliegue(app) -> str:
+    """
+    Versión de todo lo que, aparte de los datos, influye en el HTML: plantillas,
+    código de la aplicación y paquetes de recursos estáticos.
+
+    Se calcula una sola vez salvo que las plantillas se recarguen en caliente.
+    """
+    recargar = app.debug or app.config.get('TEMPLATES_AUTO_RELOAD')
+    version = app.extensions.get('version_despliegue')
+    if version is None or recargar:
+        assets = app.extensions.get('assets')
+        manifiesto = sorted(assets.manifiesto.values()) if assets else []
+        version = f"{_fecha_codigo(app)}-{','.join(manifiesto)}"
+        app.extensions['version_despliegue'] = version
+    return version
+
+
+def etag_debil(*partes) -> str:
+    """Valor de ETag a partir de las versiones de las que depende una respuesta"""
+    return hashlib.sha1(repr(partes).encode('utf-8')).hexdigest()[:20]
+
+
+def respuesta_condicional(partes, generar):
+    """
+    Responde 304 si el navegador ya tiene la versión actual; si no, genera la
+    respuesta y le añade el ETag débil.
+
+    Args:
+        partes (tuple): Versiones de las filas de las que depende la respuesta
+            (None desactiva la validación, p. ej. si el recurso aún no existe)
+        generar (callable): Devuelve la respuesta; solo se llama si hace falta
+
+    Returns:
+        Response: Respuesta completa o 304 Not Modified
+    """
+    app = current_app
+    # Los mensajes flash forman parte del HTML pero no de la versión
+    if partes is None or not app.config['ETAGS_ACTIVOS'] or session.get('_flashes'):
+        return generar()
+
+    etag = etag_debil(version_despliegue(app), locale_actual(app), *partes)
+
+    if request.if_none_match.contains_weak(etag):
+        respuesta = app.response_class(status=304)
+    else:
+        respuesta = make_response(generar())
+        if respuesta.status_code != 200:
+            return respuesta
+
+    respuesta.set_etag(etag, weak=True)
+    # Cada visita revalida con el servidor: los datos cambian en cualquier momento
+    respuesta.cache_control.private = True
+    respuesta.cache_control.no_cache = True
+    return respuesta
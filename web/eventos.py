@@ -0,0 +1,300 @@
+"""
+Canal de eventos en vivo (Server-Sent Events) para el progreso de los clientes
+
+Los cambios confirmados por los modelos se apuntan en un fichero SQLite
+compartido por todos los procesos de la aplicación (independiente de las
+bases de datos de los clientes), con un id creciente. Cada proceso tiene un
+BusEventos que lee los eventos nuevos de ese fichero cada pocos
+milisegundos y los reparte a sus conexiones abiertas: cada oyente lee del
+mismo historial circular desde su último id, sin colas por conexión.
+
+Como los ids y la época salen del fichero, un navegador puede reconectar con
+Last-Event-ID a cualquier worker, o tras un reinicio, sin perder eventos.
+"""
+
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from models import codec
+from models.formulario import suscribir_progreso
+
+
+class BusEventos:
+    """
+    Pub/sub entre procesos con historial para reanudar con Last-Event-ID
+
+    Args:
+        ruta (str): Fichero compartido de los eventos (se crea si no existe)
+        max_historial (int): Eventos que se conservan para las reconexiones
+        sondeo (float): Segundos entre lecturas de los eventos de otros procesos
+        timeout (float): Espera máxima por el bloqueo del fichero al publicar
+    """
+
+    def __init__(self, ruta, max_historial: int = 1000, sondeo: float = 0.5,
+                 timeout: float = 2.0):
+        self.ruta = str(ruta)
+        self.max_historial = max_historial
+        self.sondeo = sondeo
+        self.timeout = timeout
+        self._historial = deque(maxlen=max_historial)
+        self._ultimo = None
+        self._condicion = threading.Condition()
+        # Conexiones del modo ASGI esperando eventos: {(bucle, asyncio.Event)}
+        self._esperas_async = set()
+        self._cerrado = False
+        self._local = threading.local()
+        self._pid_lector = None
+
+        Path(self.ruta).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conexion()
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.executescript(
+            """CREATE TABLE IF NOT EXISTS eventos (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   tipo TEXT NOT NULL,
+                   datos TEXT NOT NULL
+               );
+               CREATE TABLE IF NOT EXISTS estado_clientes (
+                   cliente_id INTEGER PRIMARY KEY,
+                   clave TEXT NOT NULL
+               );
+               CREATE TABLE IF NOT EXISTS meta (
+                   clave TEXT PRIMARY KEY,
+                   valor TEXT NOT NULL
+               );"""
+        )
+        # La época identifica el fichero: cambia solo si se borra
+        conn.execute("INSERT OR IGNORE INTO meta (clave, valor) VALUES ('epoca', ?)", (uuid.uuid4().hex[:8],))
+        self.epoca = conn.execute("SELECT valor FROM meta WHERE clave = 'epoca'").fetchone()[0]
+
+    def _conexion(self) -> sqlite3.Connection:
+        """Conexión del hilo actual, de nuevo en cada proceso tras un fork"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.ruta, timeout=self.timeout, isolation_level=None)
+            # Perder los últimos eventos en un corte de luz solo obliga a recargar
+            conn.execute("PRAGMA synchronous = OFF")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def arrancar_lector(self):
+        """Arranca el hilo que lee los eventos de otros procesos (uno por proceso, también tras un fork)"""
+        with self._condicion:
+            if self._pid_lector == os.getpid():
+                return
+            self._pid_lector = os.getpid()
+        threading.Thread(target=self._leer_siempre, name='eventos', daemon=True).start()
+
+    def _leer_siempre(self):
+        while not self._cerrado:
+            try:
+                self.sincronizar()
+            except sqlite3.Error:
+                pass  # fichero bloqueado: se reintenta en el siguiente sondeo
+            time.sleep(self.sondeo)
+
+    def sincronizar(self):
+        """Trae al historial los eventos del fichero posteriores al último leído y despierta a los oyentes"""
+        conn = self._conexion()
+        with self._condicion:
+            desde = self._ultimo
+        if desde is None:
+            # Primera lectura del proceso: los últimos max_historial eventos
+            filas = conn.execute(
+                "SELECT id, tipo, datos FROM eventos ORDER BY id DESC LIMIT ?", (self.max_historial,)
+            ).fetchall()[::-1]
+            if not filas:
+                filas = [(conn.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence "
+                                       "WHERE name = 'eventos'").fetchone()[0], None, None)]
+        else:
+            filas = conn.execute(
+                "SELECT id, tipo, datos FROM eventos WHERE id > ? ORDER BY id", (desde,)
+            ).fetchall()
+        if not filas:
+            return
+
+        with self._condicion:
+            for numero, tipo, datos in filas:
+                if self._ultimo is not None and numero <= self._ultimo:
+                    continue  # otro hilo ya los trajo
+                if tipo is not None:
+                    self._historial.append((numero, tipo, codec.loads(datos)))
+                self._ultimo = numero
+            self._condicion.notify_all()
+            for bucle, evento in self._esperas_async:
+                bucle.call_soon_threadsafe(evento.set)
+
+    def cerrar(self):
+        """Termina los flujos abiertos, p. ej. para que un worker pueda salir"""
+        with self._condicion:
+            self._cerrado = True
+            self._condicion.notify_all()
+            for bucle, evento in self._esperas_async:
+                bucle.call_soon_threadsafe(evento.set)
+
+    def publicar(self, tipo: str, datos: Dict, cliente_id: Optional[int] = None,
+                 clave: Optional[str] = None) -> Optional[int]:
+        """
+        Apunta un evento en el fichero compartido y lo reparte en este proceso
+        sin esperar al sondeo
+
+        Args:
+            cliente_id, clave: Si se indican, el evento solo se apunta si la
+                clave del cliente ha cambiado desde su último evento
+
+        Returns:
+            int: Id del evento, o None si no había cambios
+        """
+        conn = self._conexion()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if cliente_id is not None:
+                anterior = conn.execute(
+                    "SELECT clave FROM estado_clientes WHERE cliente_id = ?", (cliente_id,)
+                ).fetchone()
+                if anterior is not None and anterior[0] == clave:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    """INSERT INTO estado_clientes (cliente_id, clave) VALUES (?, ?)
+                       ON CONFLICT (cliente_id) DO UPDATE SET clave = excluded.clave""",
+                    (cliente_id, clave)
+                )
+            numero = conn.execute(
+                "INSERT INTO eventos (tipo, datos) VALUES (?, ?)", (tipo, codec.dumps(datos))
+            ).lastrowid
+            # De vez en cuando se borran los eventos que ya no caben en ningún historial
+            if random.random() < 0.01:
+                conn.execute("DELETE FROM eventos WHERE id <= ?", (numero - 10 * self.max_historial,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self.sincronizar()
+        return numero
+
+    def publicar_progreso(self, progreso: Dict) -> Optional[int]:
+        """
+        Publica el progreso de un cliente solo si ha cambiado desde el último
+        evento (cada guardado avisa aunque el porcentaje siga igual)
+        """
+        clave = codec.dumps([progreso.get('paso_actual'), progreso.get('porcentaje_completado'),
+                             progreso.get('completado')])
+        return self.publicar('progreso', progreso, progreso['cliente_id'], clave)
+
+    def _resolver(self, ultimo_id: Optional[str]) -> Tuple[int, bool]:
+        """
+        Posición desde la que enviar eventos a un oyente
+
+        Returns:
+            tuple: (último número ya recibido, True si el oyente perdió eventos
+                   y debe recargar el estado completo)
+        """
+        self.arrancar_lector()
+        # Un id de otro worker puede ser más nuevo que lo leído aquí
+        self.sincronizar()
+        with self._condicion:
+            actual = self._ultimo
+            if not ultimo_id:
+                return actual, False
+
+            epoca, _, numero = ultimo_id.partition('-')
+            if epoca != self.epoca or not numero.isdigit() or int(numero) > actual:
+                return actual, True
+
+            numero = int(numero)
+            primero = self._historial[0][0] if self._historial else actual + 1
+            return numero, numero < primero - 1
+
+    def _posteriores(self, desde: int) -> List[tuple]:
+        return [evento for evento in self._historial if evento[0] > desde]
+
+    def esperar(self, desde: int, timeout: float) -> List[tuple]:
+        """Eventos posteriores a `desde`, esperando hasta `timeout` si no hay"""
+        with self._condicion:
+            self._condicion.wait_for(lambda: self._ultimo > desde or self._cerrado, timeout)
+            return self._posteriores(desde)
+
+    async def esperar_async(self, desde: int, timeout: float) -> List[tuple]:
+        """Como esperar(), pero sin ocupar un hilo mientras no hay eventos"""
+        espera = (asyncio.get_running_loop(), asyncio.Event())
+        with self._condicion:
+            if self._ultimo > desde or self._cerrado:
+                return self._posteriores(desde)
+            self._esperas_async.add(espera)
+        try:
+            await asyncio.wait_for(espera[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._condicion:
+                self._esperas_async.discard(espera)
+        with self._condicion:
+            return self._posteriores(desde)
+
+    def _formatear(self, numero: int, tipo: str, datos: Dict) -> str:
+        return f"id: {self.epoca}-{numero}\nevent: {tipo}\ndata: {codec.dumps(datos)}\n\n"
+
+    def flujo_sse(self, ultimo_id: Optional[str] = None, latido: float = 15,
+                  duracion_max: Optional[float] = None, reintento_ms: int = 3000) -> Iterator[str]:
+        """
+        Genera el cuerpo text/event-stream de una conexión
+
+        Args:
+            ultimo_id (str): Cabecera Last-Event-ID de la reconexión
+            latido (float): Segundos sin eventos tras los que se envía un comentario
+                para mantener viva la conexión a través de proxies
+            duracion_max (float): Segundos tras los que se cierra la conexión para
+                liberar el worker (el navegador reconecta con Last-Event-ID)
+            reintento_ms (int): Espera de reconexión indicada al navegador
+        """
+        cursor, inicio = self._cabecera_flujo(ultimo_id, reintento_ms)
+        yield inicio
+
+        limite = None if duracion_max is None else time.monotonic() + duracion_max
+        while not self._cerrado and (limite is None or time.monotonic() < limite):
+            cursor, trozo = self._trozo_flujo(cursor, self.esperar(cursor, latido))
+            yield trozo
+
+    async def flujo_sse_async(self, ultimo_id: Optional[str] = None, latido: float = 15,
+                              duracion_max: Optional[float] = None,
+                              reintento_ms: int = 3000) -> AsyncIterator[str]:
+        """Versión asíncrona de flujo_sse() para el modo ASGI"""
+        cursor, inicio = self._cabecera_flujo(ultimo_id, reintento_ms)
+        yield inicio
+
+        limite = None if duracion_max is None else time.monotonic() + duracion_max
+        while not self._cerrado and (limite is None or time.monotonic() < limite):
+            cursor, trozo = self._trozo_flujo(cursor, await self.esperar_async(cursor, latido))
+            yield trozo
+
+    def _cabecera_flujo(self, ultimo_id: Optional[str], reintento_ms: int) -> Tuple[int, str]:
+        """Cursor inicial y primer trozo del flujo (con 'reinicio' si faltan eventos)"""
+        cursor, perdidos = self._resolver(ultimo_id)
+        trozo = f"retry: {reintento_ms}\n\n"
+        if perdidos:
+            trozo += self._formatear(cursor, 'reinicio', {})
+        return cursor, trozo
+
+    def _trozo_flujo(self, cursor: int, eventos: List[tuple]) -> Tuple[int, str]:
+        """Eventos formateados y nuevo cursor; un latido si no hubo eventos"""
+        if not eventos:
+            return cursor, ": latido\n\n"
+        return eventos[-1][0], ''.join(self._formatear(*evento) for evento in eventos)
+
+
+def configurar_eventos(app) -> BusEventos:
+    """Crea el bus de eventos de la aplicación y lo conecta a los guardados"""
+    bus = BusEventos(app.config['SSE_ALMACEN_RUTA'], app.config['SSE_MAX_HISTORIAL'],
+                     app.config['SSE_SONDEO'])
+    suscribir_progreso(bus.publicar_progreso)
+    app.extensions['eventos'] = bus
+    return bus
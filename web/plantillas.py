@@ -0,0 +1,118 @@
+"""
+Precompilación de plantillas Jinja y caché de fragmentos estáticos
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from flask import request, has_request_context
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+
+
+def locale_actual(app) -> str:
+    """Idioma de la petición en curso (o el idioma por defecto fuera de una petición)"""
+    idiomas = app.config['IDIOMAS_DISPONIBLES']
+    if has_request_context():
+        return request.accept_languages.best_match(idiomas) or idiomas[0]
+    return idiomas[0]
+
+
+class CacheFragmentos:
+    """
+    Caché LRU del HTML de plantillas que no dependen del cliente.
+
+    La clave incluye la fecha de modificación de la plantilla y el idioma, de
+    modo que editar una plantilla invalida sus fragmentos sin reiniciar.
+    """
+
+    def __init__(self, app, max_entradas: int = 256):
+        self.app = app
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._rutas = {}
+        self._lock = threading.Lock()
+
+    def version(self, nombre: str) -> str:
+        """Versión de una plantilla según su fecha de modificación"""
+        # get_source lee la plantilla entera: la ruta se resuelve una sola vez
+        ruta = self._rutas.get(nombre)
+        if ruta is not None:
+            try:
+                return str(int(os.stat(ruta).st_mtime))
+            except OSError:
+                pass
+        _, ruta, _ = self.app.jinja_loader.get_source(self.app.jinja_env, nombre)
+        self._rutas[nombre] = ruta
+        return str(int(os.stat(ruta).st_mtime))
+
+    def render(self, nombre: str, **contexto) -> Markup:
+        """
+        Renderiza una plantilla estática, reutilizando el HTML ya generado
+
+        Args:
+            nombre (str): Nombre de la plantilla
+            **contexto: Variables de la plantilla; forman parte de la clave,
+                así que solo deben ser datos comunes a todos los clientes
+        """
+        clave = (
+            nombre,
+            self.version(nombre),
+            locale_actual(self.app),
+            tuple(sorted((k, repr(v)) for k, v in contexto.items()))
+        )
+
+        with self._lock:
+            html = self._entradas.get(clave)
+            if html is not None:
+                self._entradas.move_to_end(clave)
+                return html
+
+        html = Markup(self.app.jinja_env.get_template(nombre).render(**contexto))
+
+        with self._lock:
+            self._entradas[clave] = html
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        return html
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+
+def precompilar_plantillas(app) -> int:
+    """
+    Compila todas las plantillas al arrancar para que la primera petición de
+    cada worker no pague el coste de compilación
+
+    Returns:
+        int: Número de plantillas compiladas
+    """
+    nombres = [n for n in app.jinja_env.list_templates() if n.endswith('.html')]
+    for nombre in nombres:
+        app.jinja_env.get_template(nombre)
+    return len(nombres)
+
+
+def configurar_plantillas(app) -> CacheFragmentos:
+    """
+    Activa la caché de bytecode en disco, registra la caché de fragmentos
+    como global `fragmento` de Jinja y precompila las plantillas
+
+    Debe llamarse antes de renderizar cualquier plantilla.
+    """
+    directorio = Path(app.config['JINJA_CACHE_DIR'])
+    directorio.mkdir(parents=True, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(str(directorio))
+
+    fragmentos = CacheFragmentos(app)
+    app.jinja_env.globals['fragmento'] = fragmentos.render
+    app.extensions['fragmentos'] = fragmentos
+
+    if app.config['PRECOMPILAR_PLANTILLAS']:
+        precompilar_plantillas(app)
+
+    return fragmentos
@@ -0,0 +1,230 @@
+"""
+Prueba real de la configuración de correo saliente (paso 4)
+
+Cada prueba se conecta al servidor SMTP, lee el saludo, envía EHLO, activa
+TLS (implícito en el puerto 465, STARTTLS en los demás) y, si se indica la
+contraseña, se autentica. Cada fase tiene su propio límite de tiempo.
+
+Las pruebas se ejecutan en un grupo de hilos limitado, nunca en el hilo de
+la petición: la vista espera como mucho CORREO_ESPERA_MAX segundos y, si el
+servidor es lento, responde 202 para que el navegador vuelva a preguntar.
+Los resultados se guardan por configuración durante un tiempo y dos pruebas
+simultáneas de la misma configuración comparten una sola conexión.
+"""
+
+import hashlib
+import os
+import smtplib
+import socket
+import ssl
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as EsperaAgotada
+from typing import Dict, Optional
+
+# Fases de una prueba, en orden
+FASES = ('conexion', 'saludo', 'tls', 'autenticacion')
+
+MENSAJES_FASE = {
+    'conexion': 'No se pudo conectar al servidor',
+    'saludo': 'El servidor no respondió como un servidor SMTP',
+    'tls': 'No se pudo establecer la conexión cifrada',
+    'autenticacion': 'El servidor rechazó el usuario o la contraseña',
+}
+
+
+class ErrorFase(Exception):
+    def __init__(self, fase: str, detalle: str):
+        super().__init__(detalle)
+        self.fase = fase
+
+
+def probar_smtp(servidor: str, puerto: int, usuario: str, password: Optional[str] = None,
+                usa_ssl: Optional[bool] = None, timeouts: Optional[Dict[str, float]] = None) -> Dict:
+    """
+    Prueba una configuración SMTP fase a fase (bloquea hasta terminar)
+
+    Args:
+        servidor (str): Servidor de correo saliente
+        puerto (int): Puerto SMTP
+        usuario (str): Usuario de la cuenta
+        password (str): Contraseña; sin ella solo se comprueba que el
+            servidor admite autenticación
+        usa_ssl (bool): True exige TLS, False no lo intenta, None lo usa si
+            el servidor lo ofrece
+        timeouts (dict): Segundos máximos de cada fase de FASES
+
+    Returns:
+        dict: success, fase alcanzada o fallida, duraciones_ms por fase,
+              tls y, si falla, error y detalle
+    """
+    timeouts = {fase: 5.0 for fase in FASES} | (timeouts or {})
+    duraciones = {}
+    resultado = {'success': False, 'tls': False, 'duraciones_ms': duraciones}
+    smtp = None
+    fase = FASES[0]
+
+    def medir(nombre, funcion):
+        nonlocal fase
+        fase = nombre
+        inicio = time.perf_counter()
+        try:
+            if smtp is not None and smtp.sock is not None:
+                smtp.sock.settimeout(timeouts[nombre])
+            return funcion()
+        finally:
+            duraciones[nombre] = round((time.perf_counter() - inicio) * 1000, 1)
+
+    try:
+        contexto = ssl.create_default_context()
+        implicito = puerto == 465 and usa_ssl is not False
+        if implicito:
+            smtp = smtplib.SMTP_SSL(timeout=timeouts['conexion'], context=contexto)
+        else:
+            smtp = smtplib.SMTP(timeout=timeouts['conexion'])
+        # connect() también lee el saludo del servidor con el mismo límite
+        codigo, _ = medir('conexion', lambda: smtp.connect(servidor, puerto))
+        if codigo != 220:
+            raise ErrorFase('saludo', f"Saludo inesperado: {codigo}")
+
+        codigo, _ = medir('saludo', smtp.ehlo)
+        if codigo != 250:
+            codigo, _ = medir('saludo', smtp.helo)
+            if codigo != 250:
+                raise ErrorFase('saludo', f"EHLO/HELO rechazado: {codigo}")
+
+        if implicito:
+            resultado['tls'] = True
+        elif usa_ssl is not False and smtp.has_extn('starttls'):
+            medir('tls', lambda: smtp.starttls(context=contexto))
+            medir('tls', smtp.ehlo)
+            resultado['tls'] = True
+        elif usa_ssl:
+            raise ErrorFase('tls', "El servidor no ofrece STARTTLS")
+
+        if password:
+            medir('autenticacion', lambda: smtp.login(usuario, password))
+        elif not smtp.has_extn('auth'):
+            raise ErrorFase('autenticacion', "El servidor no admite autenticación")
+
+        fase = 'terminada'
+        resultado.update(success=True, mensaje='Conexión exitosa al servidor de correo')
+    except ErrorFase as e:
+        resultado.update(error=MENSAJES_FASE[e.fase], detalle=str(e))
+        fase = e.fase
+    except (OSError, smtplib.SMTPException) as e:
+        # socket.timeout, errores de DNS y de TLS son OSError; smtplib
+        # convierte el timeout al leer una respuesta en SMTPServerDisconnected
+        agotado = isinstance(e, socket.timeout) or str(e).endswith('timed out')
+        detalle = f"Sin respuesta en {timeouts[fase]:g} s" if agotado else str(e)
+        resultado.update(error=MENSAJES_FASE[fase], detalle=detalle)
+    finally:
+        if smtp is not None and smtp.sock is not None:
+            try:
+                smtp.sock.settimeout(1)
+                smtp.quit()
+            except (OSError, smtplib.SMTPException):
+                smtp.close()
+
+    resultado['fase'] = fase
+    return resultado
+
+
+class ProbadorSMTP:
+    """
+    Pruebas SMTP en segundo plano con caché de resultados y sin repetir las
+    que ya están en curso
+
+    Args:
+        hilos (int): Pruebas simultáneas por proceso
+        timeouts (dict): Segundos máximos de cada fase
+        ttl (float): Segundos que se recuerda un resultado correcto
+        ttl_error (float): Segundos que se recuerda un fallo (menos, para
+            que el usuario pueda corregir el servidor y volver a probar)
+    """
+
+    def __init__(self, hilos: int = 4, timeouts: Optional[Dict[str, float]] = None,
+                 ttl: float = 300, ttl_error: float = 30, max_cache: int = 1000):
+        self.hilos = hilos
+        self.timeouts = timeouts or {}
+        self.ttl = ttl
+        self.ttl_error = ttl_error
+        self.max_cache = max_cache
+        self._cache: Dict[str, tuple] = {}
+        self._en_curso: Dict[str, Future] = {}
+        self._cerrojo = threading.Lock()
+        # Grupo de hilos de cada proceso (se crea de nuevo tras un fork)
+        self._grupo = {'pid': None, 'grupo': None}
+
+    @staticmethod
+    def clave(servidor: str, puerto: int, usuario: str, password: Optional[str], usa_ssl: Optional[bool]) -> str:
+        """Resumen de la configuración; la contraseña no se guarda en claro ni en memoria"""
+        partes = (servidor.strip().lower(), str(puerto), usuario.strip(), password or '', repr(usa_ssl))
+        return hashlib.sha256('\0'.join(partes).encode('utf-8')).hexdigest()
+
+    def probar(self, servidor: str, puerto: int, usuario: str, password: Optional[str] = None,
+               usa_ssl: Optional[bool] = None) -> Future:
+        """
+        Resultado de la prueba de una configuración: de la caché, de la prueba
+        idéntica en curso o de una prueba nueva
+
+        Returns:
+            Future: Se resuelve con el dict de probar_smtp, más 'cache' = True
+                    si viene de una prueba anterior
+        """
+        clave = self.clave(servidor, puerto, usuario, password, usa_ssl)
+        ahora = time.monotonic()
+        with self._cerrojo:
+            guardado = self._cache.get(clave)
+            if guardado and guardado[1] > ahora:
+                futuro = Future()
+                futuro.set_result({**guardado[0], 'cache': True})
+                return futuro
+
+            futuro = self._en_curso.get(clave)
+            if futuro is None:
+                if self._grupo['pid'] != os.getpid():
+                    self._grupo.update(
+                        pid=os.getpid(),
+                        grupo=ThreadPoolExecutor(self.hilos, thread_name_prefix='prueba-smtp')
+                    )
+                futuro = self._grupo['grupo'].submit(
+                    self._ejecutar, clave, servidor, puerto, usuario, password, usa_ssl
+                )
+                self._en_curso[clave] = futuro
+            return futuro
+
+    def _ejecutar(self, clave, servidor, puerto, usuario, password, usa_ssl) -> Dict:
+        try:
+            resultado = probar_smtp(servidor, puerto, usuario, password, usa_ssl, self.timeouts)
+            resultado['cache'] = False
+            with self._cerrojo:
+                ahora = time.monotonic()
+                if len(self._cache) >= self.max_cache:
+                    for vieja in [c for c, (_, expira) in self._cache.items() if expira <= ahora]:
+                        del self._cache[vieja]
+                if len(self._cache) < self.max_cache:
+                    self._cache[clave] = (resultado, ahora + (self.ttl if resultado['success'] else self.ttl_error))
+            return resultado
+        finally:
+            with self._cerrojo:
+                self._en_curso.pop(clave, None)
+
+    def esperar(self, futuro: Future, timeout: float) -> Optional[Dict]:
+        """Resultado de una prueba, o None si no ha terminado en `timeout` segundos"""
+        try:
+            return futuro.result(timeout)
+        except EsperaAgotada:
+            return None
+
+
+def configurar_prueba_smtp(app) -> ProbadorSMTP:
+    """Crea el probador SMTP de la aplicación según su configuración"""
+    probador = ProbadorSMTP(
+        hilos=app.config['CORREO_PRUEBAS_SIMULTANEAS'],
+        timeouts=app.config['CORREO_TIMEOUTS'],
+        ttl=app.config['CORREO_CACHE_TTL'],
+        ttl_error=app.config['CORREO_CACHE_TTL_ERROR'],
+    )
+    app.extensions['prueba_smtp'] = probador
+    return probador
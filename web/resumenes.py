@@ -0,0 +1,177 @@
+"""
+Resúmenes imprimibles de los formularios completados (HTML y, si está
+instalado weasyprint, PDF)
+
+Cuando un formulario llega al 100 % se encola su resumen y un grupo de
+hilos lo genera fuera de la petición. Cada resumen se guarda en disco con
+una clave que combina las versiones del formulario y del cliente y los
+archivos subidos: mientras no cambian se sirve el fichero ya generado, y
+cualquier cambio genera uno nuevo que sustituye al anterior.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from flask import render_template
+
+from database.init_db import get_connection
+from models.cliente import Cliente
+from models.formulario import Formulario, suscribir_progreso
+
+try:
+    import weasyprint
+except ImportError:  # pragma: no cover - dependencia opcional
+    weasyprint = None
+
+
+FORMATOS = ('html', 'pdf')
+
+
+def pdf_disponible() -> bool:
+    return weasyprint is not None
+
+
+class GeneradorResumenes:
+    """
+    Cola de generación de resúmenes con un grupo de hilos
+
+    Args:
+        app (Flask): Aplicación cuyas plantillas se usan
+        directorio (Path): Carpeta de los resúmenes generados
+        hilos (int): Resúmenes que se generan a la vez
+    """
+
+    def __init__(self, app, directorio, hilos: int = 2):
+        self.app = app
+        self.directorio = Path(directorio)
+        self.hilos = hilos
+        self._en_cola = set()
+        self._cerrojo = threading.Lock()
+        # Grupo de hilos de cada proceso (se crea de nuevo tras un fork)
+        self._grupo = {'pid': None, 'grupo': None}
+
+    @staticmethod
+    def clave(cliente_id: int) -> Optional[str]:
+        """
+        Versión de los datos del resumen de un cliente, o None si no tiene
+        formulario o no está completo
+
+        Subir un archivo no cambia la versión del formulario, así que la
+        clave incluye también los archivos.
+        """
+        conn = get_connection(cliente_id=cliente_id)
+        try:
+            row = conn.execute(
+                """SELECT f.id, f.version, f.porcentaje_completado, c.version AS version_cliente,
+                          (SELECT COUNT(*) || '.' || COALESCE(MAX(a.id), 0)
+                           FROM archivos_clientes a WHERE a.formulario_id = f.id) AS archivos
+                   FROM formularios_clientes f
+                            JOIN clientes c ON c.id = f.cliente_id
+                   WHERE f.cliente_id = ?
+                   ORDER BY f.fecha_creacion DESC, f.id DESC LIMIT 1""",
+                (cliente_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None or row['porcentaje_completado'] < 100:
+            return None
+        return f"{row['id']}-{row['version']}-{row['version_cliente']}-{row['archivos']}"
+
+    def ruta(self, cliente_id: int, clave: str, formato: str) -> Path:
+        return self.directorio / f"resumen_{cliente_id}_{clave}.{formato}"
+
+    def disponible(self, cliente_id: int, formato: str = 'html') -> tuple:
+        """
+        Resumen ya generado para los datos actuales de un cliente
+
+        Returns:
+            tuple: (ruta o None si aún no está generado, clave o None si el
+                   formulario no está completo)
+        """
+        clave = self.clave(cliente_id)
+        if clave is None:
+            return None, None
+        ruta = self.ruta(cliente_id, clave, formato)
+        return (ruta if ruta.exists() else None), clave
+
+    def encolar(self, cliente_id: int):
+        """Programa la generación del resumen de un cliente (una sola vez aunque se pida varias)"""
+        with self._cerrojo:
+            if cliente_id in self._en_cola:
+                return
+            self._en_cola.add(cliente_id)
+            if self._grupo['pid'] != os.getpid():
+                self._grupo.update(
+                    pid=os.getpid(),
+                    grupo=ThreadPoolExecutor(self.hilos, thread_name_prefix='resumenes')
+                )
+            self._grupo['grupo'].submit(self._trabajar, cliente_id)
+
+    def avisar_progreso(self, progreso):
+        """Oyente de suscribir_progreso: encola los formularios que llegan al 100 %"""
+        if progreso.get('porcentaje_completado') == 100:
+            self.encolar(progreso['cliente_id'])
+
+    def _trabajar(self, cliente_id: int):
+        try:
+            self.generar(cliente_id)
+        except Exception as e:
+            self.app.logger.exception("Error generando el resumen del cliente %s: %s", cliente_id, e)
+        finally:
+            with self._cerrojo:
+                self._en_cola.discard(cliente_id)
+
+    def generar(self, cliente_id: int) -> Optional[Path]:
+        """
+        Genera el resumen de un cliente si no existe ya para sus datos actuales
+        y borra los de versiones anteriores
+
+        Returns:
+            Path: Resumen HTML, o None si el formulario no está completo
+        """
+        clave = self.clave(cliente_id)
+        if clave is None:
+            return None
+        ruta_html = self.ruta(cliente_id, clave, 'html')
+        if ruta_html.exists() and (weasyprint is None or self.ruta(cliente_id, clave, 'pdf').exists()):
+            return ruta_html
+
+        cliente = Cliente.obtener_por_id(cliente_id)
+        formulario = Formulario.obtener_por_cliente(cliente_id)
+        with self.app.app_context():
+            html = render_template(
+                'resumen.html',
+                cliente=cliente,
+                formulario=formulario,
+                archivos=formulario.obtener_archivos(),
+                pasos=self.app.config['STEP_NAMES'],
+            )
+
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self._escribir(ruta_html, html.encode('utf-8'))
+        if weasyprint is not None:
+            self._escribir(self.ruta(cliente_id, clave, 'pdf'), weasyprint.HTML(string=html).write_pdf())
+
+        # Los resúmenes de datos anteriores ya no se sirven
+        for anterior in self.directorio.glob(f'resumen_{cliente_id}_*'):
+            if not anterior.name.startswith(f'resumen_{cliente_id}_{clave}.'):
+                anterior.unlink(missing_ok=True)
+        return ruta_html
+
+    @staticmethod
+    def _escribir(ruta: Path, contenido: bytes):
+        # Escritura atómica: una descarga nunca ve un fichero a medias
+        temporal = ruta.with_name(f'.{ruta.name}.{os.getpid()}.{threading.get_ident()}')
+        temporal.write_bytes(contenido)
+        os.replace(temporal, ruta)
+
+
+def configurar_resumenes(app) -> GeneradorResumenes:
+    """Crea el generador de resúmenes y lo conecta a los guardados"""
+    generador = GeneradorResumenes(app, app.config['RESUMENES_DIR'], app.config['RESUMENES_HILOS'])
+    suscribir_progreso(generador.avisar_progreso)
+    app.extensions['resumenes'] = generador
+    return generador